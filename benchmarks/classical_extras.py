@@ -0,0 +1,1811 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Headless benchmark harness for the Classical Extras plugin
+
+Runs the plugin's track metadata processors (PartLevels.add_work_info and ExtraArtists.add_artist_info) over a set
+of fixture releases without Picard: picard.config, XmlNode, Metadata, Album/Track/File, the tagger and its web service
+are replaced by the minimal stand-ins below, and work look-ups (and browses) are answered from the fixtures through a
+simulated event loop, in the same shape as MusicBrainz ws/2 responses parsed by Picard.
+
+For each release and load it reports the wall time, the number of simulated look-ups and the time and peak memory
+(growth of the peak RSS of the process) of each stage:
+    works: tracks      PartLevels.add_work_info (per track)
+    works: look-ups    PartLevels.work_process and work_browse_process (responses to look-ups)
+    works: album       PartLevels.process_album
+    artists: tracks    ExtraArtists.add_artist_info (per track)
+    artists: album     ExtraArtists.process_album
+Times are exclusive (e.g. the album stage run at the end of a look-up response is not counted as look-up time).
+With the end-of-album processing in the background (ce_background, the default), the album stages count only the
+time taken on the main thread; the time taken in the background shows in the wall time.
+A digest of the resulting track metadata is recorded, so that a change which alters the plugin's output shows up.
+
+The plugin is Python 2 code, so run with Python 2.7 from the repository root, e.g.
+    python2 benchmarks/classical_extras.py --passes 2 --save baseline.json
+    python2 benchmarks/classical_extras.py --compare baseline.json
+--compare fails (exit status 1) if the outputs differ, more look-ups are made or a stage is slower than the
+baseline by more than --tolerance.
+To check that the end-of-album processing gives the same outputs in the background as on the main thread, e.g.
+    python2 benchmarks/classical_extras.py --passes 2 --no-reuse --no-background --save main.json
+    python2 benchmarks/classical_extras.py --passes 2 --no-reuse --compare main.json --tolerance 1000
+
+--sequences N instead checks longest_common_sequence against the original (cubic) implementation on N random
+inputs and times both on long opera number titles.
+--substrings N instead checks each method of longest_common_substring against the original (quadratic-space)
+implementation on N random inputs and times both on the fixture titles and on lyrics.
+--multi-lcs N instead checks the multi_lcs backends (suffix tree and suffix array) against brute force on N random
+inputs and times them on blocks of lyrics.
+--boil N instead checks PartLevels.boil against the original on the fixture titles (and variants) and N random
+strings and times both, with and without the cache, on 20000 boils drawn from the titles.
+--removal N instead loads the opera with a release of its scenes (whose works are the parents of the opera's track
+works), removes the scenes every N event loop calls into loading, and checks that the opera loads as if alone.
+--queries instead checks parse_batch (and the compiled parse_data) against the original recursive parse_data on the
+work look-ups made for the fixture releases and times them.
+--options instead checks the options that get_options gives each track against the original per-track copy (saved
+in ~ce_options and eval'd by each class) and times both per track.
+"""
+
+from __future__ import print_function
+import argparse
+import collections
+import gc
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import unicodedata
+import uuid
+import xml.etree.ElementTree as ElementTree
+from functools import partial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_DIR = os.path.join(ROOT, 'plugins')
+STAGES = ('works: tracks', 'works: look-ups', 'works: album', 'artists: tracks', 'artists: album')
+MB_HOST = 'musicbrainz.org'
+
+
+###########################
+# PICARD AND QT STAND-INS #
+###########################
+
+class EventLoop(object):
+    """
+    Runs deferred calls (QTimer.singleShot, web service responses and the results of background tasks) in the order
+    posted, until none are pending and no background tasks are running
+    """
+
+    def __init__(self):
+        self.pending = collections.deque()
+        self.tasks = 0
+        self.condition = threading.Condition()
+
+    def post(self, callback):
+        with self.condition:
+            self.pending.append(callback)
+            self.condition.notify()
+
+    def start_task(self):
+        with self.condition:
+            self.tasks += 1
+
+    def end_task(self, callback):
+        with self.condition:
+            self.tasks -= 1
+            self.pending.append(callback)
+            self.condition.notify()
+
+    def run(self, steps=None):
+        """
+        :param steps: maximum number of calls to run (None to run until none are pending)
+        :return: number of calls run
+        """
+        done = 0
+        while steps is None or done < steps:
+            with self.condition:
+                while not self.pending and self.tasks:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                callback = self.pending.popleft()
+            callback()
+            done += 1
+        return done
+
+
+LOOP = EventLoop()
+
+
+class QTimer(object):
+
+    @staticmethod
+    def singleShot(msec, callback):
+        LOOP.post(callback)
+
+
+class QThreadPool(object):
+
+    def setMaxThreadCount(self, count):
+        self.max_thread_count = count
+
+
+def run_task(func, next, priority=0, thread_pool=None):
+    """
+    As picard.util.thread.run_task - func is run on a new thread, then next(result=...) or next(error=...) on the
+    event loop
+    """
+    def task():
+        try:
+            callback = partial(next, result=func())
+        except Exception as e:
+            callback = partial(next, error=e)
+        LOOP.end_task(callback)
+    LOOP.start_task()
+    threading.Thread(target=task).start()
+
+
+class XmlNode(object):
+    """
+    As picard.webservice.XmlNode
+    """
+
+    def __init__(self):
+        self.text = u''
+        self.children = {}
+        self.attribs = {}
+
+    def __repr__(self):
+        return repr(self.__dict__)
+
+    def append_child(self, name, node=None):
+        if node is None:
+            node = XmlNode()
+        self.children.setdefault(name, []).append(node)
+        return node
+
+    def __getattr__(self, name):
+        try:
+            return self.children[name]
+        except KeyError:
+            try:
+                return self.attribs[name]
+            except KeyError:
+                raise AttributeError(name)
+
+
+_node_name_re = re.compile('[^a-zA-Z0-9]')
+
+
+def element_to_node(element, parent=None):
+    """
+    Convert an ElementTree element as Picard converts an XML response (hyphens etc. in names become underscores)
+    :param element:
+    :param parent: the XmlNode to add it to (a new document node if None)
+    :return: the document node
+    """
+    if parent is None:
+        parent = XmlNode()
+    node = parent.append_child(_node_name_re.sub('_', element.tag))
+    node.text = unicode(element.text or u'')
+    for name, value in element.attrib.iteritems():
+        node.attribs[_node_name_re.sub('_', name)] = unicode(value)
+    for child in element:
+        element_to_node(child, node)
+    return parent
+
+
+class Metadata(dict):
+    """
+    As picard.metadata.Metadata - a dict of lists, read as strings
+    """
+    multi_valued_joiner = u'; '
+
+    def __init__(self):
+        dict.__init__(self)
+        self.images = []
+        self.length = 0
+
+    def __getitem__(self, name):
+        return self.get(name, u'')
+
+    def get(self, name, default=None):
+        values = dict.get(self, name, None)
+        if values:
+            return self.multi_valued_joiner.join(values)
+        return default
+
+    def getall(self, name):
+        return dict.get(self, name, [])
+
+    def __setitem__(self, name, values):
+        if not isinstance(values, list):
+            values = [values]
+        values = [value for value in map(unicode, values) if value]
+        if values:
+            dict.__setitem__(self, name, values)
+        else:
+            self.pop(name, None)
+
+    def add(self, name, value):
+        if value or value == 0:
+            self.setdefault(name, []).append(value)
+
+    def add_unique(self, name, value):
+        if value not in self.getall(name):
+            self.add(name, value)
+
+    def delete(self, name):
+        self.pop(name, None)
+
+    def iteritems(self):
+        for name, values in dict.iteritems(self):
+            for value in values:
+                yield name, value
+
+    def items(self):
+        return list(self.iteritems())
+
+
+class Settings(dict):
+    """
+    config.setting - option defaults are added as the options are declared
+    """
+
+
+SETTING = Settings({
+    # Picard's own options used by the plugin
+    'artist_locale': 'en',
+    'translate_artist_names': True,
+    'standardize_artists': False,
+    'server_host': MB_HOST,
+    'server_port': 80,
+    'preserved_tags': '',
+    'folksonomy_tags': True,
+    'release_ars': True,
+    'track_ars': True,
+    # read (by write_log) before the plugin's options are declared
+    'log_info': False,
+    'log_debug': False,
+    'log_warning': False,
+    'log_error': False,
+    'log_json': False,
+})
+
+
+class Option(object):
+
+    def __init__(self, section, name, default):
+        self.section = section
+        self.name = name
+        self.default = default
+        if section == 'setting' and name not in SETTING:
+            SETTING[name] = default
+
+
+class LockableObject(object):
+
+    def lock_for_read(self):
+        pass
+
+    def lock_for_write(self):
+        pass
+
+    def unlock(self):
+        pass
+
+
+def uniqify(seq):
+    seen = set()
+    return [x for x in seq if x not in seen and not seen.add(x)]
+
+
+class Signal(object):
+
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def emit(self, *args):
+        for slot in list(self.slots):
+            slot(*args)
+
+
+class Reply(object):
+
+    def __init__(self, error):
+        self.error = error
+
+    def errorString(self):
+        return self.error or ''
+
+
+class WebService(object):
+    """
+    As Picard's XmlWebService, answering from a fixture server through the event loop
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def get(self, host, port, path, handler, xml=True, priority=False, important=False, mblogin=False,
+            queryargs=None):
+        document, error = self.server.respond(path, queryargs or {})
+        LOOP.post(partial(handler, document, Reply(error), error))
+
+
+class File(object):
+
+    def __init__(self, filename, metadata):
+        self.filename = filename
+        self.metadata = metadata
+        self.orig_metadata = Metadata()
+        self.orig_metadata.update(metadata)
+        self.discnumber = int(metadata['discnumber'])
+        self.tracknumber = int(metadata['tracknumber'])
+
+
+class Track(object):
+
+    def __init__(self, id, album=None):
+        self.id = id
+        self.album = album
+        self.metadata = Metadata()
+        self.linked_files = []
+
+    def iterfiles(self, save=False):
+        return iter(self.linked_files)
+
+    def __repr__(self):
+        return '<Track %s %r>' % (self.id, self.metadata['title'])
+
+
+class Tagger(object):
+    """
+    As picard.tagger.Tagger - only the parts used by the plugin
+    """
+    _instance = None
+
+    def __init__(self, server):
+        Tagger._instance = self
+        self.config = sys.modules['picard.config']
+        self.files = {}
+        self.albums = {}
+        self.xmlws = WebService(server)
+        self.album_removed = Signal()
+
+    @classmethod
+    def instance(cls):
+        return cls._instance
+
+    def get_files_from_objects(self, objects):
+        files = []
+        for obj in objects:
+            files.extend(obj.iterfiles())
+        return files
+
+    def remove_album(self, album):
+        del self.albums[album.id]
+        for file_object in album.iterfiles():
+            del self.files[file_object.filename]
+        self.album_removed.emit(album)
+
+
+class OptionsPage(object):
+
+    def __init__(self, parent=None):
+        pass
+
+
+class BaseAction(object):
+    NAME = 'Unknown'
+
+    def __init__(self):
+        self.tagger = Tagger.instance()
+
+
+TRACK_PROCESSORS = []
+
+
+def install_stand_ins(user_dir):
+    """
+    Make the stand-ins importable as the Picard (and PyQt4) modules used by the plugin
+    :param user_dir: directory for the plugin's logs and disk caches
+    :return: None
+    """
+    def module(name, **attributes):
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attributes)
+        sys.modules[name] = mod
+        parent, _, child = name.rpartition('.')
+        if parent in sys.modules:
+            setattr(sys.modules[parent], child, mod)
+        return mod
+
+    module('PyQt4')
+    module('PyQt4.QtCore', QTimer=QTimer, QThreadPool=QThreadPool, QXmlStreamReader=object, QFile=object,
+           QIODevice=object)
+    module('picard', __path__=[])
+    module('picard.log', debug=_quiet, info=_quiet, warning=_quiet, error=_quiet)
+    module('picard.config', setting=SETTING, ConfigSection=dict, BoolOption=Option, IntOption=Option,
+           TextOption=Option)
+    module('picard.const', USER_DIR=user_dir)
+    module('picard.util', __path__=[], LockableObject=LockableObject, uniqify=uniqify)
+    module('picard.util.thread', run_task=run_task)
+    module('picard.webservice', XmlNode=XmlNode)
+    module('picard.metadata', Metadata=Metadata, register_track_metadata_processor=TRACK_PROCESSORS.append)
+    module('picard.file', File=File)
+    module('picard.track', Track=Track)
+    module('picard.tagger', Tagger=Tagger)
+    module('picard.ui')
+    module('picard.ui.options', OptionsPage=OptionsPage, register_options_page=_quiet)
+    module('picard.ui.itemviews', BaseAction=BaseAction, register_album_action=_quiet)
+    module('picard.plugins', __path__=[PLUGIN_DIR])
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+############
+# FIXTURES #
+############
+
+def mbid(*names):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, u'/'.join(names).encode('utf8')))
+
+
+def sub(parent, tag, text=None, **attribs):
+    element = ElementTree.SubElement(parent, tag, dict((k.replace('_', '-'), v) for k, v in attribs.iteritems()))
+    if text is not None:
+        element.text = text
+    return element
+
+
+class Artist(object):
+
+    def __init__(self, name, sort_name, alias=None):
+        self.id = mbid('artist', name)
+        self.name = name
+        self.sort_name = sort_name
+        self.alias = alias
+
+    def element(self, parent):
+        artist = sub(parent, 'artist', id=self.id)
+        sub(artist, 'name', self.name)
+        sub(artist, 'sort-name', self.sort_name)
+        alias_list = sub(artist, 'alias-list', count='1' if self.alias else '0')
+        if self.alias:
+            sub(alias_list, 'alias', self.alias, locale='en', primary='primary', sort_name=self.alias,
+                type='Artist name')
+        return artist
+
+    def credit(self, parent):
+        credit = sub(parent, 'artist-credit')
+        self.element(sub(credit, 'name-credit'))
+        return credit
+
+
+class Work(object):
+
+    def __init__(self, title, composer, parent=None, order=None, work_type=None, key=None, dates=None,
+                 lyricist=None, alias=None, tags=()):
+        self.id = mbid('work', title)
+        self.title = title
+        self.composer = composer
+        self.parent = parent
+        self.order = order
+        self.work_type = work_type
+        self.key = key
+        self.dates = dates
+        self.lyricist = lyricist
+        self.alias = alias
+        self.tags = tags
+        self.parts = []
+        if parent:
+            parent.parts.append(self)
+
+    def element(self, parent, relations=True):
+        """
+        :param parent: element to add the work to
+        :param relations: True to include the relations (as in a look-up), False for the title only
+        :return: the work element
+        """
+        work = sub(parent, 'work', id=self.id, **({'type': self.work_type} if self.work_type else {}))
+        sub(work, 'title', self.title)
+        if not relations:
+            return work
+        sub(work, 'language', 'deu')
+        if self.key:
+            sub(sub(work, 'attribute-list'), 'attribute', self.key, type='Key')
+        if self.alias:
+            sub(sub(work, 'alias-list', count='1'), 'alias', self.alias, locale='en', primary='primary',
+                sort_name=self.alias, type='Work name')
+        if self.tags:
+            tag_list = sub(work, 'tag-list')
+            for tag in self.tags:
+                sub(sub(tag_list, 'tag', count='1'), 'name', tag)
+        artists = sub(work, 'relation-list', target_type='artist')
+        for rel_type, artist in (('composer', self.composer), ('lyricist', self.lyricist)):
+            if artist:
+                relation = sub(artists, 'relation', type=rel_type)
+                sub(relation, 'target', artist.id)
+                sub(relation, 'direction', 'backward')
+                if self.dates and rel_type == 'composer':
+                    sub(relation, 'begin', self.dates[0])
+                    sub(relation, 'end', self.dates[1])
+                artist.element(relation)
+        if self.parent or self.parts:
+            works = sub(work, 'relation-list', target_type='work')
+            if self.parent:
+                relation = sub(works, 'relation', type='parts')
+                sub(relation, 'target', self.parent.id)
+                if self.order:
+                    sub(relation, 'ordering-key', str(self.order))
+                sub(relation, 'direction', 'backward')
+                self.parent.element(relation, False)
+            for part in self.parts:
+                relation = sub(works, 'relation', type='parts')
+                sub(relation, 'target', part.id)
+                if part.order:
+                    sub(relation, 'ordering-key', str(part.order))
+                sub(relation, 'direction', 'forward')
+                part.element(relation, False)
+        return work
+
+
+class Recording(object):
+
+    def __init__(self, title, works=(), performers=(), seconds=300, partial=False):
+        """
+        :param title: track title
+        :param works: the works recorded
+        :param performers: [(relation type, artist, instrument or None), ...]
+        :param seconds: length
+        :param partial: True if a partial recording of the work
+        """
+        self.title = title
+        self.works = works
+        self.performers = performers
+        self.seconds = seconds
+        self.partial = partial
+
+
+class Release(object):
+
+    def __init__(self, name, title, artist, discs):
+        """
+        :param name: fixture name
+        :param title: release title
+        :param artist: release artist
+        :param discs: [[Recording, ...], ...]
+        """
+        self.name = name
+        self.id = mbid('release', title)
+        self.title = title
+        self.artist = artist
+        self.discs = discs
+
+    def track_count(self):
+        return sum(len(disc) for disc in self.discs)
+
+    def element(self):
+        """
+        :return: the release element, as in a release look-up with release and track relationships
+        """
+        release = ElementTree.Element('release', id=self.id)
+        sub(release, 'title', self.title)
+        sub(release, 'status', 'Official')
+        self.artist.credit(release)
+        group = sub(release, 'release-group', id=mbid('release-group', self.title), type='Album')
+        sub(group, 'title', self.title)
+        self.artist.credit(group)
+        media = sub(release, 'medium-list', count=str(len(self.discs)))
+        for discno, disc in enumerate(self.discs, 1):
+            medium = sub(media, 'medium')
+            sub(medium, 'position', str(discno))
+            sub(medium, 'format', 'CD')
+            tracks = sub(medium, 'track-list', count=str(len(disc)), offset='0')
+            for trackno, recording in enumerate(disc, 1):
+                track = sub(tracks, 'track', id=mbid('track', self.title, str(discno), str(trackno)))
+                sub(track, 'position', str(trackno))
+                sub(track, 'number', str(trackno))
+                sub(track, 'length', str(recording.seconds * 1000))
+                self.recording_element(track, recording, discno, trackno)
+        return release
+
+    def recording_element(self, parent, recording, discno, trackno):
+        rec = sub(parent, 'recording', id=mbid('recording', self.title, str(discno), str(trackno)))
+        sub(rec, 'title', recording.title)
+        sub(rec, 'length', str(recording.seconds * 1000))
+        (recording.performers[0][1] if recording.performers else self.artist).credit(rec)
+        if recording.performers:
+            artists = sub(rec, 'relation-list', target_type='artist')
+            for rel_type, artist, instrument in recording.performers:
+                relation = sub(artists, 'relation', type=rel_type)
+                sub(relation, 'target', artist.id)
+                sub(relation, 'direction', 'backward')
+                if instrument:
+                    sub(sub(relation, 'attribute-list'), 'attribute', instrument)
+                artist.element(relation)
+        if recording.works:
+            works = sub(rec, 'relation-list', target_type='work')
+            for work in recording.works:
+                relation = sub(works, 'relation', type='performance')
+                sub(relation, 'target', work.id)
+                sub(relation, 'direction', 'forward')
+                if recording.partial:
+                    sub(sub(relation, 'attribute-list'), 'attribute', 'partial')
+                work.element(relation)
+        return rec
+
+    def track_metadata(self, recording, discno, trackno, node):
+        """
+        :return: the track metadata, as set by Picard before the track metadata processors are run
+        """
+        tm = Metadata()
+        performers = [artist for rel_type, artist, instrument in recording.performers] or [self.artist]
+        tm['album'] = self.title
+        tm['musicbrainz_albumid'] = self.id
+        tm['albumartist'] = self.artist.name
+        tm['albumartistsort'] = self.artist.sort_name
+        tm['~albumartists'] = [self.artist.name]
+        tm['~albumartists_sort'] = [self.artist.sort_name]
+        tm['musicbrainz_albumartistid'] = self.artist.id
+        tm['title'] = recording.title
+        tm['musicbrainz_trackid'] = node.attribs['id']
+        tm['musicbrainz_recordingid'] = node.recording[0].attribs['id']
+        tm['tracknumber'] = str(trackno)
+        tm['totaltracks'] = str(len(self.discs[discno - 1]))
+        tm['discnumber'] = str(discno)
+        tm['totaldiscs'] = str(len(self.discs))
+        tm['artist'] = performers[0].name
+        tm['artistsort'] = performers[0].sort_name
+        tm['artists'] = [performers[0].name]
+        tm['musicbrainz_artistid'] = performers[0].id
+        tm['~length'] = '%d:%02d' % divmod(recording.seconds, 60)
+        tm.length = recording.seconds * 1000
+        if recording.works:
+            tm['musicbrainz_workid'] = [work.id for work in recording.works]
+            tm['work'] = [work.title for work in recording.works]
+            composers = uniqify(work.composer for work in recording.works)
+            tm['composer'] = [composer.name for composer in composers]
+            tm['composersort'] = [composer.sort_name for composer in composers]
+        for rel_type, artist, instrument in recording.performers:
+            if rel_type == 'conductor':
+                tm.add('conductor', artist.name)
+            else:
+                tm.add('performer:' + (instrument or rel_type.replace('performing ', '')), artist.name)
+        return tm
+
+
+def symphonies():
+    beethoven = Artist(u'Ludwig van Beethoven', u'Beethoven, Ludwig van')
+    orchestra = Artist(u'Wiener Philharmoniker', u'Wiener Philharmoniker', u'Vienna Philharmonic Orchestra')
+    conductor = Artist(u'Carlos Kleiber', u'Kleiber, Carlos')
+    performers = (('performing orchestra', orchestra, None), ('conductor', conductor, None))
+    recordings = []
+    for title, key, dates, movements in (
+            (u'Symphony no. 5 in C minor, op. 67', u'C minor', ('1804', '1808'),
+             (u'Allegro con brio', u'Andante con moto', u'Scherzo. Allegro', u'Allegro')),
+            (u'Symphony no. 7 in A major, op. 92', u'A major', ('1811', '1812'),
+             (u'Poco sostenuto – Vivace', u'Allegretto', u'Presto', u'Allegro con brio'))):
+        symphony = Work(title, beethoven, work_type='Symphony', key=key, dates=dates, tags=('classical', 'symphony'))
+        for order, (numeral, movement) in enumerate(zip(('I', 'II', 'III', 'IV'), movements), 1):
+            work = Work(u'%s: %s. %s' % (title, numeral, movement), beethoven, symphony, order)
+            recordings.append(Recording(u'%s: %s. %s' % (title.replace(u'no.', u'No.'), numeral, movement), (work,),
+                                        performers, 400 + 37 * order))
+    return Release('symphonies', u'Symphonies nos. 5 & 7', beethoven, [recordings])
+
+
+def opera():
+    wagner = Artist(u'Richard Wagner', u'Wagner, Richard')
+    orchestra = Artist(u'Wiener Philharmoniker', u'Wiener Philharmoniker', u'Vienna Philharmonic Orchestra')
+    conductor = Artist(u'Georg Solti', u'Solti, Georg', u'Sir Georg Solti')
+    singers = [Artist(name, sort_name) for name, sort_name in (
+        (u'James King', u'King, James'), (u'Régine Crespin', u'Crespin, Régine'),
+        (u'Gottlob Frick', u'Frick, Gottlob'), (u'Hans Hotter', u'Hotter, Hans'),
+        (u'Birgit Nilsson', u'Nilsson, Birgit'), (u'Christa Ludwig', u'Ludwig, Christa'))]
+    voices = (u'tenor vocals', u'soprano vocals', u'bass vocals', u'bass-baritone vocals', u'soprano vocals',
+              u'mezzo-soprano vocals')
+    title = u'Die Walküre, WWV 86B'
+    walkure = Work(title, wagner, work_type='Opera', dates=('1851', '1856'), lyricist=wagner,
+                   alias=u'The Valkyrie', tags=('classical', 'opera'))
+    openings = (u'Wess’ Herd dies auch sei', u'Ein fremder Mann?', u'Müd’ am Herd fand ich den Mann',
+                u'Friedmund darf ich nicht heißen', u'Ein Schwert verhieß mir der Vater')
+    discs = []
+    for act_no, act_name in enumerate((u'Erster Aufzug', u'Zweiter Aufzug', u'Dritter Aufzug'), 1):
+        act = Work(u'%s: %s' % (title, act_name), wagner, walkure, act_no, lyricist=wagner)
+        prelude = Work(u'%s: %s. Vorspiel' % (title, act_name), wagner, act, 1)
+        disc = [Recording(u'Die Walküre: %s. Vorspiel' % act_name, (prelude,),
+                          (('performing orchestra', orchestra, None), ('conductor', conductor, None)), 250)]
+        for scene_no in range(1, 4):
+            scene = Work(u'%s: %s, Szene %d' % (title, act_name, scene_no), wagner, act, scene_no + 1,
+                         lyricist=wagner)
+            for number, opening in enumerate(openings, 1):
+                work = Work(u'%s: %s, Szene %d. „%s“' % (title, act_name, scene_no, opening), wagner, scene, number,
+                            lyricist=wagner)
+                cast = [(u'vocal', singers[(act_no + scene_no + number + i) % len(singers)],
+                         voices[(act_no + scene_no + number + i) % len(voices)]) for i in range(1 + number % 3)]
+                partial_take = number == 5 and scene_no == 3
+                disc.append(Recording(u'Die Walküre: %s, Szene %d. „%s“%s' % (
+                    act_name, scene_no, opening, u' (Teil 1)' if partial_take else u''), (work,),
+                    cast + [('performing orchestra', orchestra, None), ('conductor', conductor, None)],
+                    120 + 11 * number, partial_take))
+        discs.append(disc)
+    return Release('opera', u'Die Walküre', wagner, discs)
+
+
+def recital():
+    singer = Artist(u'Dietrich Fischer-Dieskau', u'Fischer-Dieskau, Dietrich')
+    pianist = Artist(u'Gerald Moore', u'Moore, Gerald')
+    performers = (('vocal', singer, u'baritone vocals'), ('instrument', pianist, u'piano'))
+    schubert = Artist(u'Franz Schubert', u'Schubert, Franz')
+    schumann = Artist(u'Robert Schumann', u'Schumann, Robert')
+    brahms = Artist(u'Johannes Brahms', u'Brahms, Johannes')
+    rachmaninoff = Artist(u'Сергей Васильевич Рахманинов', u'Рахманинов, Сергей Васильевич',
+                          u'Sergei Rachmaninoff')
+    muller = Artist(u'Wilhelm Müller', u'Müller, Wilhelm')
+    heine = Artist(u'Heinrich Heine', u'Heine, Heinrich')
+    recordings = []
+    for cycle_title, composer, lyricist, songs in (
+            (u'Die schöne Müllerin, D. 795', schubert, muller,
+             (u'Das Wandern', u'Wohin?', u'Halt!', u'Danksagung an den Bach', u'Am Feierabend', u'Der Neugierige')),
+            (u'Dichterliebe, op. 48', schumann, heine,
+             (u'Im wunderschönen Monat Mai', u'Aus meinen Tränen sprießen', u'Die Rose, die Lilie, die Taube, '
+              u'die Sonne', u'Wenn ich in deine Augen seh’', u'Ich will meine Seele tauchen',
+              u'Im Rhein, im heiligen Strome'))):
+        cycle = Work(cycle_title, composer, work_type='Song-cycle', lyricist=lyricist, tags=('lieder',))
+        for order, song in enumerate(songs, 1):
+            work = Work(u'%s: No. %d. %s' % (cycle_title, order, song), composer, cycle, order, lyricist=lyricist)
+            recordings.append(Recording(u'%s: %s' % (cycle_title.split(',')[0], song), (work,), performers,
+                                        90 + 13 * order))
+    for song in (u'Wiegenlied, op. 49 no. 4', u'Feldeinsamkeit, op. 86 no. 2', u'Von ewiger Liebe, op. 43 no. 1',
+                 u'Vergebliches Ständchen, op. 84 no. 4'):
+        recordings.append(Recording(song, (Work(song, brahms),), performers, 150))
+    songs = Work(u'6 Romances, op. 4', rachmaninoff, work_type='Song-cycle', alias=u'Six Romances, op. 4')
+    for order, song in ((3, u'В молчаньи ночи тайной'), (4, u'Не пой, красавица, при мне')):
+        work = Work(u'6 Romances, op. 4: No. %d. %s' % (order, song), rachmaninoff, songs, order)
+        recordings.append(Recording(song, (work,), performers, 180))
+    # two songs recorded as a single track
+    pair = (Work(u'Nachtviolen, D. 752', schubert), Work(u'Der Musensohn, D. 764', schubert))
+    recordings.append(Recording(u'Nachtviolen / Der Musensohn', pair, performers, 300))
+    recordings.append(Recording(u'Applause', (), performers, 30))
+    return Release('recital', u'Lieder recital', singer, [recordings])
+
+
+def boxset():
+    haydn = Artist(u'Joseph Haydn', u'Haydn, Joseph')
+    quartet = Artist(u'Quatuor Mosaïques', u'Quatuor Mosaïques', u'Mosaïques Quartet')
+    performers = (('performing orchestra', quartet, None),)
+    movements = (u'Allegro moderato', u'Menuetto. Allegretto', u'Adagio cantabile', u'Finale. Presto')
+    discs = []
+    recordings = []
+    for opus_no, opus in enumerate((u'9', u'17', u'20', u'33', u'50', u'54', u'64', u'71', u'74'), 1):
+        opus_title = u'String Quartets, op. %s' % opus
+        opus_work = Work(opus_title, haydn, tags=('classical', 'chamber music'))
+        for number in range(1, 7 if opus_no < 9 else 3):
+            title = u'String Quartet op. %s no. %d' % (opus, number)
+            string_quartet = Work(title, haydn, opus_work, number, work_type='Quartet',
+                                  dates=(unicode(1768 + 3 * opus_no), unicode(1769 + 3 * opus_no)))
+            for order, (numeral, movement) in enumerate(zip(('I', 'II', 'III', 'IV'), movements), 1):
+                work = Work(u'%s: %s. %s' % (title, numeral, movement), haydn, string_quartet, order)
+                recordings.append(Recording(u'%s: %s. %s' % (title.replace(u'no.', u'No.'), numeral, movement),
+                                            (work,), performers, 240 + 17 * order))
+            if len(recordings) == 20:
+                discs.append(recordings)
+                recordings = []
+    return Release('boxset', u'The Complete String Quartets', haydn, discs)
+
+
+def scenes():
+    """
+    The scenes of the first act of the opera, each as a single track - so the works of this release are the parents
+    of track works of the opera (not in FIXTURES; used to check the removal of one album while another is loading)
+    """
+    walkure = opera()
+    recordings = []
+    for recording in walkure.discs[0]:
+        scene = recording.works[0].parent
+        if scene.work_type is None and scene.parent.parent and scene not in [r.works[0] for r in recordings]:
+            recordings.append(Recording(u'Die Walküre: ' + scene.title.split(u': ', 1)[1], (scene,),
+                                        recording.performers, 1200))
+    return Release('scenes', u'Die Walküre: Szenen aus dem ersten Aufzug', walkure.artist, [recordings])
+
+
+FIXTURES = collections.OrderedDict((fixture.__name__, fixture) for fixture in (symphonies, opera, recital, boxset))
+
+
+class FixtureServer(object):
+    """
+    Answers work look-ups and browses (of composers' works) from the works in the fixture releases
+    """
+
+    def __init__(self):
+        self.works = {}
+        self.by_composer = collections.defaultdict(list)
+        self.lookups = collections.Counter()
+
+    def add_release(self, release):
+        for disc in release.discs:
+            for recording in disc:
+                for work in recording.works:
+                    while work and work.id not in self.works:
+                        self.works[work.id] = work
+                        self.by_composer[work.composer.id].append(work)
+                        work = work.parent
+
+    def respond(self, path, queryargs):
+        metadata = ElementTree.Element('metadata')
+        if path == '/ws/2/work':
+            self.lookups['browses'] += 1
+            works = self.by_composer[queryargs['artist']]
+            offset = int(queryargs['offset'])
+            work_list = sub(metadata, 'work-list', count=str(len(works)), offset=str(offset))
+            for work in works[offset:offset + int(queryargs['limit'])]:
+                work.element(work_list)
+            return element_to_node(metadata), None
+        self.lookups['look-ups'] += 1
+        work = self.works.get(path.rsplit('/', 1)[-1])
+        if work is None:
+            return XmlNode(), '404'
+        work.element(metadata)
+        return element_to_node(metadata), None
+
+
+class Album(object):
+    """
+    As picard.album.Album - loads the release, running the track metadata processors for each track
+    """
+
+    def __init__(self, tagger, release):
+        self.tagger = tagger
+        self.release = release
+        self.id = release.id
+        self.tracks = []
+        self.files = []
+        self._requests = 0
+        self.loaded = False
+        self.finished = None
+
+    def iterfiles(self):
+        return iter(self.files)
+
+    def load(self, processors):
+        """
+        :param processors: the track metadata processors
+        :return: None
+        """
+        self.loaded = False
+        self._new_tracks = []
+        document = element_to_node(self.release.element())
+        release_node = document.release[0]
+        for discno, (disc, medium) in enumerate(zip(self.release.discs, release_node.medium_list[0].medium), 1):
+            for trackno, (recording, node) in enumerate(zip(disc, medium.track_list[0].track), 1):
+                track = Track(node.recording[0].attribs['id'], self)
+                track.metadata = self.release.track_metadata(recording, discno, trackno, node)
+                self._new_tracks.append(track)
+                self.add_file(track)
+                for processor in processors:
+                    processor(self, track.metadata, node, release_node)
+        self._finalize_loading(None)
+
+    def add_file(self, track):
+        filename = '%s/%s-%s.flac' % (self.release.name, track.metadata['discnumber'], track.metadata['tracknumber'])
+        if filename not in self.tagger.files:
+            file_object = File(filename, track.metadata)
+            self.tagger.files[filename] = file_object
+            self.files.append(file_object)
+        track.linked_files.append(self.tagger.files[filename])
+
+    def _finalize_loading(self, error):
+        if self._requests > 0 or self.loaded:
+            return
+        self.tracks = self._new_tracks
+        del self._new_tracks
+        self.loaded = True
+        self.finished = time.time()
+
+    def __repr__(self):
+        return '<Album %s %r>' % (self.id, self.release.title)
+
+
+##################
+# MEASUREMENT    #
+##################
+
+def peak_rss():
+    """
+    :return: peak resident set size of the process so far, in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profile(object):
+    """
+    Exclusive time and peak memory growth of each stage
+    """
+
+    def __init__(self):
+        self.times = dict((stage, 0.0) for stage in STAGES)
+        self.memory = dict((stage, 0) for stage in STAGES)
+        self.nested = []
+
+    def reset(self):
+        self.__init__()
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.time()
+            rss = peak_rss()
+            self.nested.append(0.0)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.time() - start
+                self.times[stage] += elapsed - self.nested.pop()
+                if self.nested:
+                    self.nested[-1] += elapsed
+                self.memory[stage] = max(self.memory[stage], peak_rss() - rss)
+        return timed
+
+
+def instrument(plugin, profile):
+    """
+    Time the stages of the plugin's PartLevels and ExtraArtists objects
+    :return: the track metadata processors, in the order registered
+    """
+    part_levels, extra_artists = plugin.PART_LEVELS, plugin.EXTRA_ARTISTS
+    for obj, name, stage in ((part_levels, 'add_work_info', 'works: tracks'),
+                             (part_levels, 'work_process', 'works: look-ups'),
+                             (part_levels, 'work_browse_process', 'works: look-ups'),
+                             (part_levels, 'process_album', 'works: album'),
+                             (extra_artists, 'add_artist_info', 'artists: tracks'),
+                             (extra_artists, 'process_album', 'artists: album')):
+        setattr(obj, name, profile.wrap(stage, getattr(obj, name)))
+    return [getattr(processor.__self__, processor.__name__) for processor in TRACK_PROCESSORS]
+
+
+def metadata_digest(album):
+    digest = hashlib.sha1()
+    for track in album.tracks:
+        digest.update(repr(sorted(dict.items(track.metadata))))
+    return digest.hexdigest()
+
+
+def run(args, user_dir):
+    """
+    :return: results, sizes of the plugin's collections after the albums are removed, plugin import time
+        results - format is [{'release': , 'pass': , 'tracks': , 'wall': , 'look-ups': , 'browses': ,
+        'stages': {stage: {'time': , 'memory': }, ...}, 'digest': }, ...]
+    """
+    server = FixtureServer()
+    install_stand_ins(user_dir)
+    tagger = Tagger(server)
+    start = time.time()
+    import picard.plugins.classical_extras as plugin
+    import_time = time.time() - start
+    if args.batch:
+        SETTING['cwp_batch'] = True
+    if args.no_background:
+        SETTING['ce_background'] = False
+    profile = Profile()
+    processors = instrument(plugin, profile)
+    releases = [FIXTURES[name]() for name in args.releases]
+    for release in releases:
+        server.add_release(release)
+    results = []
+    for cycle in range(args.cycles):
+        for release in releases:
+            album = Album(tagger, release)
+            tagger.albums[album.id] = album
+            for load in range(1, args.passes + 1):
+                profile.reset()
+                server.lookups.clear()
+                if args.no_reuse:
+                    plugin.stage_outputs.clear()
+                start = time.time()
+                album.load(processors)
+                LOOP.run()
+                if not album.loaded:
+                    raise RuntimeError('%s did not finish loading (%s requests outstanding)' % (
+                        album, album._requests))
+                results.append({
+                    'release': release.name,
+                    'cycle': cycle + 1,
+                    'pass': load,
+                    'tracks': release.track_count(),
+                    'wall': album.finished - start,
+                    'look-ups': server.lookups['look-ups'],
+                    'browses': server.lookups['browses'],
+                    'stages': dict((stage, {'time': profile.times[stage], 'memory': profile.memory[stage]})
+                                   for stage in STAGES),
+                    'digest': metadata_digest(album)})
+            tagger.remove_album(album)
+            del album
+    plugin.LOG_WRITER.wait()
+    gc.collect()
+    sizes = dict((name + '.' + attr, size) for name, obj in (('ExtraArtists', plugin.EXTRA_ARTISTS),
+                                                             ('PartLevels', plugin.PART_LEVELS))
+                 for attr, size in plugin.structure_sizes(obj))
+    sizes['albums alive'] = len([obj for obj in gc.get_objects() if isinstance(obj, Album)])
+    return results, sizes, import_time
+
+
+def report(results, sizes, import_time):
+    columns = ['release', 'cycle', 'pass', 'tracks', 'wall ms', 'look-ups', 'browses'] + list(STAGES)
+    print('Plugin import: %.1f ms\n' % (import_time * 1000))
+    print('Times in ms (peak memory growth in KB)')
+    rows = [columns]
+    for result in results:
+        rows.append([result['release'], str(result['cycle']), str(result['pass']), str(result['tracks']),
+                     '%.1f' % (result['wall'] * 1000), str(result['look-ups']), str(result['browses'])] +
+                    ['%.1f (%d)' % (result['stages'][stage]['time'] * 1000, result['stages'][stage]['memory'] // 1024)
+                     for stage in STAGES])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+    print('\nItems held at the end (all albums removed):')
+    for name in sorted(sizes):
+        print('  %s: %s' % (name, sizes[name]))
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: list of regressions found
+    """
+    previous = dict(((r['release'], r['cycle'], r['pass']), r) for r in baseline)
+    regressions = []
+    for result in results:
+        key = (result['release'], result['cycle'], result['pass'])
+        if key not in previous:
+            continue
+        old = previous[key]
+        label = '%s cycle %s pass %s' % key
+        if result['digest'] != old['digest']:
+            regressions.append('%s: track metadata differs from the baseline' % label)
+        for count in ('look-ups', 'browses'):
+            if result[count] > old[count]:
+                regressions.append('%s: %s %s (was %s)' % (label, result[count], count, old[count]))
+        for stage in STAGES + ('wall',):
+            new_time = result['wall'] if stage == 'wall' else result['stages'][stage]['time']
+            old_time = old['wall'] if stage == 'wall' else old['stages'][stage]['time']
+            if new_time > old_time * (1 + tolerance) and new_time - old_time > 0.001:
+                regressions.append('%s: %s %.1f ms (was %.1f ms)' % (label, stage, new_time * 1000, old_time * 1000))
+    return regressions
+
+
+####################
+# MICRO-BENCHMARKS #
+####################
+
+PREVIOUS_IMPORTS = []
+
+
+def with_plugin(function, *args):
+    """
+    Import the plugin against the fixture server and call function(plugin, tagger, *args)
+    :return: the result of the function
+    """
+    user_dir = tempfile.mkdtemp(prefix='classical_extras_bench')
+    # a fresh import, so that nothing is held over from a previous call (the previous modules are kept, as their
+    # exit handlers still run)
+    for name in [name for name in sys.modules if name.startswith('picard.plugins.classical_extras')]:
+        PREVIOUS_IMPORTS.append(sys.modules.pop(name))
+    del TRACK_PROCESSORS[:]
+    try:
+        install_stand_ins(user_dir)
+        tagger = Tagger(FixtureServer())
+        import picard.plugins.classical_extras as plugin
+        result = function(plugin, tagger, *args)
+        plugin.LOG_WRITER.wait()
+    finally:
+        shutil.rmtree(user_dir, ignore_errors=True)
+    return result
+
+
+def best_time(function, args_list, repeat=3):
+    """
+    :return: the shortest time (of repeat runs) to call function on each of args_list
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for args in args_list:
+            function(*args)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report_check(failures, cases, reference):
+    """
+    :param failures: list of differences found
+    :param cases: number of cases checked
+    :param reference: description of what was compared against
+    :return: exit status
+    """
+    if failures:
+        print('\nDIFFERENCES from %s:' % reference)
+        for failure in failures[:20]:
+            print('  ' + failure)
+        return 1
+    print('\n%d cases match %s' % (cases, reference))
+    return 0
+
+
+def reference_parse_data(release_id, obj, response_list, *match):
+    """
+    The original recursive parse_data, which re-interprets the match path at every level
+    """
+    if isinstance(obj, XmlNode):
+        obj = obj.__dict__
+    if isinstance(obj, list):
+        for item in obj:
+            if isinstance(item, XmlNode):
+                item = item.__dict__
+            reference_parse_data(release_id, item, response_list, *match)
+        return response_list
+    elif isinstance(obj, dict):
+        if match[0] in obj:
+            if len(match) == 1:
+                response = obj[match[0]]
+                response_list.append(response)
+            else:
+                match_list = list(match)
+                match_list.pop(0)
+                reference_parse_data(release_id, obj[match[0]], response_list, *match_list)
+            return response_list
+        elif '.' in match[0]:
+            test = match[0].split(':')
+            match2 = test[0].split('.')
+            test_data = reference_parse_data(release_id, obj, [], *match2)
+            if len(test) > 1:
+                if test[1] in test_data:
+                    if len(match) == 1:
+                        response = obj
+                        response_list.append(response)
+                    else:
+                        match_list = list(match)
+                        match_list.pop(0)
+                        reference_parse_data(release_id, obj, response_list, *match_list)
+            else:
+                reference_parse_data(release_id, obj, response_list, *match2)
+            return response_list
+        else:
+            if 'children' in obj:
+                reference_parse_data(release_id, obj['children'], response_list, *match)
+            return response_list
+    else:
+        return response_list
+
+
+def capture_queries(plugin, tagger):
+    """
+    Load each fixture release once, recording the work nodes and match paths passed to parse_batch
+    (by PartLevels.work_process_metadata)
+    :return: [(work node, (match path, ...)), ...]
+    """
+    captured = []
+    parse_batch = plugin.parse_batch
+
+    def recording(release_id, obj, *matches):
+        captured.append((obj, matches))
+        return parse_batch(release_id, obj, *matches)
+    plugin.parse_batch = recording
+    processors = [getattr(processor.__self__, processor.__name__) for processor in TRACK_PROCESSORS]
+    try:
+        for fixture in FIXTURES.values():
+            release = fixture()
+            tagger.xmlws.server.add_release(release)
+            album = Album(tagger, release)
+            tagger.albums[album.id] = album
+            album.load(processors)
+            LOOP.run()
+            tagger.remove_album(album)
+    finally:
+        plugin.parse_batch = parse_batch
+    return captured
+
+
+def queries(plugin, tagger):
+    """
+    Check parse_batch against the original parse_data on the work look-ups made for the fixture releases and time
+    both (and the compiled parse_data)
+    :return: exit status
+    """
+    captured = capture_queries(plugin, tagger)
+    failures = []
+    for node, matches in captured:
+        expected = [reference_parse_data('bench', node, [], *match) for match in matches]
+        for result in (plugin.parse_batch('bench', node, *matches),
+                       [plugin.parse_data('bench', node, [], *match) for match in matches]):
+            if result != expected:
+                failures.append('%r: %r (expected %r)' % (matches, result, expected))
+    calls = [(node, match) for node, matches in captured for match in matches]
+    timings = [('original parse_data', best_time(lambda node, match: reference_parse_data('bench', node, [], *match),
+                                                 calls)),
+               ('compiled parse_data', best_time(lambda node, match: plugin.parse_data('bench', node, [], *match),
+                                                 calls)),
+               ('parse_batch', best_time(lambda node, matches: plugin.parse_batch('bench', node, *matches),
+                                         captured))]
+    print('%d work nodes, %d queries each' % (len(captured), len(captured[0][1]) if captured else 0))
+    for description, seconds in timings:
+        print('  %s: %.1f us per work' % (description, seconds / max(len(captured), 1) * 1e6))
+    return report_check(failures, len(captured), 'the original parse_data')
+
+
+def reference_track_options(plugin):
+    """
+    The original per-track options: a fresh copy of the UI options, saved as the track's ~ce_options tag and then
+    re-read (i.e. eval'd) by each of ExtraArtists and PartLevels
+    :return: the options as read by the second class
+    """
+    tm = Metadata()
+    tm['~ce_options'] = plugin.option_settings(SETTING)
+    plugin.interpret(tm['~ce_options'])
+    return plugin.interpret(tm['~ce_options'])
+
+
+def options(plugin, tagger):
+    """
+    Check the options that get_options now gives each track (a TrackOptions over a ReleaseOptions taken once per
+    release) against the original per-track copy and time both, per track, for the fixture releases
+    :return: exit status
+    """
+    track_counts = [FIXTURES[name]().track_count() for name in FIXTURES]
+
+    def old_release(tracks):
+        for _ in range(tracks):
+            reference_track_options(plugin)
+
+    def new_release(tracks):
+        release_options = plugin.ReleaseOptions(SETTING)
+        for _ in range(tracks):
+            plugin.TrackOptions(release_options)
+
+    expected = reference_track_options(plugin)
+    release_options = plugin.ReleaseOptions(SETTING)
+    failures = []
+    for tracks in track_counts:
+        for _ in range(tracks):
+            result = dict(plugin.TrackOptions(release_options))
+            if result != expected:
+                failures.append('%r (expected %r)' % (
+                    dict((name, value) for name, value in result.items() if expected.get(name) != value),
+                    dict((name, value) for name, value in expected.items() if result.get(name) != value)))
+    args_list = [(tracks,) for tracks in track_counts]
+    old_time = best_time(old_release, args_list)
+    new_time = best_time(new_release, args_list)
+    total = sum(track_counts)
+    print('%d options, %d tracks in %d releases' % (len(expected), total, len(track_counts)))
+    print('  options per track: %.1f us, was %.1f us' % (new_time / total * 1e6, old_time / total * 1e6))
+    return report_check(failures, total, 'the original per-track options')
+
+
+def removal_trial(plugin, tagger, releases, keep, steps):
+    """
+    Load the releases together, then remove all but one of them after the given number of event loop calls
+    :param releases: fixture releases, in the order loaded
+    :param keep: index of the release to keep
+    :param steps: number of calls to run before the removal
+    :return: (the album kept has finished loading, its metadata digest, number of calls run before the removal)
+    """
+    processors = [getattr(processor.__self__, processor.__name__) for processor in TRACK_PROCESSORS]
+    albums = []
+    for release in releases:
+        tagger.xmlws.server.add_release(release)
+        album = Album(tagger, release)
+        tagger.albums[album.id] = album
+        album.load(processors)
+        albums.append(album)
+    ran = LOOP.run(steps)
+    kept = albums.pop(keep)
+    for album in albums:
+        tagger.remove_album(album)
+    LOOP.run()
+    return kept.loaded, metadata_digest(kept) if kept.loaded else None, ran
+
+
+def removal_frontier(plugin, tagger, removed):
+    """
+    While the scenes and the opera are loading, queue a new parent work for a track of each, its depth rising between
+    the two (as when it is found through a deeper hierarchy), then remove one album - the work must still be looked up
+    for the other, which must finish loading
+    :param removed: index of the album to remove (0 for the scenes, 1 for the opera)
+    :return: list of failures
+    """
+    processors = [getattr(processor.__self__, processor.__name__) for processor in TRACK_PROCESSORS]
+    albums = []
+    for release in (scenes(), opera()):
+        tagger.xmlws.server.add_release(release)
+        album = Album(tagger, release)
+        tagger.albums[album.id] = album
+        album.load(processors)
+        albums.append(album)
+    # the look-ups now in flight are still outstanding, so the new work waits in the frontier
+    ring = Work(u'Der Ring des Nibelungen', albums[0].release.artist)
+    tagger.xmlws.server.works[ring.id] = ring
+    for depth, album in enumerate(albums, 1):
+        plugin.PART_LEVELS.work_depth[ring.id] = depth
+        plugin.PART_LEVELS.work_add_track(album, album._new_tracks[0], ring.id, 0)
+    tagger.remove_album(albums[removed])
+    LOOP.run()
+    kept = albums[1 - removed]
+    description = '%s removed: ' % albums[removed].release.name
+    failures = []
+    if ring.id in plugin.PART_LEVELS.frontier:
+        failures.append(description + 'the parent work was never looked up')
+    if not kept.loaded:
+        failures.append(description + 'the %s did not finish loading' % kept.release.name)
+    return failures
+
+
+def removal(stride):
+    """
+    Check that removing an album part-way through loading leaves another album sharing its works to load as if
+    alone: the opera is loaded with the release of its scenes (whose works are the parents of its track works), first
+    and then second, and the scenes are removed after every stride calls of the event loop
+    :return: exit status
+    """
+    expected = with_plugin(removal_trial, [opera()], 0, None)[1]
+    failures = with_plugin(removal_frontier, 0) + with_plugin(removal_frontier, 1)
+    cases = 2
+    for keep in (0, 1):
+        steps = 0
+        while True:
+            releases = [opera(), scenes()] if keep == 0 else [scenes(), opera()]
+            loaded, digest, ran = with_plugin(removal_trial, releases, keep, steps)
+            cases += 1
+            description = 'scenes loaded %s, removed after %d calls' % ('second' if keep == 0 else 'first', steps)
+            if not loaded:
+                failures.append(description + ': the opera did not finish loading')
+            elif digest != expected:
+                failures.append(description + ': the opera metadata differs')
+            if ran < steps:
+                break
+            steps += stride
+    return report_check(failures, cases, 'the opera loaded alone')
+
+
+def reference_longest_common_sequence(list1, list2, minstart=0, maxstart=0):
+    """
+    The original implementation of longest_common_sequence, which compares every slice
+    """
+    if maxstart < minstart:
+        return None, 0
+    min_len = min(len(list1), len(list2))
+    longest = 0
+    seq = None
+    maxstart = min(maxstart, min_len) + 1
+    for k in range(minstart, maxstart):
+        for i in range(k, min_len + 1):
+            if list1[k:i] == list2[k:i] and i - k > longest:
+                longest = i - k
+                seq = list1[k:i]
+    return {'sequence': seq, 'length': longest}
+
+
+def check_sequences(plugin, cases, seed=0):
+    """
+    Compare longest_common_sequence with the reference implementation on random lists of words (from a small
+    vocabulary, so that there are plenty of matches) and random start limits
+    :return: list of failures
+    """
+    rng = random.Random(seed)
+    failures = []
+    for case in range(cases):
+        vocabulary = [u'Akt', u'Szene', u'Nr.', u'I', u':', u'„Wess’', u'Herd'][:rng.randint(1, 7)]
+        list1 = [rng.choice(vocabulary) for _ in range(rng.randint(0, 12))]
+        list2 = list1[:rng.randint(0, len(list1))] + [rng.choice(vocabulary) for _ in range(rng.randint(0, 12))]
+        if rng.random() < 0.5:
+            list1, list2 = list2, list1
+        minstart = rng.randint(0, 14)
+        maxstart = rng.randint(0, 14) if rng.random() < 0.8 else minstart
+        args = (list1, list2, minstart, maxstart) if rng.random() < 0.8 else (list1, list2)
+        expected = reference_longest_common_sequence(*args)
+        result = plugin.longest_common_sequence(*args)
+        if result != expected:
+            failures.append('%r: %r (expected %r)' % (args, result, expected))
+    return failures
+
+
+def time_sequences(plugin, repeat=200):
+    """
+    Time both implementations on pairs of long opera number titles (as split into words by the plugin), with and
+    without a shared parent title
+    :return: [(description, words, reference seconds, new seconds), ...]
+    """
+    titles = [work.title for disc in opera().discs for recording in disc for work in recording.works]
+    parent = u' '.join(titles[-3:])
+    pairs = [(u'shared parent', plugin.WORDS.findall(parent + u': ' + titles[-2]),
+              plugin.WORDS.findall(parent + u': ' + titles[-1])),
+             (u'no common prefix', plugin.WORDS.findall(u' '.join(titles[:3])),
+              plugin.WORDS.findall(u' '.join(reversed(titles[:3]))))]
+    timings = []
+    for description, list1, list2 in pairs:
+        row = [description, min(len(list1), len(list2))]
+        for function in (reference_longest_common_sequence, plugin.longest_common_sequence):
+            start = time.time()
+            for _ in range(repeat):
+                function(list1, list2)
+            row.append((time.time() - start) / repeat)
+        timings.append(tuple(row))
+    return timings
+
+
+def sequences(plugin, tagger, cases):
+    """
+    :return: exit status
+    """
+    failures = check_sequences(plugin, cases)
+    for description, words, old_time, new_time in time_sequences(plugin):
+        print('%s (%d words): %.1f us, was %.1f us' % (description, words, new_time * 1e6, old_time * 1e6))
+    return report_check(failures, cases, 'the original implementation')
+
+
+def reference_longest_common_substring(s1, s2):
+    """
+    The original implementation of longest_common_substring, which fills the whole (m+1) x (n+1) table
+    """
+    m = [[0] * (1 + len(s2)) for i in xrange(1 + len(s1))]
+    longest, x_longest = 0, 0
+    for x in xrange(1, 1 + len(s1)):
+        for y in xrange(1, 1 + len(s2)):
+            if s1[x - 1] == s2[y - 1]:
+                m[x][y] = m[x - 1][y - 1] + 1
+                if m[x][y] > longest:
+                    longest = m[x][y]
+                    x_longest = x
+            else:
+                m[x][y] = 0
+    return {'string': s1[x_longest - longest: x_longest],
+            'start': x_longest - longest, 'length': x_longest}
+
+
+def check_substrings(plugin, cases, seed=0):
+    """
+    Compare each method of longest_common_substring with the reference implementation on random strings and lists
+    (from a small alphabet, so that there are plenty of matches, and long enough for both methods to be chosen)
+    :return: list of failures
+    """
+    rng = random.Random(seed)
+    failures = []
+    for case in range(cases):
+        alphabet = u'abcdé '[:rng.randint(1, 6)]
+        s1 = u''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        s2 = s1[rng.randint(0, len(s1)):rng.randint(0, len(s1))] + u''.join(
+            rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        if rng.random() < 0.5:
+            s1, s2 = s2, s1
+        if rng.random() < 0.3:
+            s1, s2 = list(s1), list(s2)
+            if rng.random() < 0.3:
+                # unhashable items
+                s1, s2 = [[item] for item in s1], [[item] for item in s2]
+        expected = reference_longest_common_substring(s1, s2)
+        for method in (None, 'dp', 'automaton'):
+            result = plugin.substring.longest_common_substring(s1, s2, method)
+            if result != expected:
+                failures.append('%r, %r, method %s: %r (expected %r)' % (s1, s2, method, result, expected))
+    return failures
+
+
+WORDS_FOR_LYRICS = u'''wess herd dies auch sei hier muss ich rasten ein fremder mann ihn muss ich fragen müd am herd
+fand ich den mann friedmund darf ich nicht heißen ein schwert verhieß mir der vater ich fänd es in höchster not im
+wunderschönen monat mai als alle knospen sprangen da ist in meinem herzen die liebe aufgegangen das wandern ist
+des müllers lust'''
+
+
+def lyrics(rng, words, shared):
+    """
+    :return: a pair of word lists (as turbo_lcs compares lyrics) of the given length, with a shared passage
+    """
+    vocabulary = WORDS_FOR_LYRICS.split()
+    passage = [rng.choice(vocabulary) for _ in range(shared)]
+    pair = []
+    for _ in range(2):
+        verse = [rng.choice(vocabulary) for _ in range(words - shared)]
+        at = rng.randint(0, len(verse))
+        pair.append(verse[:at] + passage + verse[at:])
+    return pair
+
+
+def time_substrings(plugin, repeat=3):
+    """
+    Time both implementations on the fixture track titles against their work titles (with the punctuation removed,
+    as the plugin compares them) and on lyrics
+    :return: [(description, reference seconds, new seconds), ...]
+    """
+    rng = random.Random(0)
+    nopunc = re.compile(r'\W', re.UNICODE)
+    titles = [(nopunc.sub(u'', work.title.lower()), nopunc.sub(u'', recording.title.lower()))
+              for fixture in FIXTURES.values() for disc in fixture().discs for recording in disc
+              for work in recording.works]
+    cases = [(u'%d title pairs' % len(titles), titles)]
+    for words, shared in ((300, 40), (1000, 120)):
+        cases.append((u'lyrics, 2 x %d words' % words, [lyrics(rng, words, shared)]))
+    cases.append((u'lyrics, 2 x 300 words as characters',
+                  [tuple(u' '.join(verse) for verse in lyrics(rng, 300, 40))]))
+    return [(description, best_time(reference_longest_common_substring, pairs, repeat),
+             best_time(plugin.longest_common_substring, pairs, repeat)) for description, pairs in cases]
+
+
+def substrings(plugin, tagger, cases):
+    """
+    :return: exit status
+    """
+    failures = check_substrings(plugin, cases)
+    for description, old_time, new_time in time_substrings(plugin):
+        print('%s: %.2f ms, was %.2f ms' % (description, new_time * 1e3, old_time * 1e3))
+    return report_check(failures, cases, 'the original implementation')
+
+
+def contains(sequence, part):
+    """
+    :return: True if part (a list) is a contiguous part of sequence (a string or list)
+    """
+    part = list(part)
+    return any(list(sequence[start:start + len(part)]) == part for start in range(len(sequence) - len(part) + 1))
+
+
+def brute_force_lcs_length(strings_list):
+    """
+    :return: the length of the longest common substring of the strings (or lists), by trying every substring of the
+        shortest one
+    """
+    shortest = min(strings_list, key=len)
+    for length in range(len(shortest), 0, -1):
+        for start in range(len(shortest) - length + 1):
+            if all(contains(item, shortest[start:start + length]) for item in strings_list):
+                return length
+    return 0
+
+
+def check_multi_lcs(plugin, cases, seed=0):
+    """
+    Check each multi_lcs backend against brute force on random lists of strings or lists (including a single string,
+    for which the whole string is returned)
+    :return: list of failures
+    """
+    rng = random.Random(seed)
+    failures = []
+    for case in range(cases):
+        alphabet = u'abcd'[:rng.randint(1, 4)]
+        common = u''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 6)))
+        strings_list = []
+        for _ in range(rng.choice((1, 1, 2, 3, 5, 12))):
+            item = u''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 10)))
+            at = rng.randint(0, len(item))
+            strings_list.append(item[:at] + common + item[at:])
+        if rng.random() < 0.3:
+            strings_list = [list(item) for item in strings_list]
+        expected = brute_force_lcs_length(strings_list)
+        for name, backend in sorted(plugin.lcsbackend.BACKENDS.items()):
+            response = backend(strings_list)['response']
+            if len(strings_list) == 1:
+                ok = response == list(strings_list[0])
+            else:
+                ok = len(response) == expected and all(contains(item, response) for item in strings_list)
+            if not ok:
+                failures.append('%r, %s: %r' % (strings_list, name, response))
+    return failures
+
+
+def time_multi_lcs(plugin, repeat=3):
+    """
+    Time each multi_lcs backend on blocks of lyrics (as turbo_lcs is given them)
+    :return: [(description, backend, seconds), ...]
+    """
+    rng = random.Random(0)
+    timings = []
+    for blocks in (10, 50):
+        strings_list = [verse for _ in range(blocks // 2) for verse in lyrics(rng, 300, 40)]
+        for name, backend in sorted(plugin.lcsbackend.BACKENDS.items()):
+            timings.append((u'%d blocks of 300 words' % blocks, name,
+                            best_time(backend, [(strings_list,)], repeat)))
+    return timings
+
+
+def multi_lcs(plugin, tagger, cases):
+    """
+    :return: exit status
+    """
+    failures = check_multi_lcs(plugin, cases)
+    for description, name, seconds in time_multi_lcs(plugin):
+        print('%s, %s: %.1f ms' % (description, name, seconds * 1e3))
+    return report_check(failures, cases, 'brute force')
+
+
+def reference_boil(s, eq='EQ_TO_BE_REVERSED'):
+    """
+    The original PartLevels.boil (without the logging), which makes every replacement and an NFD decomposition on
+    each call
+    """
+    s = s.lower()
+    if isinstance(s, str):
+        s = s.decode('unicode_escape')
+    s = s.replace(eq.lower(), '')\
+        .replace('sch', 'sh')\
+        .replace(u'\xdf', 'ss')\
+        .replace('sz', 'ss')\
+        .replace(u'\u0153', 'oe')\
+        .replace('oe', 'o')\
+        .replace(u'\u00fc', 'ue')\
+        .replace('ue', 'u')\
+        .replace('ae', 'a')
+    punc = re.compile(r'\W*')
+    s = ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
+    return punc.sub('', s).strip().lower().rstrip("s'")
+
+
+def boil_corpus():
+    """
+    :return: the fixture work and track titles, with variants as the plugin compares them (synonym markers, folded
+        and ascii spellings, utf-8 str)
+    """
+    titles = set()
+    for fixture in FIXTURES.values():
+        for disc in fixture().discs:
+            for recording in disc:
+                titles.add(recording.title)
+                for work in recording.works:
+                    titles.add(work.title)
+                    if work.parent:
+                        titles.add(work.parent.title)
+    corpus = set(titles)
+    for title in titles:
+        corpus.add(title.replace(u'ü', u'ue').replace(u'ß', u'ss'))
+        corpus.add(u'EQ_TO_BE_REVERSED ' + title.split(u':')[-1])
+        corpus.add(title.upper())
+    corpus = sorted(corpus)
+    return corpus + [title.encode('utf-8') for title in sorted(titles)]
+
+
+BOIL_ALPHABET = u'''aAeEosSchzZ ßœŒüÜäöéèçñåøÆﬁ\u0301\u0308\u4e2d\u0416.,;:'’!?-–„“()0123456789'''
+
+
+def check_boil(part_levels, corpus, cases, seed=0):
+    """
+    Compare boil with the reference implementation on the corpus and on random strings
+    :return: list of failures
+    """
+    rng = random.Random(seed)
+    strings = list(corpus)
+    for case in range(cases):
+        string = u''.join(rng.choice(BOIL_ALPHABET) for _ in range(rng.randint(0, 30)))
+        if rng.random() < 0.1:
+            string = string + u'EQ_TO_BE_REVERSED' + string
+        strings.append(string.encode('ascii', 'ignore') if rng.random() < 0.1 else string)
+    failures = []
+    for string in strings:
+        try:
+            expected = reference_boil(string)
+        except UnicodeError as err:
+            expected = type(err)
+        try:
+            result = part_levels.boil('bench', string)
+        except UnicodeError as err:
+            result = type(err)
+        if result != expected:
+            failures.append('%r: %r (expected %r)' % (string, result, expected))
+    return failures
+
+
+def boil(plugin, tagger, cases):
+    """
+    :return: exit status
+    """
+    part_levels = plugin.PartLevels()
+    part_levels.DEBUG = part_levels.INFO = False
+    part_levels.EQ = 'EQ_TO_BE_REVERSED'
+    corpus = boil_corpus()
+    failures = check_boil(part_levels, corpus, cases)
+    rng = random.Random(0)
+    draws = [('bench', rng.choice(corpus)) for _ in range(20000)]
+
+    def uncached(release_id, string):
+        part_levels.boiled.clear()
+        part_levels.boil(release_id, string)
+
+    timings = [('original', best_time(lambda release_id, string: reference_boil(string), draws)),
+               ('memoised', best_time(part_levels.boil, draws)),
+               ('uncached', best_time(uncached, draws))]
+    print('%d boils drawn from %d titles' % (len(draws), len(corpus)))
+    for description, seconds in timings:
+        print('  %s: %.1f ms (%.1f us per call)' % (description, seconds * 1e3, seconds / len(draws) * 1e6))
+    return report_check(failures, len(corpus) + cases, 'the original boil')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--releases', default=','.join(FIXTURES),
+                        help='fixture releases to load (default: %(default)s)')
+    parser.add_argument('--passes', type=int, default=1,
+                        help='number of loads of each release (the second and later loads are refreshes)')
+    parser.add_argument('--cycles', type=int, default=1,
+                        help='number of times to add (and remove) each release as a new album')
+    parser.add_argument('--batch', action='store_true', help='look up works by browsing composers (cwp_batch)')
+    parser.add_argument('--no-background', action='store_true',
+                        help='do the end-of-album processing on the main thread (ce_background off)')
+    parser.add_argument('--no-reuse', action='store_true',
+                        help='run the end-of-album processing on every load, even if its inputs are unchanged')
+    parser.add_argument('--user-dir', help='directory for logs and disk caches (default: a new temporary directory, '
+                                           'so that the disk caches start empty)')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results with this JSON file (from --save)')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction by which a stage may be slower than the baseline (default: %(default)s)')
+    parser.add_argument('--sequences', type=int, metavar='N',
+                        help='check longest_common_sequence on N random inputs and time it, instead of loading '
+                             'releases')
+    parser.add_argument('--queries', action='store_true',
+                        help='check parse_batch against the original parse_data on the work look-ups for the '
+                             'fixture releases and time both, instead of loading releases')
+    parser.add_argument('--options', action='store_true',
+                        help='check the per-track options against the original per-track copy and time both, '
+                             'instead of loading releases')
+    parser.add_argument('--substrings', type=int, metavar='N',
+                        help='check longest_common_substring on N random inputs and time it, instead of loading '
+                             'releases')
+    parser.add_argument('--multi-lcs', type=int, metavar='N',
+                        help='check the multi_lcs backends against brute force on N random inputs and time them, '
+                             'instead of loading releases')
+    parser.add_argument('--boil', type=int, metavar='N',
+                        help='check boil on the fixture titles and N random strings and time it, instead of loading '
+                             'releases')
+    parser.add_argument('--removal', type=int, metavar='N',
+                        help='check that removing an album every N event loop calls into loading leaves another '
+                             'album sharing its works to load as if alone, instead of loading releases')
+    args = parser.parse_args()
+    if args.sequences is not None:
+        sys.exit(with_plugin(sequences, args.sequences))
+    if args.substrings is not None:
+        sys.exit(with_plugin(substrings, args.substrings))
+    if args.multi_lcs is not None:
+        sys.exit(with_plugin(multi_lcs, args.multi_lcs))
+    if args.boil is not None:
+        sys.exit(with_plugin(boil, args.boil))
+    if args.removal is not None:
+        sys.exit(removal(args.removal))
+    if args.queries:
+        sys.exit(with_plugin(queries))
+    if args.options:
+        sys.exit(with_plugin(options))
+    args.releases = args.releases.split(',')
+    for name in args.releases:
+        if name not in FIXTURES:
+            parser.error('unknown release %r - choose from %s' % (name, ', '.join(FIXTURES)))
+    user_dir = args.user_dir or tempfile.mkdtemp(prefix='classical_extras_bench')
+    try:
+        results, sizes, import_time = run(args, user_dir)
+    finally:
+        if not args.user_dir:
+            shutil.rmtree(user_dir, ignore_errors=True)
+    report(results, sizes, import_time)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nREGRESSIONS:')
+            for regression in regressions:
+                print('  ' + regression)
+            sys.exit(1)
+        print('\nNo regressions against %s' % args.compare)
+
+
+if __name__ == '__main__':
+    main()
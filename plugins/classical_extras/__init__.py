@@ -63,10 +63,11 @@ PLUGIN_LICENSE = "GPL-2.0"
 PLUGIN_LICENSE_URL = "https://www.gnu.org/licenses/gpl-2.0.html"
 
 from picard.ui.options import register_options_page, OptionsPage
-from picard.plugins.classical_extras.ui_options_classical_extras import Ui_ClassicalExtrasOptionsPage
+from picard.ui.itemviews import BaseAction, register_album_action
+# NB ui_options_classical_extras is only imported when the options page is first shown (see ClassicalExtrasOptionsPage)
 from picard import config, log
 from picard.config import ConfigSection, BoolOption, IntOption, TextOption
-from picard.util import LockableObject, uniqify
+from picard.util import LockableObject, uniqify, thread
 
 # note that in 2.0 picard.webservice will change to picard.util.xml
 from picard.webservice import XmlNode
@@ -82,13 +83,23 @@ import copy
 import os
 import itertools
 import codecs  # needed for Python 2.7
-from PyQt4.QtCore import QXmlStreamReader
+import cPickle
+import threading
+import atexit
+from PyQt4.QtCore import QXmlStreamReader, QTimer, QFile, QIODevice, QThreadPool
 from picard.file import File
 from picard.track import Track
 from picard.tagger import Tagger
 from picard.const import USER_DIR
-import suffixtree
+import substring
+import lcsbackend
+import diskcache
+import xmlquery
 import operator
+import heapq
+import bisect
+import hashlib
+import weakref
 
 
 ##########################
@@ -99,22 +110,132 @@ import operator
 
 # If logging occurs before any album is loaded, the startup log file will be written
 log_files = collections.defaultdict(dict)
-# entries are release-ids: to keep track of which log files are open
+# entries are release-ids: to keep track of which log files are open - format is {release_id: file name, ...}
+# (the files themselves are held by LOG_WRITER)
 release_status = collections.defaultdict(dict)
 # release_status[release_id]['works'] = True indicates that we are still processing works for release_id
 # & similarly for 'artists'
 # release_status[release_id]['start'] holds start time of release processing
 # release_status[release_id]['name'] holds the album name
 # release_status[release_id]['lookups'] holds number of lookups for this release
+# release_status[release_id]['lookups_saved'] holds number of lookups saved by batching (if used)
 # release_status[release_id]['file_objects'] holds a cumulative list of file objects (tagger seems a bit unreliable)
+# release_status[release_id]['file_index'] holds the FileIndex of those file objects
 # release_status[release_id]['file_found'] = False indicates that "No file with matching trackid" has (yet) been found
+# release_status[release_id]['options'] holds the ReleaseOptions shared by the tracks of the release
+# release_status[release_id]['track_options'] holds the TrackOptions for each track - format is {track: options, ...}
+# release_status[release_id]['debug'], ['warnings'] and ['errors'] hold the messages logged (as OrderedSets)
+# release_status[release_id]['fingerprint'] holds the digest of the release XML (see release_fingerprint)
+# release_status[release_id]['skipped'] holds the names of album stages skipped as their inputs were unchanged
+
+class LogWriter(object):
+    """
+    Writes the custom log files on a background thread, so that processing is not held up by file i/o.
+    Requests are queued as (action, release_id, data), where action is:
+        'open' - data is [full path of file, header text, flush when written (boolean), json lines (boolean)]
+        'write' - data is (datetime, log_type, message)
+        'close' - data is None
+        'close_all' - data is None
+        'sync' - data is a threading.Event, set when everything before it has been written
+    The queue is written every FLUSH_INTERVAL seconds (rather than waking the thread for every message).
+    """
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self):
+        self.pending = collections.deque()
+        self.wake = threading.Event()
+        self.files = {}  # format is {release_id: [file object, flush, json], ...}
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, action, release_id, data=None):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='Classical Extras log writer')
+                    self.thread.daemon = True
+                    self.thread.start()
+        self.pending.append((action, release_id, data))
+
+    def run(self):
+        while True:
+            self.wake.wait(self.FLUSH_INTERVAL)
+            self.wake.clear()
+            while self.pending:
+                action, release_id, data = self.pending.popleft()
+                try:
+                    self.process(action, release_id, data)
+                except Exception as err:
+                    log.error('%s: Error in log writer: %s', PLUGIN_NAME, err)
+            for log_file, flush, json_lines in self.files.values():
+                if flush:
+                    # so that session log (low volume) is up to date even if not closed
+                    log_file.flush()
+
+    def process(self, action, release_id, data):
+        if action == 'open':
+            path, header, flush, json_lines = data
+            try:
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                # need codecs for python 2.7 to write unicode
+                log_file = codecs.open(path, 'w', encoding='utf8')
+                log_file.write(header)
+                self.files[release_id] = [log_file, flush, json_lines]
+            except (IOError, OSError):
+                log.error('Unable to open file %s for writing log', path)
+        elif action == 'write' and release_id in self.files:
+            log_file, flush, json_lines = self.files[release_id]
+            timestamp, log_type, msg = data
+            try:
+                if json_lines:
+                    log_file.write(json.dumps({'t': str(timestamp), 'l': log_type[0].upper(), 'm': msg},
+                                              separators=(',', ':')) + '\n')
+                else:
+                    log_file.write(log_type[0].upper() + ': ' + str(timestamp) + ' : ' + msg + '\n')
+            except IOError:
+                log.error('Unable to write to log file %s', log_file.name)
+        elif action == 'close' and release_id in self.files:
+            self.files.pop(release_id)[0].close()
+        elif action == 'close_all':
+            for log_file in self.files.values():
+                log_file[0].close()
+            self.files = {}
+        elif action == 'sync':
+            data.set()
+
+    def wait(self):
+        """
+        Wait until everything queued has been written
+        :return:
+        """
+        if self.thread is not None:
+            done = threading.Event()
+            self.put('sync', None, done)
+            self.wake.set()
+            done.wait()
+
+    def shutdown(self):
+        """
+        Write everything queued and close the files (called on exit)
+        :return:
+        """
+        if self.thread is not None:
+            self.put('close_all', None)
+            self.wait()
+
+
+LOG_WRITER = LogWriter()
+atexit.register(LOG_WRITER.shutdown)
+
 
 def write_log(release_id, log_type, message, *args):
     """
     Custom logging function - if log_info is set, all messages will be written to a custom file in a 'Classical_Extras'
     subdirectory in the same directory as the main Picard log. A different file is used for each album,
-    to aid in debugging - the log file is release_id.log. Any startup messages (i.e. before a release has been loaded)
-    are written to startup.log
+    to aid in debugging - the log file is release_id.log (or release_id.jsonl if log_json is set). Any startup messages
+    (i.e. before a release has been loaded) are written to startup.log
+    Messages are only formatted if they are to be written and the files are written by LOG_WRITER in the background.
     :param release_id: name for log file - usually =musicbrainz_albumid
         unless called outside metadata processor
     :param log_type: 'error', 'warning', 'debug' or 'info'
@@ -123,6 +244,13 @@ def write_log(release_id, log_type, message, *args):
     :return:
     """
     options = config.setting
+    # if log_info is True, all log messages will be written to the custom log, regardless of other log_... settings
+    # basic session log will always be written (summary of releases and processing times)
+    custom_log = options["log_info"] or log_type == "basic"
+    # Only debug, warning and error messages will be written to the main Picard log, if those options have been set
+    picard_log = log_type in ('debug', 'warning', 'error') and options["log_" + log_type]
+    if not (custom_log or picard_log):
+        return
     if not (isinstance(message, str) or isinstance(message, unicode)):
         msg = repr(message)
     else:
@@ -130,71 +258,48 @@ def write_log(release_id, log_type, message, *args):
     if args:
         msg = msg % args
 
-    if options["log_info"] or log_type == "basic":
-        # if log_info is True, all log messages will be written to the custom log, regardless of other log_... settings
-        # basic session log will always be written (summary of releases and processing times)
-        filename = release_id + ".log"
-        log_dir = os.path.join(USER_DIR, "Classical_Extras")
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
+    if custom_log:
         if release_id not in log_files:
-            try:
-                if release_id == 'session':
-                    log_file = codecs.open(os.path.join(log_dir, filename), 'w', encoding='utf8', buffering=0)
-                    # buffering=0 so that session log (low volume) is up to date even if not closed
-                else:
-                    log_file = codecs.open(os.path.join(log_dir, filename), 'w', encoding='utf8')
-                    # default buffering for speed
-                # need codecs for python 2.7 to write unicode
-                log_files[release_id] = log_file
-                log_file.write(PLUGIN_NAME + ' Version:' + PLUGIN_VERSION + '\n')
+            json_lines = options["log_json"] and release_id != 'session'
+            if json_lines:
+                filename = release_id + ".jsonl"
+                header = {'plugin': PLUGIN_NAME, 'version': PLUGIN_VERSION, 'release_id': release_id}
+                if release_id in release_status and 'name' in release_status[release_id]:
+                    header['album'] = release_status[release_id]['name']
+                header = json.dumps(header, separators=(',', ':')) + '\n'
+            else:
+                filename = release_id + ".log"
+                header = PLUGIN_NAME + ' Version:' + PLUGIN_VERSION + '\n'
                 if release_id == 'session':
-                    log_file.write('session' + '\n')
+                    header += 'session' + '\n'
                 else:
-                    log_file.write('Release id: ' + release_id + '\n')
+                    header += 'Release id: ' + release_id + '\n'
                     if release_id in release_status and 'name' in release_status[release_id]:
-                        log_file.write('Album name: ' + release_status[release_id]['name'] + '\n')
-            except IOError:
-                log.error('Unable to open file %s for writing log', filename)
-                return
-        else:
-            log_file = log_files[release_id]
-        try:
-            log_file.write(log_type[0].upper() + ': ')
-            log_file.write(str(datetime.now()) + ' : ')
-            log_file.write(msg)
-            log_file.write("\n")
-        except IOError:
-            log.error('Unable to write to log file %s', filename)
-            return
-    # Only debug, warning and error messages will be written to the main Picard log, if those options have been set
+                        header += 'Album name: ' + release_status[release_id]['name'] + '\n'
+            log_files[release_id] = filename
+            LOG_WRITER.put('open', release_id, [os.path.join(USER_DIR, "Classical_Extras", filename), header,
+                                                release_id == 'session', json_lines])
+        LOG_WRITER.put('write', release_id, (datetime.now(), log_type, msg))
+    if not picard_log:
+        return
     if log_type != 'info' and log_type != 'basic':  # i.e. non-custom log items
         message2 = PLUGIN_NAME + ': ' + message
     else:
         message2 = message
-    if log_type == 'debug' and options["log_debug"]:
-        if release_id in release_status and 'debug' in release_status[release_id]:
-            add_list_uniquely(release_status[release_id]['debug'], msg)
-        else:
-            release_status[release_id]['debug'] = [msg]
+    if log_type == 'debug':
+        release_status[release_id].setdefault('debug', OrderedSet()).add(msg)
         if args:
             log.debug(message2, *args)
         else:
             log.debug(message2)
-    if log_type == 'warning' and options["log_warning"]:
-        if release_id in release_status and 'warnings' in release_status[release_id]:
-            add_list_uniquely(release_status[release_id]['warnings'], msg)
-        else:
-            release_status[release_id]['warnings'] = [msg]
+    if log_type == 'warning':
+        release_status[release_id].setdefault('warnings', OrderedSet()).add(msg)
         if args:
             log.warning(message2, *args)
         else:
             log.warning(message2)
-    if log_type == 'error' and options["log_error"]:
-        if release_id in release_status and 'errors' in release_status[release_id]:
-            add_list_uniquely(release_status[release_id]['errors'], msg)
-        else:
-            release_status[release_id]['errors'] = [msg]
+    if log_type == 'error':
+        release_status[release_id].setdefault('errors', OrderedSet()).add(msg)
         if args:
             log.error(message2, *args)
         else:
@@ -216,12 +321,15 @@ def close_log(release_id, caller):
     if release_id in release_status:
         duration = datetime.now() - release_status[release_id]['start']
         lookups = release_status[release_id]['lookups']
+        if 'lookups_saved' in release_status[release_id]:
+            lookups = '%s (%s saved by batching)' % (lookups, release_status[release_id]['lookups_saved'])
+            del release_status[release_id]['lookups_saved']
         del release_status[release_id]['start']
         del release_status[release_id]['lookups']
     if release_id in log_files:
         write_log(release_id, 'info', 'Duration = %s. Number of lookups = %s.', duration, lookups)
         write_log(release_id, 'info', 'Closing log file for %s', release_id)
-        log_files[release_id].close()
+        LOG_WRITER.put('close', release_id)
         del log_files[release_id]
     if 'session' in log_files and release_id in release_status:
         write_log('session', 'basic', '\n Completed processing release id %s. Details below:-', release_id)
@@ -242,6 +350,9 @@ def close_log(release_id, caller):
             for debug in release_status[release_id]['debug']:
                 write_log('session', 'basic', debug)
             del release_status[release_id]['debug']
+        if 'skipped' in release_status[release_id]:
+            write_log('session', 'basic', 'Stages skipped (inputs unchanged since last load, so previous outputs '
+                                          're-used): %s', ', '.join(release_status[release_id]['skipped']))
         write_log('session', 'basic', 'Duration = %s. Number of lookups = %s.', duration, lookups)
     if release_id in release_status:
         del release_status[release_id]
@@ -253,41 +364,12 @@ _node_name_re = re.compile('[^a-zA-Z0-9]')
 def _node_name(n):
     return _node_name_re.sub('_', unicode(n))
 
-def _read_xml(stream):
-    document = XmlNode()
-    current_node = document
-    path = []
-
-    while not stream.atEnd():
-        stream.readNext()
-
-        if stream.isStartElement():
-            node = XmlNode()
-            attrs = stream.attributes()
-
-            for i in xrange(attrs.count()):
-                attr = attrs.at(i)
-                node.attribs[_node_name(attr.name())] = unicode(attr.value())
-
-            current_node.append_child(_node_name(stream.name()), node)
-            path.append(current_node)
-            current_node = node
-
-        elif stream.isEndElement():
-            current_node = path.pop()
-
-        elif stream.isCharacters():
-            current_node.text += unicode(stream.text())
-
-    return document
-
-
 def parse_data(release_id, obj, response_list, *match):
     """
     :param release_id: name for log file - usually =musicbrainz_albumid
         unless called outside metadata processor
     :param obj: an XmlNode object, list or dictionary containing nodes
-    :param response_list: working memory for recursive calls
+    :param response_list: list to which the matching items are appended
     :param match: list of items to search for in node (see detailed notes below
     :return: a list of matching items (always a list, even if only one item)
     This function takes any XmlNode object, or list thereof,
@@ -300,72 +382,92 @@ def parse_data(release_id, obj, response_list, *match):
      a sibling with childname has text childtext.
       (Note: childname can be a dot-list if the text is more than one level down - e.g. child1.child2)
       # TODO - Check this works fully
+    To evaluate several match paths against the same node, use parse_batch (one traversal for all of them).
     """
-    DEBUG = False  # config.setting["log_debug"]
-    INFO = False  # config.setting["log_info"]
-    # Over-ridden options as these can be VERY wordy
+    # The match path is compiled once (see xmlquery.py) rather than being re-interpreted at every level of recursion
+    response_list.extend(xmlquery.compile_query(match)(obj))
+    return response_list
 
-    # XmlNode instances are not iterable, so need to convert to dict
-    if isinstance(obj, XmlNode):
-        obj = obj.__dict__
-    if DEBUG or INFO:
-        write_log(release_id, 'debug', 'Parsing data - looking for %s', match)
-    if INFO:
-        write_log(release_id, 'info', 'looking in %s', obj)
-    if isinstance(obj, list):
-        for item in obj:
-            if isinstance(item, XmlNode):
-                item = item.__dict__
-            parse_data(release_id, item, response_list, *match)
-        return response_list
-    elif isinstance(obj, dict):
-        if match[0] in obj:
-            if len(match) == 1:
-                response = obj[match[0]]
-                response_list.append(response)
-            else:
-                match_list = list(match)
-                match_list.pop(0)
-                parse_data(release_id, obj[match[0]], response_list, *match_list)
-            if INFO:
-                write_log(release_id, 'info', 'response_list: %s', response_list)
-            return response_list
-        elif '.' in match[0]:
-            test = match[0].split(':')
-            match2 = test[0].split('.')
-            test_data = parse_data(release_id, obj, [], *match2)
-            if len(test) > 1:
-                if test[1] in test_data:
-                    if len(match) == 1:
-                        response = obj
-                        response_list.append(response)
-                    else:
-                        match_list = list(match)
-                        match_list.pop(0)
-                        parse_data(release_id, obj, response_list, *match_list)
-            else:
-                parse_data(release_id, obj, response_list, *match2)
-            if INFO:
-                write_log(release_id, 'info', 'response_list: %s', response_list)
-            return response_list
-        else:
-            if 'children' in obj:
-                parse_data(release_id, obj['children'], response_list, *match)
-            if INFO:
-                write_log(release_id, 'info', 'response_list: %s', response_list)
-            return response_list
-    else:
-        if INFO:
-            write_log(release_id, 'info', 'response_list: %s', response_list)
-        return response_list
 
-def create_dict_from_ref_list(options, release_id, ref_list, keys, tags):
-    ref_dict_list = []
-    for refs in ref_list:
-        for ref in refs:
-            parsed_refs = [parse_data(release_id, ref, [], t, 'text') for t in tags]
-            ref_dict_list.append(dict(zip(keys, parsed_refs)))
-    return ref_dict_list
+def parse_batch(release_id, obj, *matches):
+    """
+    :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+    :param obj: an XmlNode object, list or dictionary containing nodes
+    :param matches: match lists, each as for parse_data
+    :return: a list with one result list per match list (the same as parse_data would return for that match list)
+    All the match lists are evaluated in a single traversal of obj
+    """
+    return xmlquery.query_batch(obj, matches)
+
+
+REFERENCE_RECORDS = {
+    # record element in Reference.xml: (list name, keys, field elements)
+    'Composer': ('composers', ['name', 'sort', 'birth', 'death', 'country', 'core'],
+                 ['Name', 'Sort', 'Birth', 'Death', 'CountryCode', 'Core']),
+    'ClassicalPeriod': ('periods', ['name', 'start', 'end'], ['Name', 'Start_x0020_Date', 'End_x0020_Date']),
+    'ClassicalGenre': ('genres', ['name'], ['Name'])}
+REFERENCE_CACHE_VERSION = 1  # change if the format of the cached references changes
+
+
+def read_references(stream):
+    """
+    Read the Muso reference file, building only the composer, period and genre records
+    (rather than a tree of the whole file)
+    :param stream: QXmlStreamReader on the file
+    :return: {'composers': [...], 'periods': [...], 'genres': [...]}
+    Each record is a dict of {key: [text, ...]} - one text for each field element, as parse_data would return
+    """
+    refs = {'composers': [], 'periods': [], 'genres': []}
+    depth = 0
+    in_db = False
+    record = None  # the record being read
+    fields = {}  # {field element: key} for the record being read
+    field = None  # the key of the field being read
+    while not stream.atEnd():
+        stream.readNext()
+        if stream.isStartElement():
+            depth += 1
+            name = _node_name(stream.name())
+            if depth == 1:
+                in_db = name == 'ReferenceDB'
+            elif depth == 2 and in_db and name in REFERENCE_RECORDS:
+                list_name, keys, tags = REFERENCE_RECORDS[name]
+                record = dict((key, []) for key in keys)
+                fields = dict(zip(tags, keys))
+                refs[list_name].append(record)
+            elif depth == 3 and record is not None and name in fields:
+                field = fields[name]
+                record[field].append(u'')
+        elif stream.isEndElement():
+            if depth == 3:
+                field = None
+            elif depth == 2:
+                record = None
+            depth -= 1
+        elif stream.isCharacters() and depth == 3 and field:
+            record[field][-1] += unicode(stream.text())
+    return refs
+
+
+def index_references(refs):
+    """
+    :param refs: as returned by read_references
+    :return: refs, plus a composer index (by lower-case name and sort name) and a PeriodIndex of the periods
+    """
+    composer_index = {}
+    for composer in refs['composers']:
+        composer['lc_name'] = [c.lower() for c in composer['name']]
+        composer['lc_sort'] = [c.lower() for c in composer['sort']]
+    # index the composers so that they can be found directly - names take precedence over sort names
+    # and the first composer listed is used if there are duplicates
+    for key in ['lc_name', 'lc_sort']:
+        for composer in refs['composers']:
+            for lc_name in composer[key]:
+                composer_index.setdefault(lc_name, composer)
+    refs['composer_index'] = composer_index
+    refs['period_index'] = PeriodIndex(muso_periods(refs['periods']))
+    return refs
 
 
 def get_references_from_file(release_id, path, filename):
@@ -374,44 +476,238 @@ def get_references_from_file(release_id, path, filename):
     :param release_id: name of log file
     :param path: Reference file path
     :param filename: Reference file name
-    :return:
+    :return: dict of composers, periods and genres (lists of dicts), plus a composer index (by lower-case name and
+    sort name) and a PeriodIndex of the periods
+    The records are cached (in the Classical_Extras directory) and only re-read from the file if it has changed
     """
     options = config.setting
-    composer_dict_list = []
-    period_dict_list = []
-    genre_dict_list = []
+    refs = {'composers': [], 'periods': [], 'genres': []}
+    ref_file = os.path.join(path, filename)
+    cache_file = os.path.join(USER_DIR, 'Classical_Extras', 'references.cache')
     try:
-        xml_file = open(os.path.join(path, filename))
-        reply = xml_file.read()
-        xml_file.close()
-        document = _read_xml(QXmlStreamReader(reply))
-        # Composers
-        composer_list = parse_data(release_id, document, [], 'ReferenceDB', 'Composer')
-        keys = ['name', 'sort', 'birth', 'death', 'country', 'core']
-        tags = ['Name', 'Sort', 'Birth', 'Death', 'CountryCode', 'Core']
-        composer_dict_list = create_dict_from_ref_list(options, release_id, composer_list, keys, tags)
-        # Periods
-        period_list = parse_data(release_id, document, [], 'ReferenceDB', 'ClassicalPeriod')
-        keys = ['name', 'start', 'end']
-        tags = ['Name', 'Start_x0020_Date', 'End_x0020_Date']
-        period_dict_list = create_dict_from_ref_list(options, release_id, period_list, keys, tags)
-        # Genres
-        genre_list = parse_data(release_id, document, [], 'ReferenceDB', 'ClassicalGenre')
-        keys = ['name']
-        tags = ['Name']
-        genre_dict_list = create_dict_from_ref_list(options, release_id, genre_list, keys, tags)
-
-    except IOError:
+        stat = os.stat(ref_file)
+        source = [ref_file, stat.st_mtime, stat.st_size, REFERENCE_CACHE_VERSION]
+        cached = None
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'rb') as f:
+                    cached = cPickle.load(f)
+            except (IOError, EOFError, cPickle.UnpicklingError, ValueError) as err:
+                write_log(release_id, 'warning', 'Unable to read cache of %s: %s', ref_file, err)
+        if cached and cached['source'] == source:
+            refs = cached['refs']
+        else:
+            xml_file = QFile(ref_file)
+            if not xml_file.open(QIODevice.ReadOnly):
+                raise IOError(unicode(xml_file.errorString()))
+            refs = read_references(QXmlStreamReader(xml_file))
+            xml_file.close()
+            try:
+                if not os.path.exists(os.path.dirname(cache_file)):
+                    os.makedirs(os.path.dirname(cache_file))
+                with open(cache_file, 'wb') as f:
+                    cPickle.dump({'source': source, 'refs': refs}, f, cPickle.HIGHEST_PROTOCOL)
+            except (IOError, OSError) as err:
+                write_log(release_id, 'warning', 'Unable to cache %s: %s', ref_file, err)
+    except (IOError, OSError):
         if options['cwp_muso_genres'] or options['cwp_muso_classical'] or options['cwp_muso_dates'] or options['cwp_muso_periods']:
-            write_log(release_id, 'error', 'File %s does not exist or is corrupted', os.path.join(path, file))
+            write_log(release_id, 'error', 'File %s does not exist or is corrupted', ref_file)
     finally:
-        return {'composers': composer_dict_list, 'periods': period_dict_list, 'genres': genre_dict_list}
+        return index_references(refs)
+
+
+class MusoReferences(object):
+    """
+    The Muso reference database, read on first use (so that it is not read at all unless Muso options are used)
+    and re-read if the file or its location changes
+    """
+
+    def __init__(self):
+        self.ref_file = None
+        self.refs = None
+
+    def get(self):
+        """
+        :return: as get_references_from_file, for the file in the current options
+        """
+        path = config.setting['cwp_muso_path']
+        filename = config.setting['cwp_muso_refdb']
+        if self.refs is None or self.ref_file != (path, filename):
+            self.ref_file = (path, filename)
+            self.refs = get_references_from_file('session', path, filename)
+            write_log('session', 'info', 'External references (Muso):')
+            write_log('session', 'info', self.refs)
+            if config.setting['cwp_muso_classical'] and not self.refs['composers']:
+                write_log('session', 'error', 'No composer roster found')
+            if (config.setting['cwp_muso_dates'] or config.setting['cwp_muso_periods']) and not self.refs['periods']:
+                write_log('session', 'error', 'No period map found')
+            if config.setting['cwp_muso_genres'] and not self.refs['genres']:
+                write_log('session', 'error', 'No classical genre list found')
+        return self.refs
+
+
+MUSO_REFS = MusoReferences()
+
+
+def muso_periods(period_dict_list):
+    """
+    :param period_dict_list: periods from the Muso reference file
+    :return: dict of {period name: (start year, end year)} or {period name: error text}
+    """
+    periods = {}
+    for p_item in period_dict_list:
+        if 'start' not in p_item or p_item['start'] == []:
+            p_item['start'] = [u'-9999']
+        if 'end' not in p_item or p_item['end'] == []:
+            p_item['end'] = [u'2525']
+        if 'name' not in p_item or p_item['name'] == []:
+            p_item['name'] = ['NOT SPECIFIED']
+        periods[list_to_str(p_item['name']).strip()] = (list_to_str(p_item['start']), list_to_str(p_item['end']))
+    for period in periods:
+        if periods[period][0].lstrip('-').isdigit() and periods[period][1].lstrip('-').isdigit():
+            periods[period] = (int(periods[period][0]), int(periods[period][1]))
+        else:
+            periods[period] = 'ERROR - start and/or end of ' + period + ' are not integers'
+    return periods
+
+
+def user_periods(period_map):
+    """
+    :param period_map: period map option text - 'period, start, end; period, start, end; ...'
+    :return: dict of {period name: (start year, end year)} or {period name: error text}
+    """
+    periods = {}
+    for p in [p.strip() for p in period_map.split(';')]:
+        p = p.split(',')
+        if len(p) == 3:
+            period = p[0].strip()
+            start = p[1].strip()
+            end = p[2].strip()
+            if start.lstrip('-').isdigit() and end.lstrip('-').isdigit():
+                periods[period] = (int(start), int(end))
+            else:
+                periods[period] = 'ERROR - start and/or end of ' + period + ' are not integers'
+        else:
+            periods[p[0]] = 'ERROR in period map - each item must contain 3 elements'
+    return periods
+
+
+class PeriodIndex(object):
+    """
+    Interval index over a period map: the years are split at every period boundary and the periods covering each
+    segment are listed (in order of start year), so that the periods covering a year are found by bisection
+    """
+
+    def __init__(self, periods):
+        """
+        :param periods: as returned by muso_periods or user_periods
+        """
+        self.size = len(periods)
+        self.errors = sorted(text for text in periods.values() if isinstance(text, basestring))
+        ranges = sorted((span, period) for period, span in periods.items() if not isinstance(span, basestring))
+        self.bounds = sorted(set([span[0] for span, _ in ranges] + [span[1] + 1 for span, _ in ranges]))
+        self.covering = [[period for span, period in ranges if span[0] <= bound <= span[1]] for bound in self.bounds]
+
+    def __len__(self):
+        return self.size
+
+    def lookup(self, year):
+        """
+        :param year: integer
+        :return: list of the names of periods which include the year
+        """
+        i = bisect.bisect_right(self.bounds, year) - 1
+        if i < 0:
+            return []
+        return self.covering[i]
+
+
+user_period_indexes = {}
+# PeriodIndex for each period map option text used - format is {period_map: PeriodIndex, ...}
+
+
+def get_period_index(options):
+    """
+    :param options:
+    :return: the PeriodIndex for the period map in use (built once for each map)
+    """
+    if options['cwp_use_muso_refdb'] and options['cwp_muso_periods'] and MUSO_REFS.get()['periods']:
+        return MUSO_REFS.get()['period_index']
+    period_map = options['cwp_period_map']
+    if period_map not in user_period_indexes:
+        user_period_indexes[period_map] = PeriodIndex(user_periods(period_map))
+    return user_period_indexes[period_map]
+
+
+class GenreIndex(object):
+    """
+    The four genre lists in use (main and sub-genres, classical and other) with the lower-case form of each name, so
+    that a track's candidate genres are matched against all the lists in one pass over each
+    """
+
+    def __init__(self, main_classical, sub_classical, main_other, sub_other):
+        """
+        :param main_classical: list of genre names
+        :param sub_classical:
+        :param main_other:
+        :param sub_other:
+        """
+        self.lists = [[(name, name.lower()) for name in names]
+                      for names in (main_classical, sub_classical, main_other, sub_other)]
+
+    def classify(self, candidate_genres):
+        """
+        :param candidate_genres: list of genre names (in any case)
+        :return: [main classical, sub classical, main other, sub other] - the names in each list which are candidates
+        (in list order)
+        """
+        candidates = set(genre.lower() for genre in candidate_genres)
+        return [[name for name, lc_name in names if lc_name in candidates] for names in self.lists]
+
+
+user_genre_indexes = {}
+# GenreIndex for each set of genre option texts used - format is {(main classical, sub classical, main other,
+# sub other): GenreIndex, ...}
+
+
+def get_genre_index(options):
+    """
+    :param options:
+    :return: the GenreIndex for the genre lists in use (built once for each set of option texts)
+    """
+    texts = (options['cwp_genres_classical_sub'], options['cwp_genres_other_main'], options['cwp_genres_other_sub'])
+    if options['cwp_use_muso_refdb'] and options['cwp_muso_genres'] and MUSO_REFS.get()['genres']:
+        # the main classical genres are from the reference file - kept with it, so re-built if it is re-read
+        refs = MUSO_REFS.get()
+        indexes = refs.setdefault('genre_indexes', {})
+        if texts not in indexes:
+            indexes[texts] = GenreIndex([list_to_str(mg['name']).strip() for mg in refs['genres']],
+                                        *[[sg.strip() for sg in text.split(',')] for text in texts])
+        return indexes[texts]
+    texts = (options['cwp_genres_classical_main'],) + texts
+    if texts not in user_genre_indexes:
+        user_genre_indexes[texts] = GenreIndex(*[[sg.strip() for sg in text.split(',')] for text in texts])
+    return user_genre_indexes[texts]
 
 prefixes = ['the', 'a', 'an', 'le', 'la', 'les', 'los', 'il']
 
 PRESERVE = [x.strip() for x in config.setting["preserved_tags"].split(',')]
 DATE_SEP = '-'
 
+BROWSE_LIMIT = 100  # maximum page size for MusicBrainz browse requests
+MAX_IN_FLIGHT = 2  # work look-ups handed to Picard's web service at any time (the rest wait in the frontier)
+# Persistent store of work look-ups, so that work hierarchies survive a restart (see diskcache.py)
+WORKS_STORE = diskcache.WorksStore(os.path.join(USER_DIR, "Classical_Extras", "works_cache.db"))
+# Persistent store of artist sort names and aliases, so that known artists need not be searched for aliases
+ARTIST_STORE = diskcache.ArtistStore(os.path.join(USER_DIR, "Classical_Extras", "artists_cache.db"))
+# Fastest longest common substring method for each input shape, measured in the background on first use (see
+# lcsbackend.py)
+LCS_CALIBRATION = lcsbackend.Calibration(os.path.join(USER_DIR, "Classical_Extras", "lcs_calibration.json"))
+# Thread for end-of-album processing (if ce_background is set) - a single thread, so that albums are processed one at
+# a time and the module-wide caches used by that processing are never used by two albums at once (see AlbumStages)
+ALBUM_THREAD_POOL = QThreadPool()
+ALBUM_THREAD_POOL.setMaxThreadCount(1)
+
 RELATION_TYPES = {
     'work': [
         'arranger',
@@ -452,15 +748,119 @@ RELATION_TYPES = {
 
 # OPTIONS
 
+class ReleaseOptions(collections.Mapping):
+    """
+    A read-only snapshot of the Classical Extras options, taken once per release and shared by all its tracks
+    """
+
+    def __init__(self, config_settings):
+        """
+        :param config_settings: options from UI
+        """
+        self.options = option_settings(config_settings)
+
+    def __getitem__(self, name):
+        return self.options[name]
+
+    def __iter__(self):
+        return iter(self.options)
+
+    def __len__(self):
+        return len(self.options)
+
+    def __repr__(self):
+        return repr(self.options)
+
+
+class TrackOptions(collections.MutableMapping):
+    """
+    The options for a track: a view of the release's options in which any changes (e.g. options saved in the file)
+    are held separately - i.e. copy-on-write - so that they apply to this track only
+    """
+
+    def __init__(self, release_options):
+        """
+        :param release_options: ReleaseOptions to be viewed
+        """
+        self.release_options = release_options.options  # the underlying dict, for speed of look-up
+        self.changes = {}
+
+    def __getitem__(self, name):
+        if name in self.changes:
+            return self.changes[name]
+        return self.release_options[name]
+
+    def __setitem__(self, name, value):
+        self.changes[name] = value
+
+    def __delitem__(self, name):
+        del self.changes[name]
+
+    def __contains__(self, name):
+        return name in self.changes or name in self.release_options
+
+    def __iter__(self):
+        for name in self.release_options:
+            yield name
+        for name in self.changes:
+            if name not in self.release_options:
+                yield name
+
+    def __len__(self):
+        return len(self.release_options) + len([name for name in self.changes if name not in self.release_options])
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+
+class FileIndex(object):
+    """
+    The music files found for a release, indexed by disc and track number and by musicbrainz_trackid, so that each
+    track can find its file directly. Picard sometimes fails to return all the file objects for an album (network
+    issues), so the files are accumulated (and indexed) as they are found.
+    """
+
+    def __init__(self):
+        self.files = []
+        # file objects, in the order found
+        self.known = set()
+        self.by_number = {}
+        # {(discnumber, tracknumber): filename, ...} (as strings; the first file found for a number is used)
+        self.by_trackid = {}
+        # {musicbrainz_trackid: filename, ...}
+        self.no_trackid = []
+        # names of files with no musicbrainz_trackid
+
+    def add(self, tagger, file_objects):
+        """
+        Add any new file objects to the index
+        :param tagger: album.tagger
+        :param file_objects: list of file objects
+        :return: None
+        """
+        for file_object in file_objects:
+            if file_object in self.known:
+                continue
+            self.known.add(file_object)
+            self.files.append(file_object)
+            filename = file_object.filename
+            self.by_number.setdefault((str(file_object.discnumber), str(file_object.tracknumber)), filename)
+            metadata = tagger.files[filename].metadata
+            if 'musicbrainz_trackid' in metadata:
+                self.by_trackid.setdefault(metadata['musicbrainz_trackid'], filename)
+            else:
+                self.no_trackid.append(filename)
+
+
 def get_options(release_id, album, track):
     """
     :param release_id: name for log file - usually =musicbrainz_albumid
         unless called outside metadata processor
     :param album: current release
     :param track: current track
-    :return: None (result is passed via tm)
+    :return: None (result is passed via release_status[release_id]['track_options'])
     A common function for both Artist and Workparts, so that the first class to process a track will execute
-    this function so that the results are available to both (via a track metadata item)
+    this function so that the results are available to both
     """
     release_status[release_id]['done'] = False
     set_options = collections.defaultdict(dict)
@@ -477,8 +877,11 @@ def get_options(release_id, album, track):
             album.tagger.config.setting[override[sect]] for sect in sections):
         set_options[track] = album.tagger.config.setting  # mutable
     else:
-        set_options[track] = option_settings(
-            album.tagger.config.setting)  # make a copy
+        # the UI options are copied once per release (afresh on each load); any changes are specific to the track
+        if 'options' not in release_status[release_id] or (
+                track.metadata['discnumber'] == '1' and track.metadata['tracknumber'] == '1'):
+            release_status[release_id]['options'] = ReleaseOptions(album.tagger.config.setting)
+        set_options[track] = TrackOptions(release_status[release_id]['options'])
         write_log(release_id, 'info', 'Default (i.e. per UI) options for track %s are %r', track, set_options[track])
 
     # As we use some of the main Picard options and may over-write them, save them here
@@ -487,7 +890,6 @@ def get_options(release_id, album, track):
 
     options = set_options[track]
     tm = track.metadata
-    new_metadata = None
     orig_metadata = None
     # Only look up files if needed
     file_options = {}
@@ -502,53 +904,43 @@ def get_options(release_id, album, track):
     album_filenames = album.tagger.get_files_from_objects([album])
     write_log(release_id, 'info', 'No. of album files found = %s', len(album_filenames))
     # Note that sometimes Picard fails to get all the file objects, even if they are there (network issues)
-    # so we will cache whatever we can get!
-    if release_id in release_status and 'file_objects' in release_status[release_id]:
-        add_list_uniquely(release_status[release_id]['file_objects'], album_filenames)
-    else:
-        release_status[release_id]['file_objects'] = album_filenames
-    write_log(release_id, 'info', 'No. of album files cached = %s', len(release_status[release_id]['file_objects']))
-    track_file = None
-    for album_file in release_status[release_id]['file_objects']:
-        write_log(release_id, 'info', 'Track file = %s, tracknumber = %s, discnumber = %s. Metadata trackno = %s, discno = %s',
-                  album_file.filename, str(album_file.tracknumber), str(album_file.discnumber), trackno, discno)
-        if str(album_file.tracknumber) == trackno and str(album_file.discnumber) == discno:
-            write_log(release_id, 'info', 'Track file found = %r', album_file.filename)
-            track_file = album_file.filename
-            break
-
+    # so we will cache (and index) whatever we can get! The index is started afresh with each load of the release,
+    # as file metadata (and so trackids) will have changed after a refresh
+    if 'file_index' not in release_status[release_id] or (discno == '1' and trackno == '1'):
+        release_status[release_id]['file_index'] = FileIndex()
+    file_index = release_status[release_id]['file_index']
+    file_index.add(album.tagger, album_filenames)
+    release_status[release_id]['file_objects'] = file_index.files
+    write_log(release_id, 'info', 'No. of album files cached = %s', len(file_index.files))
+    track_file = file_index.by_number.get((discno, trackno))
+    if track_file:
+        write_log(release_id, 'info', 'Track file found = %r', track_file)
 
     # Note: It would have been nice to do a rough check beforehand of total tracks,
     # but ~totalalbumtracks is not yet populated
     if not track_file:
-        album_fullnames = [x.filename for x in release_status[release_id]['file_objects']]
-        write_log(release_id, 'info', 'Album files found = %r', album_fullnames)
-        for music_file in album_fullnames:
-            new_metadata = album.tagger.files[music_file].metadata
-
-            if 'musicbrainz_trackid' in new_metadata and 'musicbrainz_trackid' in tm:
-                if new_metadata['musicbrainz_trackid'] == tm['musicbrainz_trackid']:
-                    track_file = music_file
-                    break
+        if 'musicbrainz_trackid' in tm:
+            track_file = file_index.by_trackid.get(tm['musicbrainz_trackid'])
         # Nothing found...
-        if new_metadata and 'musicbrainz_trackid' not in new_metadata:
+        if not track_file and file_index.no_trackid:
+            music_file = file_index.no_trackid[-1]
             if options['log_warning']:
                 write_log(release_id, 'warning', 'No trackid in file %s', music_file)
         if 'musicbrainz_trackid' not in tm:
             if options['log_warning']:
                 write_log(release_id, 'warning', 'No trackid in track %s', track)
     """ 
-    Note that, on initial load, new_metadata == orig_metadata; but, after refresh, new_metadata will have 
+    Note that, on initial load, the file's metadata == orig_metadata; but, after refresh, the metadata will have 
     the same track metadata as tm (plus the file metadata as per orig_metadata), so a trackid match
     is then possible for files that do not have musicbrainz_trackid in orig_metadata. That is why 
-    new_metadata is used in the above test, rather than orig_metadata, but orig_metadata is then used below
+    the file's metadata is used to index the trackids, rather than orig_metadata, but orig_metadata is then used below
     to get the saved options.
     """
 
     # Find the tag with the options:-
     if track_file:
         orig_metadata = album.tagger.files[track_file].orig_metadata
-        music_file_found = track_file
+        music_file_found = music_file = track_file
         if options['log_info']:
             write_log(release_id, 'info', 'orig_metadata for file %s is', music_file)
             write_log(release_id, 'info', orig_metadata)
@@ -623,6 +1015,17 @@ def get_options(release_id, album, track):
                                    section +
                                    ' options cannot be read. Using current settings')
                         break
+                    # the option definitions which saved options may override, indexed by name
+                    if section == 'artists':
+                        if options[override['tagmap']]:
+                            schema_sections = ('artists', 'tag', 'picard')
+                        else:
+                            schema_sections = ('artists', 'picard')
+                    else:
+                        if options[override['genres']]:
+                            schema_sections = ('workparts', 'genres')
+                        else:
+                            schema_sections = ('workparts',)
                     for opt in options_dict:
                         if isinstance(
                                 options_dict[opt],
@@ -637,37 +1040,24 @@ def get_options(release_id, album, track):
                         for opt_dict in opt_list:
                             for opt_det in opt_dict:
                                 opt_value = opt_dict[opt_det]
-                                if section == 'artists':
-                                    if options[override['tagmap']]:
-                                        included_tag_options = plugin_options('tag')
-                                    else:
-                                        included_tag_options = []
-                                    addn = included_tag_options + plugin_options('picard')
-                                else:
-                                    if options[override['genres']]:
-                                        included_genre_options = plugin_options('genres')
-                                    else:
-                                        included_genre_options = []
-                                    addn = included_genre_options
-                                for ea_opt in plugin_options(section) + addn:
+                                for ea_opt in OPTION_SCHEMA.named(opt_det, *schema_sections):
                                     displayed_option = options[ea_opt['option']]
-                                    if ea_opt['name'] == opt_det:
-                                        if 'value' in ea_opt:
-                                            if ea_opt['value'] == opt_value:
-                                                options[ea_opt['option']] = True
-                                            else:
-                                                options[ea_opt['option']] = False
+                                    if 'value' in ea_opt:
+                                        if ea_opt['value'] == opt_value:
+                                            options[ea_opt['option']] = True
                                         else:
-                                            options[ea_opt['option']] = opt_value
-                                        if options[ea_opt['option']
-                                                   ] != displayed_option:
-                                            if options['log_debug']:
-                                                write_log(release_id, 'debug', 'Options overridden for option %s = %s',
-                                                          ea_opt['option'], opt_value)
+                                            options[ea_opt['option']] = False
+                                    else:
+                                        options[ea_opt['option']] = opt_value
+                                    if options[ea_opt['option']
+                                               ] != displayed_option:
+                                        if options['log_debug']:
+                                            write_log(release_id, 'debug', 'Options overridden for option %s = %s',
+                                                      ea_opt['option'], opt_value)
 
-                                            opt_text = unicode(opt_value)
-                                            append_tag(release_id, tm, '003_information:options_overridden', unicode(
-                                                ea_opt['name']) + ' = ' + opt_text)
+                                        opt_text = unicode(opt_value)
+                                        append_tag(release_id, tm, '003_information:options_overridden', unicode(
+                                            ea_opt['name']) + ' = ' + opt_text)
 
         if orig_metadata:
             keep_list = options['cea_keep'].split(",")
@@ -692,15 +1082,17 @@ def get_options(release_id, album, track):
                         delete_list.append(tag_item)
                 # this will be used in map_tags to delete unwanted tags
                 options['delete_tags'] = delete_list
-        if not isinstance(options, dict):
-            options_dict = option_settings(config.setting)
-        else:
-            options_dict = options
-        tm['~ce_options'] = options_dict
         tm['~ce_file'] = music_file_found
-        if options['log_info']:
-            write_log(release_id, 'info', 'Get_options is returning options shown below for file: %s', music_file_found)
-            write_log(release_id, 'info', options_dict)
+    if isinstance(options, TrackOptions):
+        options_dict = options
+    else:
+        options_dict = TrackOptions(ReleaseOptions(config.setting))
+    if 'track_options' not in release_status[release_id]:
+        release_status[release_id]['track_options'] = {}
+    release_status[release_id]['track_options'][track] = options_dict
+    if options['log_info']:
+        write_log(release_id, 'info', 'Get_options is returning options shown below for file: %s', music_file_found)
+        write_log(release_id, 'info', options_dict)
 
 
 def plugin_options(option_type):
@@ -1381,6 +1773,18 @@ def plugin_options(option_type):
          'type': 'Boolean',
          'default': True
          },
+        {'option': 'cwp_cache_ttl',
+         'type': 'Integer',
+         'default': 30
+         },
+        {'option': 'cea_alias_cache_ttl',
+         'type': 'Integer',
+         'default': 30
+         },
+        {'option': 'cwp_batch',
+         'type': 'Boolean',
+         'default': False
+         },
         {'option': 'cwp_aliases',
          'name': 'replace with alias?',
          'value': 'replace',
@@ -1493,6 +1897,10 @@ def plugin_options(option_type):
          'type': 'Boolean',
          'default': False
          },
+        {'option': 'log_json',
+         'type': 'Boolean',
+         'default': False
+         },
         {'option': 'ce_version_tag',
          'type': 'Text',
          'default': 'stamp'
@@ -1528,6 +1936,10 @@ def plugin_options(option_type):
         {'option': 'ce_no_run',
          'type': 'Boolean',
          'default': False
+         },
+        {'option': 'ce_background',
+         'type': 'Boolean',
+         'default': True
          }
     ]
 
@@ -1547,16 +1959,59 @@ def plugin_options(option_type):
         return None
 
 
+class OptionSchema(object):
+    """
+    Index of the option definitions in plugin_options, built once, so that options can be looked up directly
+    (by 'option' key or by the 'name' used in saved options tags) rather than by searching the lists
+    """
+    SECTIONS = ('artists', 'tag', 'workparts', 'genres', 'picard', 'other')
+    UI_SECTIONS = ('artists', 'tag', 'workparts', 'genres', 'other')  # Picard's own options are not on the page
+
+    def __init__(self):
+        self.sections = {}
+        self.by_option = {}
+        self.by_name = {}
+        self.combined = {}
+        for section in self.SECTIONS:
+            self.sections[section] = plugin_options(section)
+            self.by_name[section] = {}
+            for opt in self.sections[section]:
+                self.by_option[opt['option']] = opt
+                if 'name' in opt:
+                    # several options may share a name (with different values)
+                    self.by_name[section].setdefault(opt['name'], []).append(opt)
+
+    def options(self, *sections):
+        """
+        :param sections: any of SECTIONS
+        :return: list of the option definitions for the sections, in that order (NB shared - do not modify)
+        """
+        if sections not in self.combined:
+            self.combined[sections] = [opt for section in sections for opt in self.sections[section]]
+        return self.combined[sections]
+
+    def named(self, name, *sections):
+        """
+        :param name: option name, as used in saved options tags
+        :param sections: any of SECTIONS
+        :return: list of the option definitions with that name in the sections
+        """
+        if len(sections) == 1:
+            return self.by_name[sections[0]].get(name, [])
+        return [opt for section in sections for opt in self.by_name[section].get(name, [])]
+
+
+OPTION_SCHEMA = OptionSchema()
+
+
 def option_settings(config_settings):
     """
     :param config_settings: options from UI
     :return: a (deep) copy of the Classical Extras options
     """
     options = {}
-    for option in plugin_options('artists') + plugin_options('tag') + plugin_options(
-            'workparts') + plugin_options('genres') + plugin_options('picard') + plugin_options('other'):
-        options[option['option']] = copy.deepcopy(
-            config_settings[option['option']])
+    for option in OPTION_SCHEMA.by_option:
+        options[option] = copy.deepcopy(config_settings[option])
     return options
 
 
@@ -1589,13 +2044,22 @@ def get_aliases(self, release_id, album, options, releaseXmlNode):
     if 'artist_locale' in config.setting and options['cea_aliases'] or options['cea_aliases_composer']:
         locale = config.setting["artist_locale"]
         lang = locale.split("_")[0]  # NB this is the Picard code in /util
+        alias_ttl = options['cea_alias_cache_ttl']
+        if alias_ttl:
+            try:
+                ARTIST_STORE.load()
+            except diskcache.sqlite3.Error as err:
+                write_log(release_id, 'error', 'Unable to read artist aliases from disk cache: %s', err)
+                alias_ttl = 0
 
         # Release group artists
         obj = parse_data(release_id, releaseXmlNode, [], 'release_group')
-        get_aliases_and_credits(self, options, release_id, album, obj, lang, options['cea_group_credited'])
+        get_aliases_and_credits(self, options, release_id, album, obj, lang, options['cea_group_credited'],
+                                alias_ttl)
 
         # Release artists
-        get_aliases_and_credits(self, options, release_id, album, releaseXmlNode, lang, options['cea_credited'])
+        get_aliases_and_credits(self, options, release_id, album, releaseXmlNode, lang, options['cea_credited'],
+                                alias_ttl)
         # Next bit needed to identify artists who are album artists
         self.release_artists_sort[album] = parse_data(release_id, releaseXmlNode, [], 'artist_credit', 'name_credit',
                                                       'artist', 'sort_name', 'text')
@@ -1616,12 +2080,17 @@ def get_aliases(self, release_id, album, options, releaseXmlNode):
                     # 'text')[0]) # not currently used
                     obj = parse_data(release_id, t, [], 'recording')
                     get_aliases_and_credits(self, options, release_id, album, obj, lang,
-                                            options['cea_recording_credited'])  # recording artists
+                                            options['cea_recording_credited'], alias_ttl)  # recording artists
                     if options['cea_recording_relationship_credited']:
                         # recording relationship artists (credits only)
                         get_relation_credits(self, options, release_id, album, obj)
                     get_aliases_and_credits(self, options, release_id, album, t, lang,
-                                            options['cea_track_credited'])  # track artists
+                                            options['cea_track_credited'], alias_ttl)  # track artists
+        if alias_ttl:
+            try:
+                ARTIST_STORE.save()
+            except diskcache.sqlite3.Error as err:
+                write_log(release_id, 'error', 'Unable to save artist aliases to disk cache: %s', err)
     if options['log_info']:
         write_log(release_id, 'info', 'Alias and credits info for %s', self)
         write_log(release_id, 'info', 'Aliases :%s', self.artist_aliases)
@@ -2237,14 +2706,16 @@ def stripsir(performer):
 #         return performer
 
 
+ROMAN_NUMERALS = re.compile(
+    r'\b(M{0,4}(CM|CD|D?)?C{0,3}(XC|XL|L?)?X{0,3}(IX|IV|V?)?I{0,3})\b(\.|:|,|;|$)',
+    # was
+    # r'(^|\s)(\bM{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})\b)(\W|\s|$)',
+    re.IGNORECASE | re.UNICODE)  # Matches Roman numerals (+ ensure non-Latin chars treated as word chars)
+
+
 def replace_roman_numerals(s):
     """Replaces roman numerals include in s, where followed by punctuation, by digits"""
-    p = re.compile(
-        r'\b(M{0,4}(CM|CD|D?)?C{0,3}(XC|XL|L?)?X{0,3}(IX|IV|V?)?I{0,3})\b(\.|:|,|;|$)',
-        # was
-        # r'(^|\s)(\bM{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})\b)(\W|\s|$)',
-        re.IGNORECASE | re.UNICODE)  # Matches Roman numerals (+ ensure non-Latin chars treated as word chars)
-    romans = p.findall(s)
+    romans = ROMAN_NUMERALS.findall(s)
     for roman in romans:
         if roman[0]:
             numerals = unicode(roman[0])
@@ -2277,6 +2748,165 @@ def from_roman(s):
     return result
 
 
+# Title prefixes removed by PartLevels.diff_pair
+ROMAN_PREFIX = re.compile(
+    r'^\W*\bM{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})\b[\s|\.|:|,|;]',
+    re.IGNORECASE)  # Matches Roman numerals with punctuation
+NUMBER_PREFIX = re.compile(r'^\W*\d+[.):-]')  # Matches positive integers with punctuation
+# Synonyms were marked with re.sub(pattern, repl, string, re.IGNORECASE | re.UNICODE), where the flags are taken as
+# the count - so matching is case-sensitive and at most 34 of each are replaced. Kept as is for identical results.
+SYNONYM_COUNT = re.IGNORECASE | re.UNICODE
+ASCII_WORD = re.compile(r'^[A-Za-z0-9_]+$')
+MAX_TITLE_NORMALISERS = 20  # cache of TitleNormalisers is cleared when it gets this big
+title_normalisers = {}  # format is {(removewords, replacements, synonyms, marker): TitleNormaliser, ...}
+# Folding used by PartLevels.boil
+BOIL_CACHE_SIZE = 5000  # number of boiled strings remembered
+# single characters folded (after 'sch' -> 'sh') - the replacements which follow this are made in order
+BOIL_FOLDING = {ord(u'\xdf'): u'ss', ord(u'\u0153'): u'oe', ord(u'\u00fc'): u'ue'}
+BOIL_REPLACEMENTS = (('sz', 'ss'), ('oe', 'o'), ('ue', 'u'), ('ae', 'a'))
+ASCII_WORD_CHARACTERS = frozenset(u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+
+
+class AsciiFolding(dict):
+    """
+    Translation table (for unicode.translate) giving the ascii word characters left by each character after NFD
+    decomposition - i.e. without accents (combining marks), punctuation or spaces
+    Filled as characters are met
+    """
+
+    def __missing__(self, code):
+        folded = self[code] = u''.join(c for c in unicodedata.normalize('NFD', unichr(code))
+                                       if c in ASCII_WORD_CHARACTERS)
+        return folded
+
+
+ASCII_FOLDING = AsciiFolding()
+# Patterns used by PartLevels.strip_parent_from_work
+NON_WORD = re.compile(r"(?u)[\W]")
+WHITESPACE = re.compile(r"\s")
+WORDS = re.compile(r"[\w]+|[\W]")
+MAX_PARENT_PATTERNS = 2000  # cache of parent patterns is cleared when it gets this big
+parent_patterns = {}  # format is {(parent, extend): compiled pattern, ...}
+
+
+class TitleNormaliser(object):
+    """
+    The "remove words", replacements and synonyms options, parsed and compiled once for use by PartLevels.diff_pair
+    (rather than for every title) - see get_title_normaliser
+    """
+
+    def __init__(self, removewords_option, replacements_option, synonyms_option, marker):
+        """
+        :param removewords_option: cwp_removewords_p option (comma-separated)
+        :param replacements_option: cwp_replacements option, e.g. (a, b) / (c, d)
+        :param synonyms_option: cwp_synonyms option, e.g. (a, b) / (c, d)
+        :param marker: the phrase used to mark synonyms (PartLevels.EQ)
+        """
+        self.marker = marker
+        self.errors = []  # format is [(log message, ~cwp_error text), ...]
+
+        # remove certain words from the comparison
+        if removewords_option:
+            self.removewords = removewords_option.split(',')
+        else:
+            self.removewords = []
+        self.prefixes = [unicode(prefix).lower().lstrip() for prefix in self.removewords if prefix and prefix[0] != " "]
+
+        #  replacements
+        self.replacements = []
+        for rep in replacements_option.split('/'):
+            tupr = rep.strip(' ()').split(',')
+            if len(tupr) == 2:
+                for i, tr in enumerate(tupr):
+                    tupr[i] = tr.strip("' ").strip('"')
+                self.replacements.append(tuple(tupr))
+            else:
+                self.errors.append(('Error in replacement format for replacement ' + rep,
+                                    '6. Error in replacement format for replacement ' + rep))
+        self.replacement_patterns = []  # format is [(key, equiv, compiled key pattern), ...]
+        for key, equiv in self.replacements:
+            if key[0] == "!" and key[1] == "!" and key[-1] == "!" and key[-2] == "!":  # we have a reg ex inside {{ }}
+                key_pattern = key[2:-2]
+            else:
+                key_pattern = '\\b' + re.escape(key) + '\\b'
+            self.replacement_patterns.append((key, equiv, re.compile(key_pattern)))
+
+        #  synonyms
+        self.synonyms = []
+        for syn in synonyms_option.split('/'):
+            tup = syn.strip(' ()').split(',')
+            if len(tup) == 2:
+                for i, ts in enumerate(tup):
+                    tup[i] = ts.strip("' ").strip('"')
+                    if not tup[i]:
+                        self.errors.append(('Synonym entries must not be blank - error in ' + syn,
+                                            '7. Synonym entries must not be blank - error in ' + syn))
+                        tup[i] = "**BAD**"
+                    elif re.findall(r'[^\w|\&]+', tup[i], re.UNICODE):
+                        self.errors.append(('Synonyms must be single words without punctuation - error in ' + syn,
+                                            '7. Synonyms must be single words without punctuation - error in ' + syn))
+                        tup[i] = "**BAD**"
+                if "**BAD**" not in tup:
+                    self.synonyms.append(tuple(tup))
+            else:
+                self.errors.append(('Error in synonmym format for synonym ' + syn,
+                                    '7. Error in synonym format for synonym ' + syn))
+        # to mark the synonyms and their equivalents so that they can be reversed later, each equivalent is replaced
+        # by equiv + marker and then each synonym (key) by marker + equiv, one pair at a time
+        self.synonym_patterns = []  # format is [(compiled pattern, replacement), ...] in the order applied
+        for key, equiv in self.synonyms:
+            self.synonym_patterns.append((re.compile('\\b' + re.escape(equiv) + '\\b'), equiv + marker))
+            self.synonym_patterns.append((re.compile('\\b' + re.escape(key) + '\\b'), marker + equiv))
+        # If all the words are plain (ascii) words, each pattern only matches whole words and a replaced word cannot
+        # match a later pattern, so one pass of a combined pattern gives the same result as applying them in turn
+        self.synonym_words = collections.OrderedDict()  # format is {word: [(pattern index, replacement), ...], ...}
+        self.synonym_pattern = None
+        words = [word for synonym in self.synonyms for word in reversed(synonym)]
+        if words and all(ASCII_WORD.match(word) for word in words):
+            for index, word in enumerate(words):
+                self.synonym_words.setdefault(word, []).append((index, self.synonym_patterns[index][1]))
+            self.synonym_pattern = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in self.synonym_words)
+                                              + r')\b')
+        # reversal of synonyms left in the title item
+        self.reverse_patterns = [(re.compile('\\b' + re.escape(marker + equiv) + '\\b'), key)
+                                 for key, equiv in self.synonyms]
+
+    def mark_synonyms(self, s):
+        """
+        :param s: title or work name
+        :return: s with synonyms and equivalents marked
+        """
+        if self.synonym_pattern:
+            counts = collections.defaultdict(int)
+
+            def mark(match):
+                for index, replacement in self.synonym_words[match.group(0)]:
+                    if counts[index] < SYNONYM_COUNT:
+                        counts[index] += 1
+                        return replacement
+                return match.group(0)
+
+            return self.synonym_pattern.sub(mark, s)
+        for pattern, replacement in self.synonym_patterns:
+            s = pattern.sub(replacement, s, SYNONYM_COUNT)
+        return s
+
+
+def get_title_normaliser(options, marker):
+    """
+    :param options: the track options
+    :param marker: the phrase used to mark synonyms (PartLevels.EQ)
+    :return: the TitleNormaliser for these option values
+    """
+    key = (options["cwp_removewords_p"], options["cwp_replacements"], options["cwp_synonyms"], marker)
+    normaliser = title_normalisers.get(key)
+    if normaliser is None:
+        if len(title_normalisers) >= MAX_TITLE_NORMALISERS:
+            title_normalisers.clear()
+        normaliser = title_normalisers[key] = TitleNormaliser(*key)
+    return normaliser
+
+
 def turbo_lcs(release_id, multi_list):
     """
     Picks the best longest common string method to use
@@ -2293,22 +2923,25 @@ def turbo_lcs(release_id, multi_list):
     if list_len < 2:
         write_log(release_id, 'debug', 'Only one item in list - no algo required')
         return multi_list[0]  # Nothing to do!
-    # for big matches, use the generalised suffix tree method
-    if ((list_sum / list_len) ** 2) * list_len > 1000:
-        # heuristic: may need to tweak the 1000 in the light of results
-        lcs_list = suffixtree.multi_lcs(multi_list)
+    # for more than two items, use the generalised suffix tree or suffix array method, whichever was measured
+    # as faster for this shape of input (see lcsbackend.py)
+    backend = LCS_CALIBRATION.choose(list_len, list_sum / list_len)
+    write_log(release_id, 'debug', 'turbo_lcs: %s items of mean length %s - using %s', list_len,
+              list_sum / list_len, backend)
+    if backend in lcsbackend.BACKENDS:
+        lcs_list = lcsbackend.BACKENDS[backend](multi_list)
         if "error" not in lcs_list:
             if "response" in lcs_list:
-                    write_log(release_id, 'debug', 'LCS returned from suffix tree algo')
+                    write_log(release_id, 'debug', 'LCS returned from suffix %s algo', backend)
                     return lcs_list['response']
             else:
                 write_log(release_id, 'error',
-                          'Suffix tree failure for release %s. Error unknown. Using standard lcs algo instead',
-                          release_id)
+                          'Suffix %s failure for release %s. Error unknown. Using standard lcs algo instead',
+                          backend, release_id)
         else:
             write_log(release_id, 'debug',
-                      'Suffix tree failure for release %s. Error message: %s. Using standard lcs algo instead',
-                      release_id, lcs_list['error'])
+                      'Suffix %s failure for release %s. Error message: %s. Using standard lcs algo instead',
+                      backend, release_id, lcs_list['error'])
     # otherwise, or if gst fails, use the standard algorithm
     first = True
     common = []
@@ -2331,22 +2964,11 @@ def longest_common_substring(s1, s2):
     :param s2: substring 2
     :return: {'string': the longest common substring,
         'start': the start position in s1,
-        'length': the length of the common substring}
+        'length': x_longest, i.e. the end position in s1}
     NB this also works on list arguments - i.e. it will find the longest common sub-list
+    Uses linear-space dynamic programming or a suffix automaton, depending on input size (see substring.py)
     """
-    m = [[0] * (1 + len(s2)) for i in xrange(1 + len(s1))]
-    longest, x_longest = 0, 0
-    for x in xrange(1, 1 + len(s1)):
-        for y in xrange(1, 1 + len(s2)):
-            if s1[x - 1] == s2[y - 1]:
-                m[x][y] = m[x - 1][y - 1] + 1
-                if m[x][y] > longest:
-                    longest = m[x][y]
-                    x_longest = x
-            else:
-                m[x][y] = 0
-    return {'string': s1[x_longest - longest: x_longest],
-            'start': x_longest - longest, 'length': x_longest}
+    return substring.longest_common_substring(s1, s2)
 
 
 def longest_common_sequence(list1, list2, minstart=0, maxstart=0):
@@ -2359,18 +2981,28 @@ def longest_common_sequence(list1, list2, minstart=0, maxstart=0):
     maxstart must be >= minstart. If they are equal then the start point is fixed.
     Note that this only finds subsequences starting at the same position
     Use longest_common_substring for the more general problem
+    Scans once for runs of matching positions: the longest match from any start point within a run is from the
+    earliest permitted start point in that run, so only that one needs to be considered. Where there are several
+    longest matches, the earliest is returned.
     """
     if maxstart < minstart:
         return None, 0
     min_len = min(len(list1), len(list2))
     longest = 0
     seq = None
-    maxstart = min(maxstart, min_len) + 1
-    for k in range(minstart, maxstart):
-        for i in range(k, min_len + 1):
-            if list1[k:i] == list2[k:i] and i - k > longest:
-                longest = i - k
-                seq = list1[k:i]
+    maxstart = min(maxstart, min_len - 1)
+    k = minstart
+    while k <= maxstart and min_len - k > longest:
+        if list1[k] != list2[k]:
+            k += 1
+            continue
+        i = k + 1
+        while i < min_len and list1[i] == list2[i]:
+            i += 1
+        if i - k > longest:
+            longest = i - k
+            seq = list1[k:i]
+        k = i + 1
     return {'sequence': seq, 'length': longest}
 
 
@@ -2451,20 +3083,20 @@ def map_tags(options, release_id, album, tm):
     arranger_born_list = []
     arranger_died_list = []
     if options['cwp_use_muso_refdb'] and options['cwp_muso_classical'] or options['cwp_muso_dates']:
-        if COMPOSER_DICT:
+        composer_index = MUSO_REFS.get()['composer_index']
+        if composer_index:
             composer_list = str_to_list(tm['~cwp_composer_names'])
             lc_composer_list = [c.lower() for c in composer_list]
             for composer in lc_composer_list:
-                for classical_composer in COMPOSER_DICT:
-                    if composer in classical_composer['lc_name']:
-                        if options['cwp_muso_classical']:
-                            candidate_genres.append('Classical')
-                            is_classical = True
-                        if options['cwp_muso_dates']:
-                            composer_born_list = classical_composer['birth']
-                            composer_died_list = classical_composer['death']
-                        composer_found = True
-                        break
+                classical_composer = composer_index.get(composer)
+                if classical_composer:
+                    if options['cwp_muso_classical']:
+                        candidate_genres.append('Classical')
+                        is_classical = True
+                    if options['cwp_muso_dates']:
+                        composer_born_list = classical_composer['birth']
+                        composer_died_list = classical_composer['death']
+                    composer_found = True
                 if not composer_found:
                     composer_index = lc_composer_list.index(composer)
                     orig_composer = composer_list[composer_index]
@@ -2480,16 +3112,15 @@ def map_tags(options, release_id, album, tm):
                 arranger_list = str_to_list(tm['~cea_arranger_names']) + str_to_list(tm['~cwp_arranger_names'])
                 lc_arranger_list = [c.lower() for c in arranger_list]
                 for arranger in lc_arranger_list:
-                    for classical_arranger in COMPOSER_DICT:
-                        if arranger in classical_arranger['lc_name']:
-                            if options['cwp_muso_classical'] and options['cwp_genres_arranger_as_composer']:
-                                candidate_genres.append('Classical')
-                                is_classical = True
-                            if options['cwp_muso_dates'] and options['cwp_periods_arranger_as_composer']:
-                                arranger_born_list = classical_arranger['birth']
-                                arranger_died_list = classical_arranger['death']
-                            arranger_found = True
-                            break
+                    classical_arranger = composer_index.get(arranger)
+                    if classical_arranger:
+                        if options['cwp_muso_classical'] and options['cwp_genres_arranger_as_composer']:
+                            candidate_genres.append('Classical')
+                            is_classical = True
+                        if options['cwp_muso_dates'] and options['cwp_periods_arranger_as_composer']:
+                            arranger_born_list = classical_arranger['birth']
+                            arranger_died_list = classical_arranger['death']
+                        arranger_found = True
                     if not arranger_found:
                         arranger_index = lc_arranger_list.index(arranger)
                         orig_arranger = arranger_list[arranger_index]
@@ -2504,13 +3135,7 @@ def map_tags(options, release_id, album, tm):
             append_tag(release_id, tm, '001_errors:8',
                        '8. No composer reference file. Check log for error messages re path name.')
 
-    if options['cwp_use_muso_refdb'] and options['cwp_muso_genres'] and GENRE_DICT:
-        main_classical_genres_list = [list_to_str(mg['name']).strip() for mg in GENRE_DICT]
-    else:
-        main_classical_genres_list = [sg.strip() for sg in options['cwp_genres_classical_main'].split(',')]
-    sub_classical_genres_list = [sg.strip() for sg in options['cwp_genres_classical_sub'].split(',')]
-    main_other_genres_list = [sg.strip() for sg in options['cwp_genres_other_main'].split(',')]
-    sub_other_genres_list = [sg.strip() for sg in options['cwp_genres_other_sub'].split(',')]
+    genre_index = get_genre_index(options)
     main_classical_genres = []
     sub_classical_genres = []
     main_other_genres = []
@@ -2523,30 +3148,18 @@ def map_tags(options, release_id, album, tm):
         write_log(release_id, 'info', "Candidate genres: %r", candidate_genres)
     untagged_genres = []
     if candidate_genres:
-        main_classical_genres = [val for val in main_classical_genres_list
-                                 if val.lower() in [genre.lower() for genre in candidate_genres]]
-        sub_classical_genres = [val for val in sub_classical_genres_list
-                                 if val.lower() in [genre.lower() for genre in candidate_genres]]
-
-        if main_classical_genres or sub_classical_genres or options['cwp_genres_classical_all']:
+        genres = genre_index.classify(candidate_genres)
+        if genres[0] or genres[1] or options['cwp_genres_classical_all']:
             is_classical = True
-            main_classical_genres.append('Classical')
             candidate_genres += str_to_list(tm['~cea_work_type_if_classical'])
-            # next two are repeated statements, but a separate fn would be clumsy too!
-            main_classical_genres = [val for val in main_classical_genres_list
-                                     if val.lower() in [genre.lower() for genre in candidate_genres]]
-            sub_classical_genres = [val for val in sub_classical_genres_list
-                                    if val.lower() in [genre.lower() for genre in candidate_genres]]
+            genres = genre_index.classify(candidate_genres)
+        main_classical_genres, sub_classical_genres, main_other_genres, sub_other_genres = genres
         if options['cwp_genres_classical_exclude']:
             main_classical_genres = [g for g in main_classical_genres if g.lower() != 'classical']
 
-        main_other_genres = [val for val in main_other_genres_list
-                                 if val.lower() in [genre.lower() for genre in candidate_genres]]
-        sub_other_genres = [val for val in sub_other_genres_list
-                                 if val.lower() in [genre.lower() for genre in candidate_genres]]
-        all_genres = main_classical_genres + sub_classical_genres + main_other_genres + sub_other_genres
-        untagged_genres = [un for un in candidate_genres
-                           if un.lower() not in [genre.lower() for genre in all_genres]]
+        all_genres = set(genre.lower() for genre in
+                         main_classical_genres + sub_classical_genres + main_other_genres + sub_other_genres)
+        untagged_genres = [un for un in candidate_genres if un.lower() not in all_genres]
 
 
     if options['cwp_genre_tag']:
@@ -2618,40 +3231,9 @@ def map_tags(options, release_id, album, tm):
             append_tag(release_id, tm, options['cwp_workdate_tag'], list_to_str(premiered_dates_list) + prem)
 
     # periods
-    PERIODS = {}
+    PERIODS = None
     if options['cwp_period_map']:
-        if options['cwp_use_muso_refdb'] and options['cwp_muso_periods'] and PERIOD_DICT:
-            for p_item in PERIOD_DICT:
-                if 'start' not in p_item or p_item['start'] == []:
-                    p_item['start'] = [u'-9999']
-                if 'end' not in p_item or p_item['end'] == []:
-                    p_item['end'] = [u'2525']
-                if 'name' not in p_item or p_item['name'] == []:
-                    p_item['name'] = ['NOT SPECIFIED']
-            PERIODS = {list_to_str(mp['name']).strip(): (
-                list_to_str(mp['start']),
-                list_to_str(mp['end']))
-                for mp in PERIOD_DICT}
-            for period in PERIODS:
-                if PERIODS[period][0].lstrip('-').isdigit() and PERIODS[period][1].lstrip('-').isdigit():
-                    PERIODS[period] = (int(PERIODS[period][0]), int(PERIODS[period][1]))
-                else:
-                    PERIODS[period] = 'ERROR - start and/or end of ' + period + ' are not integers'
-
-        else:
-            periods = [p.strip() for p in options['cwp_period_map'].split(';')]
-            for p in periods:
-                p = p.split(',')
-                if len(p) == 3:
-                    period = p[0].strip()
-                    start = p[1].strip()
-                    end = p[2].strip()
-                    if start.lstrip('-').isdigit() and end.lstrip('-').isdigit():
-                        PERIODS[period] = (int(start), int(end))
-                    else:
-                        PERIODS[period] = 'ERROR - start and/or end of ' + period + ' are not integers'
-                else:
-                    PERIODS[p[0]] = 'ERROR in period map - each item must contain 3 elements'
+        PERIODS = get_period_index(options)
     if options['cwp_period_tag'] and PERIODS:
         if earliest_date == 9999:  # i.e. no work date found
             if options['cwp_use_muso_refdb'] and options['cwp_muso_dates']:
@@ -2665,16 +3247,15 @@ def map_tags(options, release_id, album, tm):
                                 latest_date = max(latest_date, deathdate)
                             else:
                                 latest_date = datetime.now().year
-        for period in PERIODS:
-            if 'ERROR' in PERIODS[period]:
-                tm[options['cwp_period_tag']] = ''
-                append_tag(release_id, tm, '001_errors:9', '9. ' + PERIODS[period])
-                break
+        if PERIODS.errors:
+            tm[options['cwp_period_tag']] = ''
+            append_tag(release_id, tm, '001_errors:9', '9. ' + PERIODS.errors[0])
+        else:
             if earliest_date < 9999:
-                if PERIODS[period][0] <= earliest_date <= PERIODS[period][1]:
+                for period in PERIODS.lookup(earliest_date):
                     append_tag(release_id, tm, options['cwp_period_tag'], period)
             if latest_date > -9999:
-                if PERIODS[period][0] <= latest_date <= PERIODS[period][1]:
+                for period in PERIODS.lookup(latest_date):
                     append_tag(release_id, tm, options['cwp_period_tag'], period)
 
     # generic tag mapping
@@ -2772,10 +3353,6 @@ def map_tags(options, release_id, album, tm):
     # if options over-write enabled, remove it after processing one album
     options['ce_options_overwrite'] = False
     config.setting['ce_options_overwrite'] = False
-    # so that options are not retained (in case of refresh with different
-    # options)
-    if '~ce_options' in tm:
-        del tm['~ce_options']
     # remove any unwanted file tags
     if '~ce_file' in tm and tm['~ce_file'] != "None":
         music_file = tm['~ce_file']
@@ -2898,7 +3475,7 @@ def get_artist_credit(options, release_id, obj):
         return credit_list
 
 
-def get_aliases_and_credits(self, options, release_id, album, obj, lang, credited):
+def get_aliases_and_credits(self, options, release_id, album, obj, lang, credited, alias_ttl=0):
     """
     :param release_id: name for log file - usually =musicbrainz_albumid
         unless called outside metadata processor
@@ -2908,17 +3485,30 @@ def get_aliases_and_credits(self, options, release_id, album, obj, lang, credite
     :param obj: an XmlNode
     :param lang: The language selected in the Picard metadata options
     :param credited: The options item to determine what as-credited names are being sought
+    :param alias_ttl: maximum age (days) of aliases held in ARTIST_STORE - 0 if it is not to be used
     :return: None. Sets self.artist_aliases and self.artist_credits[album]
     """
     name_credit_list = parse_data(release_id, obj, [], 'artist_credit', 'name_credit')
     artist_list = parse_data(release_id, name_credit_list, [], 'artist')
     for artist in artist_list:
+        artist_ids = []
+        if alias_ttl:
+            # no need to search the aliases of an artist already known
+            artist_ids = parse_data(release_id, artist, [], 'attribs', 'id')
+            known = artist_ids and ARTIST_STORE.get(artist_ids[0], lang, alias_ttl)
+            if known:
+                if known[1]:
+                    self.artist_aliases[known[0]] = known[1]
+                continue
         sort_names = parse_data(release_id, artist, [], 'sort_name', 'text')
         if sort_names:
             aliases = parse_data(release_id, artist, [], 'alias_list', 'alias', 'attribs.locale:' +
                                  lang, 'attribs.primary:primary', 'text')
             if aliases:
                 self.artist_aliases[sort_names[0]] = aliases[0]
+            # only note that there is no alias if the aliases were included in the XML
+            if artist_ids and (aliases or parse_data(release_id, artist, [], 'alias_list')):
+                ARTIST_STORE.put(artist_ids[0], sort_names[0], lang, aliases[0] if aliases else None, alias_ttl)
     if credited:
         for name_credits in name_credit_list:
             for name_credit in name_credits:
@@ -3011,6 +3601,438 @@ def composer_last_names(self, release_id, tm, album):
                             '1. No composer for this track, but checking parent work.')
 
 
+class OrderedSet(collections.MutableSet):
+    """
+    Set which keeps its items in the order in which they were first added
+    (for accumulating unique items without repeated searches of a list)
+    """
+
+    def __init__(self, iterable=None):
+        self.items = collections.OrderedDict()
+        if iterable:
+            self.update(iterable)
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return 'OrderedSet(%r)' % list(self.items)
+
+    def add(self, item):
+        self.items[item] = None
+
+    def discard(self, item):
+        self.items.pop(item, None)
+
+    def update(self, iterable):
+        for item in iterable:
+            self.items[item] = None
+
+
+class LRUCache(object):
+    """
+    Dictionary holding at most maxsize items - the least recently used item is discarded to make room
+    NB reads also re-order the items, so all access is locked (the cache may be shared with the end-of-album
+    processing on ALBUM_THREAD_POOL)
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __len__(self):
+        with self.lock:
+            return len(self.items)
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return default
+            self.items[key] = value  # now the most recently used
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            if self.items.pop(key, None) is None and len(self.items) >= self.maxsize:
+                self.items.popitem(last=False)
+            self.items[key] = value
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class WeakKeyDefaultDict(weakref.WeakKeyDictionary):
+    """
+    WeakKeyDictionary which, like collections.defaultdict, creates missing items with default_factory
+    (for state keyed by albums or tracks, which must not keep them alive once Picard has discarded them)
+    """
+
+    def __init__(self, default_factory):
+        weakref.WeakKeyDictionary.__init__(self)
+        self.default_factory = default_factory
+
+    def __getitem__(self, key):
+        try:
+            return weakref.WeakKeyDictionary.__getitem__(self, key)
+        except KeyError:
+            value = self[key] = self.default_factory()
+            return value
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def album_tracks(album):
+    """
+    :param album:
+    :return: the album's tracks, both those being loaded and any from the previous load
+    NB Picard discards album._new_tracks once the album has finished loading
+    """
+    return set(getattr(album, '_new_tracks', [])) | set(album.tracks)
+
+
+def structure_sizes(obj):
+    """
+    :param obj: an ExtraArtists or PartLevels object
+    :return: the number of items in each of its collections - format is [(name, size), ...]
+    """
+    return [(name, len(value)) for name, value in sorted(vars(obj).items()) if hasattr(value, '__len__')]
+
+
+# INCREMENTAL RE-PROCESSING
+# The album-level stages (ExtraArtists.process_album and PartLevels.process_album) are skipped on a refresh if none of
+# their inputs has changed since the last load, the changes that they made to the track metadata being re-applied
+REFRESH_CACHE_SIZE = 20  # number of album stages whose outputs are kept
+STAGE_SECTIONS = {'artists': ('artists', 'tag', 'picard', 'other'),
+                  'works': ('workparts', 'genres', 'tag', 'picard', 'other')}  # option sections used by each stage
+stage_outputs = LRUCache(REFRESH_CACHE_SIZE)
+# format is {(release_id, stage): (fingerprint, [{tag: values (or None if deleted), ...} for each track]), ...}
+
+
+def fingerprint(*inputs):
+    """
+    :param inputs: anything with a consistent repr
+    :return: digest of the inputs
+    """
+    return hashlib.sha1(repr(inputs)).hexdigest()
+
+
+def node_fingerprint(node, digest=None):
+    """
+    :param node: an XmlNode
+    :param digest: hashlib object to be updated (a new one is used if None)
+    :return: the digest of the node and all its descendants (attributes and children are taken in sorted order)
+    """
+    if digest is None:
+        digest = hashlib.sha1()
+    digest.update(repr((node.text, sorted(node.attribs.iteritems()), len(node.children))))
+    for name in sorted(node.children):
+        children = node.children[name]
+        digest.update(repr((name, len(children))))
+        for child in children:
+            node_fingerprint(child, digest)
+    return digest
+
+
+def release_fingerprint(release_id, releaseXmlNode):
+    """
+    :param release_id: name for log file - usually =musicbrainz_albumid
+    :param releaseXmlNode: all the metadata for the release (including that for the tracks)
+    :return: digest of the release XML (calculated once per load)
+    """
+    if 'fingerprint' not in release_status[release_id]:
+        release_status[release_id]['fingerprint'] = node_fingerprint(releaseXmlNode).hexdigest()
+    return release_status[release_id]['fingerprint']
+
+
+def stage_options(options, stage):
+    """
+    :param options: the track options
+    :param stage: 'artists' or 'works'
+    :return: the values of the options which may affect the outputs of the stage
+    """
+    return [(opt['option'], options[opt['option']]) for opt in OPTION_SCHEMA.options(*STAGE_SECTIONS[stage])
+            if not opt['option'].startswith('log_')]
+
+
+def metadata_snapshot(tm):
+    """
+    :param tm: track metadata
+    :return: a copy of the tags - format is {tag: [values], ...}
+    """
+    return dict((tag, list(values)) for tag, values in dict.iteritems(tm))
+
+
+class AlbumStage(object):
+    """
+    An album-level processing stage: skipped if its inputs are unchanged since the last time it was run for the
+    release, with the outputs from that run being re-used
+    """
+
+    def __init__(self, release_id, name, tracks, inputs):
+        """
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        :param name: 'artists' or 'works'
+        :param tracks: the tracks of the album
+        :param inputs: everything other than the track metadata on which the stage depends (None if not known, in
+        which case the stage is always run)
+        """
+        self.release_id = release_id
+        self.name = name
+        self.tracks = list(tracks)
+        self.before = [metadata_snapshot(track.metadata) for track in self.tracks]
+        self.fingerprint = None
+        if inputs is not None:
+            self.fingerprint = fingerprint(inputs, [sorted(tags.iteritems()) for tags in self.before])
+
+    def reuse(self):
+        """
+        Re-apply the outputs of the previous run if the inputs are unchanged
+        :return: True if re-used (so the stage should be skipped)
+        """
+        previous = stage_outputs.get((self.release_id, self.name))
+        if not self.fingerprint or not previous or previous[0] != self.fingerprint:
+            return False
+        self.apply(previous[1])
+        release_status[self.release_id].setdefault('skipped', []).append(self.name)
+        write_log(self.release_id, 'info', 'Inputs to %s stage unchanged since last load - re-using previous outputs '
+                                           'for %s tracks', self.name, len(self.tracks))
+        return True
+
+    def changes(self, after=None):
+        """
+        :param after: the tags of each track after the stage has run, as from metadata_snapshot (if None, the tags
+        now)
+        :return: the changes made by the stage to each track's metadata - format is [{tag: [values] or None if
+        deleted, ...}, ...]
+        """
+        if after is None:
+            after = [metadata_snapshot(track.metadata) for track in self.tracks]
+        outputs = []
+        for before, tags in zip(self.before, after):
+            changes = dict((tag, values) for tag, values in tags.iteritems() if before.get(tag) != values)
+            changes.update((tag, None) for tag in before if tag not in tags)
+            outputs.append(changes)
+        return outputs
+
+    def apply(self, outputs):
+        """
+        Make changes (as from changes()) to each track's metadata
+        :param outputs:
+        :return: None
+        """
+        for track, changes in zip(self.tracks, outputs):
+            tm = track.metadata
+            for tag, values in changes.iteritems():
+                if values is None:
+                    del tm[tag]
+                else:
+                    tm[tag] = list(values)
+
+    def record(self, outputs=None):
+        """
+        Save the changes made by the stage to each track's metadata, for re-use
+        :param outputs: the changes, as from changes() (if None, those made to the tracks now)
+        :return: None
+        """
+        if not self.fingerprint:
+            return
+        if outputs is None:
+            outputs = self.changes()
+        stage_outputs[(self.release_id, self.name)] = (self.fingerprint, outputs)
+
+    def stand_ins(self):
+        """
+        :return: a TrackCopy for each track, holding its metadata as at the start of the stage
+        """
+        return [TrackCopy(tags) for tags in self.before]
+
+
+class TrackCopy(object):
+    """
+    Stands in for a track in end-of-album processing done off the main thread - holds a copy of its metadata only
+    """
+
+    def __init__(self, tags):
+        """
+        :param tags: as from metadata_snapshot
+        """
+        self.metadata = Metadata()
+        for tag, values in tags.iteritems():
+            self.metadata[tag] = list(values)
+
+    def __repr__(self):
+        return '<TrackCopy %r>' % self.metadata['title']
+
+
+def album_copy(obj, album, tracks, album_keyed, track_keyed):
+    """
+    Copy an ExtraArtists or PartLevels object for end-of-album processing off the main thread, so that the processing
+    does not use any data which the main thread may change meanwhile (or any Picard objects other than the album,
+    which is only used as a key)
+    :param obj:
+    :param album:
+    :param tracks: the album's tracks and their stand-ins - format is {track: TrackCopy, ...}
+    :param album_keyed: names of the collections keyed by album - the album's item is copied
+    :param track_keyed: names of the collections keyed by track - the tracks' items are copied and keyed by the
+    stand-ins (except for options, which are shared)
+    :return: (the copy - any other attributes are shared with obj, memo for copy.deepcopy which replaces the tracks
+    by their stand-ins)
+    """
+    memo = dict((id(track), stand_in) for track, stand_in in tracks.iteritems())
+    memo[id(album)] = album
+    clone = copy.copy(obj)
+    for name in album_keyed:
+        collection = getattr(obj, name)
+        copied = WeakKeyDefaultDict(collection.default_factory)
+        if album in collection:
+            copied[album] = copy.deepcopy(collection[album], memo)
+        setattr(clone, name, copied)
+    for name in track_keyed:
+        collection = getattr(obj, name)
+        copied = WeakKeyDefaultDict(collection.default_factory)
+        for track, stand_in in tracks.iteritems():
+            if track in collection:
+                copied[stand_in] = collection[track] if name == 'options' else copy.deepcopy(collection[track], memo)
+        setattr(clone, name, copied)
+    return clone, memo
+
+
+class NotCopied(Exception):
+    """
+    An item of a dict was read from a Snapshot which does not hold it
+    """
+
+
+class Snapshot(dict):
+    """
+    Copy of the items of a dict expected to be used by end-of-album processing off the main thread. It is taken on
+    the main thread, which may change the dict meanwhile, so the dict itself is never read by the processing: reading
+    any other of its items raises NotCopied (and the processing is then run on the main thread - see AlbumStages)
+    """
+
+    def __init__(self, source, keys, default_factory=None):
+        """
+        :param source: the dict
+        :param keys: the keys of the items to copy
+        :param default_factory: as for the source, if a collections.defaultdict
+        """
+        dict.__init__(self, ((key, copy.deepcopy(source[key])) for key in keys if key in source))
+        self.source_keys = frozenset(source)
+        self.default_factory = default_factory
+
+    def __missing__(self, key):
+        if key in self.source_keys:
+            raise NotCopied(key)
+        if self.default_factory is None:
+            raise KeyError(key)
+        value = self[key] = self.default_factory()
+        return value
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.source_keys
+
+
+class AlbumStages(object):
+    """
+    Runs the end-of-album stages (PartLevels.process_album and ExtraArtists.process_album) for each album one at a
+    time, in the order requested, so that each sees the outputs of those before it - as when run directly.
+    A stage is a function stage(release_id, album, background), called on the main thread when the album's earlier
+    stages are done. If background is False, or the stage has nothing to do, it completes and returns None. Otherwise
+    it returns (work, finish): work() is run on ALBUM_THREAD_POOL, on copies of the data it needs, so that Picard's
+    main thread is not held up, and then finish(result) on the main thread, to apply the results. If work fails, the
+    stage is run again on the main thread instead (with background False). Picard does not finish loading the album
+    meanwhile.
+    """
+
+    def __init__(self):
+        self.queues = WeakKeyDefaultDict(collections.deque)
+        # stages waiting to be run for each album - format is {album: deque([(release_id, stage), ...]), ...}
+        self.busy = weakref.WeakSet()
+        # albums with a stage running in the background
+        self.removed = weakref.WeakSet()
+        # albums removed from Picard while a stage was running in the background
+
+    def add(self, release_id, album, stage):
+        """
+        Run the stage once the album's earlier stages are done
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        :param album:
+        :param stage:
+        :return: None
+        """
+        self.queues[album].append((release_id, stage))
+        if album not in self.busy:
+            self.run_next(album)
+
+    def run_next(self, album):
+        queue = self.queues.get(album)
+        while queue:
+            release_id, stage = queue.popleft()
+            task = stage(release_id, album, config.setting['ce_background'])
+            if task:
+                work, finish = task
+                self.busy.add(album)
+                album._requests += 1
+                thread.run_task(work, partial(self.finished, release_id, album, stage, finish),
+                                thread_pool=ALBUM_THREAD_POOL)
+                return
+        self.queues.pop(album, None)
+
+    def finished(self, release_id, album, stage, finish, result=None, error=None):
+        """
+        Called on the main thread when a stage's work is done
+        :return: None
+        """
+        self.busy.discard(album)
+        album._requests -= 1
+        if album in self.removed:
+            return
+        if error is not None:
+            write_log(release_id, 'warning', 'Unable to complete end-of-album processing for %s in the background '
+                                             '(%r) - processing on the main thread instead', album, error)
+            stage(release_id, album, False)
+        else:
+            finish(result)
+        self.run_next(album)
+        album._finalize_loading(None)
+
+    def requests(self, album):
+        """
+        :param album:
+        :return: the album's outstanding requests, other than the one held while a stage runs in the background (so
+        that a stage does not hold up the end of the album's look-ups)
+        """
+        return album._requests - (1 if album in self.busy else 0)
+
+    def remove_album(self, album):
+        """
+        Abandon any stages for an album removed from Picard
+        :param album:
+        :return: None
+        """
+        self.queues.pop(album, None)
+        if album in self.busy:
+            self.removed.add(album)
+
+
+ALBUM_STAGES = AlbumStages()
+
+
 def add_list_uniquely(list_to, list_from):
     """
     Adds any items in list_from to list_to, if they are not already present
@@ -3025,9 +4047,17 @@ def add_list_uniquely(list_to, list_from):
             list_to = str_to_list(list_to)
         if not isinstance(list_from, list):
             list_from = str_to_list(list_from)
-        for list_item in list_from:
-            if list_item not in list_to:
-                list_to.append(list_item)
+        try:
+            present = set(list_to)
+            for list_item in list_from:
+                if list_item not in present:
+                    present.add(list_item)
+                    list_to.append(list_item)
+        except TypeError:
+            # items cannot be hashed
+            for list_item in list_from:
+                if list_item not in list_to:
+                    list_to.append(list_item)
     else:
         if list_from:
             list_to = list_from
@@ -3135,33 +4165,35 @@ class ExtraArtists():
 
     # CONSTANTS
     def __init__(self):
-        self.album_artists = collections.defaultdict(
+        # NB the collections keyed by album or track are emptied for an album by clear_album once it is processed
+        # (or removed) and are weakly keyed so that they never keep albums or tracks alive
+        self.album_artists = WeakKeyDefaultDict(
             lambda: collections.defaultdict(dict))
         # collection of artists to be applied at album level
-        self.track_listing = collections.defaultdict(list)
+        self.track_listing = WeakKeyDefaultDict(list)
         # collection of tracks - format is {album: [track 1,
         # track 2, ...]}
-        self.options = collections.defaultdict(dict)
+        self.options = WeakKeyDefaultDict(dict)
         # collection of Classical Extras options
-        self.globals = collections.defaultdict(dict)
+        self.globals = WeakKeyDefaultDict(dict)
         # collection of global variables for this class
-        self.album_performers = collections.defaultdict(
+        self.album_performers = WeakKeyDefaultDict(
             lambda: collections.defaultdict(dict))
         # collection of performers who have release relationships, not track
         # relationships
-        self.album_instruments = collections.defaultdict(
+        self.album_instruments = WeakKeyDefaultDict(
             lambda: collections.defaultdict(dict))
         # collection of instruments which have release relationships, not track
         # relationships
         self.artist_aliases = {}
         # collection of alias names - format is {sort_name: alias_name, ...}
-        self.artist_credits = collections.defaultdict(dict)
+        self.artist_credits = WeakKeyDefaultDict(dict)
         # collection of credited-as names - format is {album: {sort_name: credit_name,
         # ...}, ...}
-        self.release_artists_sort = collections.defaultdict(list)
+        self.release_artists_sort = WeakKeyDefaultDict(list)
         # collection of release artists - format is {album: [sort_name_1,
         # sort_name_2, ...]}
-        self.lyricist_filled = collections.defaultdict(dict)
+        self.lyricist_filled = WeakKeyDefaultDict(dict)
         # Boolean for each track to indicate if lyricist has been found (don't
         # want to add more from higher levels)
         # NB this last one is for completeness - not actually used by ExtraArtists, but here to remove pep8 error
@@ -3187,6 +4219,7 @@ class ExtraArtists():
             release_status[release_id]['lookups'] = 0
         release_status[release_id]['name'] = track_metadata['album']
         release_status[release_id]['artists'] = True
+        release_fingerprint(release_id, releaseXmlNode)
         write_log(release_id, 'debug', 'STARTING ARTIST PROCESSING FOR ALBUM %s, TRACK %s',
                   track_metadata['album'], track_metadata['tracknumber'] + ' ' + track_metadata['title'])
         # write_log('info', 'trackXmlNode = %s', trackXmlNode) # NB can crash Picard
@@ -3196,15 +4229,10 @@ class ExtraArtists():
         tm = track.metadata
 
         # OPTIONS - OVER-RIDE IF REQUIRED
-        if '~ce_options' not in tm:
+        if track not in release_status[release_id].get('track_options', {}):
             write_log(release_id, 'debug', 'Artists gets track first...')
             get_options(release_id, album, track)
-        options = interpret(tm['~ce_options'])
-        if not options:
-            if config.setting["log_error"]:
-                write_log(release_id, 'error', 'Artists. Failure to read saved options for track %s. options = %s',
-                          track, tm['~ce_options'])
-            options = option_settings(config.setting)
+        options = release_status[release_id]['track_options'][track]
         self.options[track] = options
 
         # CONSTANTS
@@ -3439,7 +4467,6 @@ class ExtraArtists():
         if track_metadata['tracknumber'] == track_metadata['totaltracks'] and track_metadata[
                 'discnumber'] == track_metadata['totaldiscs']:  # last track
             self.process_album(release_id, album)
-            close_log(release_id, 'artists')
 
     # Checks for ensembles
     def ensemble_type(self, performer):
@@ -3474,16 +4501,75 @@ class ExtraArtists():
                 return 'Group'
         return False
 
-    def process_album(self, release_id, album):
+    def process_album(self, release_id, album):
+        """
+        Perform final processing after all tracks read - once any earlier end-of-album stage for the album is done
+        (see AlbumStages)
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :return:
+        """
+        ALBUM_STAGES.add(release_id, album, self.album_stage)
+
+    def album_stage(self, release_id, album, background):
+        """
+        The end-of-album stage, as run by AlbumStages
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param background: True to do the work on a copy, in the background
+        :return: None if done, otherwise (work, finish) - see AlbumStages
+        """
+        if self.DEBUG:
+            write_log(release_id, 'debug', 'ExtraArtists: Starting process_album')
+        stage = AlbumStage(release_id, 'artists', self.track_listing[album], self.album_inputs(release_id, album))
+        if stage.reuse():
+            self.finish_album(release_id, album, stage)
+            return None
+        if not background:
+            self.organise_album(release_id, album)
+            self.finish_album(release_id, album, stage, stage.changes())
+            return None
+        stand_ins = stage.stand_ins()
+        clone = album_copy(self, album, dict(zip(stage.tracks, stand_ins)), ('track_listing', 'album_artists'),
+                           ('options', 'globals'))[0]
+
+        def work():
+            clone.organise_album(release_id, album)
+            return [metadata_snapshot(stand_in.metadata) for stand_in in stand_ins]
+
+        def finish(after):
+            outputs = stage.changes(after)
+            stage.apply(outputs)
+            self.finish_album(release_id, album, stage, outputs)
+        return work, finish
+
+    def finish_album(self, release_id, album, stage, outputs=None):
+        """
+        Tidy up once the end-of-album processing is done
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param stage: the AlbumStage
+        :param outputs: changes to the track metadata to be saved for re-use (None if not run or re-used)
+        :return:
+        """
+        if outputs is not None:
+            stage.record(outputs)
+        self.clear_album(album)
+        if self.INFO:
+            write_log(release_id, 'info', "FINISHED Classical Extra Artists. Album: %s", album)
+        close_log(release_id, 'artists')
+
+    def organise_album(self, release_id, album):
         """
-        Perform final processing after all tracks read
+        Set the album-wide metadata (lyrics, work types, blanked tags and tag mapping)
         :param release_id: name for log file - usually =musicbrainz_albumid
         unless called outside metadata processor
         :param album:
         :return:
         """
-        if self.DEBUG:
-            write_log(release_id, 'debug', 'ExtraArtists: Starting process_album')
         # process lyrics tags
         if self.DEBUG:
             write_log(release_id, 'debug', 'Starting lyrics processing')
@@ -3676,7 +4762,7 @@ class ExtraArtists():
                     lambda: collections.defaultdict(
                         lambda: collections.defaultdict(dict)))
 
-                for opt in plugin_options('artists') + plugin_options('picard'):
+                for opt in OPTION_SCHEMA.options('artists', 'picard'):
                     if 'name' in opt:
                         if 'value' in opt:
                             if options[opt['option']]:
@@ -3685,7 +4771,7 @@ class ExtraArtists():
                             self.cea_options['Classical Extras']['Artists options'][opt['name']
                                                                                     ] = options[opt['option']]
 
-                for opt in plugin_options('tag'):
+                for opt in OPTION_SCHEMA.options('tag'):
                     if opt['option'] != "":
                         name_list = opt['name'].split("_")
                         self.cea_options['Classical Extras']['Artists options'][name_list[0]
@@ -3701,9 +4787,33 @@ class ExtraArtists():
                                     ':artists_options', json.loads(
                         json.dumps(
                             self.cea_options)))
-        self.track_listing[album] = []
-        if self.INFO:
-            write_log(release_id, 'info', "FINISHED Classical Extra Artists. Album: %s", album)
+
+    def clear_album(self, album):
+        """
+        Discard the data held for the album and its tracks (once processed, or if the album is removed)
+        :param album:
+        :return:
+        """
+        for collection in (self.album_artists, self.track_listing, self.album_performers, self.album_instruments,
+                           self.artist_credits, self.release_artists_sort):
+            collection.pop(album, None)
+        for track in album_tracks(album):
+            for collection in (self.options, self.globals, self.lyricist_filled):
+                collection.pop(track, None)
+
+    def album_inputs(self, release_id, album):
+        """
+        The inputs to process_album, other than the track metadata
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :return: release XML digest and options, or None if the release XML digest is not known
+        """
+        if not release_status[release_id].get('fingerprint'):
+            return None
+        return (PLUGIN_VERSION, release_status[release_id]['fingerprint'],
+                [stage_options(self.options[track], 'artists') for track in self.track_listing[album]],
+                config.setting['artist_locale'] if 'artist_locale' in config.setting else None)
 
     def append_tag(self, release_id, tm, tag, source):
         """
@@ -4057,13 +5167,34 @@ class PartLevels():
             self.unlock()
             return value
 
+        def __len__(self):
+            return len(self.queue)
+
+        def discard_album(self, album):
+            """
+            Remove the album's tracks from the queue
+            :param album:
+            :return: the names no longer queued for any album
+            """
+            self.lock_for_write()
+            dropped = []
+            for name, value in self.queue.items():
+                value[:] = [item for item in value if item[1] is not album]
+                if not value:
+                    del self.queue[name]
+                    dropped.append(name)
+            self.unlock()
+            return dropped
+
         # INITIALISATION
 
     def __init__(self):
+        # NB the collections keyed by album or track are emptied for an album by clear_album once it is processed
+        # (or removed) and are weakly keyed so that they never keep albums or tracks alive
         self.works_cache = {}
         # maintains list of parent of each workid, or None if no parent found,
         # so that XML lookup need only executed if no existing record
-        self.partof = collections.defaultdict(dict)
+        self.partof = WeakKeyDefaultDict(dict)
         # the inverse of the above (immediate children of each parent)
         # but note that this is specific to the album as children may vary between albums
         # so format is {album1{parent1: child1, parent2:, child2},
@@ -4071,6 +5202,21 @@ class PartLevels():
         self.works_queue = self.WorksQueue()
         # lookup queue - holds track/album pairs for each queued workid (may be
         # more than one pair per id, especially for higher-level parts)
+        self.frontier = {}
+        # works awaiting look-up, across all albums - format is {workId: (release_id, album, tries, user_data), ...}
+        self.frontier_heap = []
+        # look-up order for the frontier - entries are (-depth, -number of tracks waiting, sequence no., workId)
+        # NB works are re-pushed when their priority rises, so out-of-date entries are skipped when popped
+        self.frontier_seq = itertools.count()
+        self.in_flight = 0
+        # number of look-ups issued but not yet returned
+        self.work_depth = {}
+        # number of levels above the track's work(s) for each work id (0 if not known)
+        self.disk_works = {}
+        # responses read from the disk cache (with their ancestors), kept until the replay queue below is done -
+        # format is {workId: XmlNode, ...}
+        self.disk_replay = collections.deque()
+        # works found in the disk cache awaiting processing - format is deque([(workId, tries, XmlNode), ...])
         self.parts = collections.defaultdict(
             lambda: collections.defaultdict(dict))
         # metadata collection for all parts - structure is {workid: {name: ,
@@ -4078,39 +5224,57 @@ class PartLevels():
         self.top_works = collections.defaultdict(dict)
         # metadata collection for top-level works for (track, album) -
         # structure is {(track, album): {workId: }, etc}
-        self.trackback = collections.defaultdict(
+        self.trackback = WeakKeyDefaultDict(
             lambda: collections.defaultdict(dict))
         # hierarchical iterative work structure - {album: {id: , children:{id:
         # , children{}, id: etc}, id: etc} }
-        self.work_listing = collections.defaultdict(list)
+        self.work_listing = WeakKeyDefaultDict(list)
         # contains list of workIds for each album
-        self.top = collections.defaultdict(list)
+        self.top = WeakKeyDefaultDict(list)
         # self.top[album] = list of work Ids which are top-level works in album
-        self.options = collections.defaultdict(dict)
+        self.options = WeakKeyDefaultDict(dict)
         # currently active Classical Extras options
         self.file_works = collections.defaultdict(list)
         # list of works derived from SongKong-style file tags
         # structure is {(album, track): [{workid: , name: }, {workid: ....}}
-        self.album_artists = collections.defaultdict(
+        self.album_artists = WeakKeyDefaultDict(
             lambda: collections.defaultdict(dict))
         # collection of artists to be applied at album level
         self.artist_aliases = {}
         # collection of alias names - format is {sort_name: alias_name, ...}
-        self.artist_credits = collections.defaultdict(dict)
+        self.artist_credits = WeakKeyDefaultDict(dict)
         # collection of credited-as names - format is {album: {sort_name: credit_name,
         # ...}, ...}
-        self.release_artists_sort = collections.defaultdict(list)
+        self.release_artists_sort = WeakKeyDefaultDict(list)
         # collection of release artists - format is {album: [sort_name_1,
         # sort_name_2, ...]}
-        self.lyricist_filled = collections.defaultdict(dict)
+        self.lyricist_filled = WeakKeyDefaultDict(dict)
         # Boolean for each track to indicate if lyricist has been found (don't
         # want to add more from higher levels)
-        self.orphan_tracks = collections.defaultdict(list)
+        self.work_ids = WeakKeyDefaultDict(dict)
+        # the work id (tuple) at each level for each track, as also written (as text) to ~cwp_workid_<level> - kept
+        # so that it need not be read back from the text - format is {track: {0: workId, 1: parentId, ...}, etc}
+        self.orphan_tracks = WeakKeyDefaultDict(list)
         # To keep a list for each album of tracks which do not have works -
         # format is {album: [track1, track2, ...], etc}
-        self.tracks = collections.defaultdict(list)
+        self.tracks = WeakKeyDefaultDict(list)
         # To keep a list of all tracks for the album - format is {album:
         # [track1, track2, ...], etc}
+        self.batch_queue = WeakKeyDefaultDict(list)
+        # works awaiting a batched look-up - format is {album: [workId1, workId2, ...], etc}
+        self.batch_busy = weakref.WeakSet()
+        # albums with a batched look-up scheduled or in progress
+        self.batch_artists = WeakKeyDefaultDict(collections.OrderedDict)
+        # composers whose works may be browsed, with the offset of the next page to fetch (None when finished) -
+        # format is {album: {artistId1: offset, artistId2: None, ...}, etc}
+        self.batch_works = WeakKeyDefaultDict(dict)
+        # works found by browsing - format is {album: {workId: work XmlNode, ...}, etc}
+        self.work_digests = {}
+        # digest of the look-up response for each work, so that changes can be detected - format is {workId: digest,
+        # ...}
+        self.boiled = LRUCache(BOIL_CACHE_SIZE)
+        # strings already boiled (the same work names are compared many times) - format is {string: boiled string,
+        # ...}
 
     ########################################
     # SECTION 1 - Initial track processing #
@@ -4137,6 +5301,7 @@ class PartLevels():
             release_status[release_id]['lookups'] = 0
         release_status[release_id]['name'] = track_metadata['album']
         release_status[release_id]['works'] = True
+        release_fingerprint(release_id, releaseXmlNode)
         write_log(release_id, 'debug', 'STARTING WORKS PROCESSING FOR ALBUM %s, TRACK %s',
                   track_metadata['album'], track_metadata['tracknumber'] + ' ' + track_metadata['title'])
         # clear the cache if required (if this is not done, then queue count may get out of sync)
@@ -4148,16 +5313,10 @@ class PartLevels():
                       config.setting['use_cache'])
 
         # OPTIONS - OVER-RIDE IF REQUIRED
-        if '~ce_options' not in tm:
+        if track not in release_status[release_id].get('track_options', {}):
             write_log(release_id, 'debug', 'Workparts gets track first...')
             get_options(release_id, album, track)
-        options = interpret(tm['~ce_options'])
-
-        if not options:
-            if config.setting["log_error"]:
-                write_log(release_id, 'error', 'Work Parts. Failure to read saved options for track %s. options = %s',
-                          track, tm['~ce_options'])
-            options = option_settings(config.setting)
+        options = release_status[release_id]['track_options'][track]
         self.options[track] = options
 
         # CONSTANTS
@@ -4178,6 +5337,7 @@ class PartLevels():
         # Maximum number of XML- lookup retries if error returned from server
         self.MAX_RETRIES = options["cwp_retries"]
         self.USE_CACHE = options["use_cache"]
+        self.BATCH = options["cwp_batch"]
         if options["cwp_partial"] and options["cwp_partial_text"] and options["cwp_level0_works"]:
             options["cwp_removewords_p"] = options["cwp_removewords"] + \
                 ", " + options["cwp_partial_text"] + ' '
@@ -4198,6 +5358,7 @@ class PartLevels():
             # get artist aliases - these are cached so can be re-used across
             # releases, but are reloaded with each refresh
             get_aliases(self, release_id, album, options, releaseXmlNode)
+            self.batch_clear(album)
 
         # fix titles which include composer name
         composersort = dict.get(track_metadata, 'composersort', [])
@@ -4222,6 +5383,13 @@ class PartLevels():
         workIds = dict.get(track_metadata, 'musicbrainz_workid', [])
         if workIds and not (options["ce_no_run"] and (
                 not tm['~ce_file'] or tm['~ce_file'] == "None")):
+            if self.BATCH:
+                # note the composers, whose works will be browsed for this track's works (and their parents)
+                for artistId in parse_data(release_id, trackXmlNode, [], 'recording', 'relation_list',
+                                           'attribs.target_type:work', 'relation', 'work', 'relation_list',
+                                           'attribs.target_type:artist', 'relation', 'attribs.type:composer',
+                                           'artist', 'attribs', 'id'):
+                    self.batch_artists[album].setdefault(artistId, 0)
             # works = dict.get(track_metadata, 'work', [])
             work_list_info = []
             keyed_workIds = {}
@@ -4403,10 +5571,9 @@ class PartLevels():
                       'Check for last track. Requests = %s, Tracknumber = %s, Totaltracks = %s,'
                       ' Discnumber = %s, Totaldiscs = %s', album._requests, track_metadata['tracknumber'],
                       track_metadata['totaltracks'], track_metadata['discnumber'], track_metadata['totaldiscs'])
-        if album._requests == 0 and track_metadata['tracknumber'] == track_metadata[
+        if ALBUM_STAGES.requests(album) == 0 and track_metadata['tracknumber'] == track_metadata[
                 'totaltracks'] and track_metadata['discnumber'] == track_metadata['totaldiscs']:
             self.process_album(release_id, album)
-            close_log(release_id, 'works')
 
     def get_sk_tags(self, release_id, album, track, tm, options):
         """
@@ -4516,6 +5683,7 @@ class PartLevels():
     def check_cache(self, tm, album, track, workId_tuple, not_in_cache):
         """
         Recursive loop to get cached works
+        (any works not in the session cache are passed back for look-up, which will use the disk cache if possible)
         :param tm:
         :param album:
         :param track:
@@ -4582,40 +5750,296 @@ class PartLevels():
                 workId,
                 (track,
                  album)):  # All work combos are queued, but only new workIds are passed to XML lookup
-            host = config.setting["server_host"]
-            port = config.setting["server_port"]
-            path = "/ws/2/%s/%s" % ('work', workId)
-            if config.setting['cwp_aliases'] and config.setting['cwp_aliases_tag_text']:
-                if config.setting['cwp_aliases_tags_user'] and user_data:
-                    login = True
-                    tag_type = '+tags +user-tags'
-                else:
-                    login = False
-                    tag_type = '+tags'
+            ttl = config.setting['cwp_cache_ttl']
+            if self.USE_CACHE and ttl:
+                if workId not in self.disk_works:
+                    # read the work together with all its ancestors on disk, so that the parents (queued when the
+                    # work is processed) are found without going back to the disk
+                    try:
+                        self.disk_works.update(WORKS_STORE.chain(workId, ttl, self.disk_works))
+                    except diskcache.sqlite3.Error as err:
+                        write_log(release_id, 'error', 'Unable to read work %s from disk cache: %s', workId, err)
+                document = self.disk_works.get(workId)
+                if document:
+                    if self.DEBUG or self.INFO:
+                        write_log(release_id, 'debug', "Work %s found in disk cache - no look-up needed", workId)
+                    return self.work_replay_add(workId, tries, document)
+            if self.BATCH and tries == 0 and user_data:
+                # retries are looked up individually
+                return self.work_batch_add(release_id, album, workId)
+            return self.work_schedule(release_id, album, workId, tries, user_data)
+        else:
+            if self.DEBUG or self.INFO:
+                write_log(release_id, 'debug', "Work is already in queue: %s", workId)
+            if workId in self.frontier:
+                # another track is waiting for it, so move it up the frontier
+                self.frontier_push(workId)
+
+    def work_replay_add(self, workId, tries, document):
+        """
+        Add a work found in the disk cache to the replay queue, which is processed once the current track
+        processing is complete, as for a look-up
+        :param workId:
+        :param tries: number of lookup attempts
+        :param document: the saved response
+        :return:
+        """
+        if not self.disk_replay:
+            QTimer.singleShot(0, self.work_replay)
+        self.disk_replay.append((workId, tries, document))
+
+    def work_replay(self):
+        """
+        Process the works in the replay queue (reply=None indicates that the response came from disk).
+        The parents which they queue are added to the same replay queue if they are also on disk, so a whole
+        hierarchy held on disk is processed in this one call
+        :return:
+        """
+        while self.disk_replay:
+            workId, tries, document = self.disk_replay[0]
+            self.work_process(workId, tries, document, None, None)
+            # only taken off the queue now, so that any parents added meanwhile do not schedule another replay
+            self.disk_replay.popleft()
+        self.disk_works.clear()
+
+    def work_schedule(self, release_id, album, workId, tries, user_data=True):
+        """
+        Add the work (already in the works queue) to the frontier of works awaiting look-up.
+        The frontier covers all albums in the session and is looked up deepest (i.e. highest-level) works first,
+        then those shared by the most tracks, so that the ancestors common to many tracks and albums are not held up
+        behind newly-queued track-level works
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param workId:
+        :param tries: number of lookup attempts
+        :param user_data:
+        :return:
+        """
+        self.frontier[workId] = (release_id, album, tries, user_data)
+        self.frontier_push(workId)
+        self.frontier_next()
+
+    def frontier_push(self, workId):
+        """
+        (Re-)enter the work in the look-up order at its current priority
+        :param workId:
+        :return:
+        """
+        waiting = self.works_queue[workId] or []
+        heapq.heappush(self.frontier_heap,
+                       (-self.work_depth.get(workId, 0), -len(waiting), next(self.frontier_seq), workId))
+
+    def frontier_next(self):
+        """
+        Issue look-ups from the frontier, in priority order, until MAX_IN_FLIGHT are in progress
+        :return:
+        """
+        while self.in_flight < MAX_IN_FLIGHT and self.frontier_heap:
+            depth, waiting, seq, workId = heapq.heappop(self.frontier_heap)
+            if workId not in self.frontier or (-depth, -waiting) != (
+                    self.work_depth.get(workId, 0), len(self.works_queue[workId] or [])):
+                continue  # already looked up, or superseded by an entry at a higher priority
+            release_id, album, tries, user_data = self.frontier.pop(workId)
+            self.in_flight += 1
+            self.work_lookup(release_id, album, workId, tries, user_data)
+
+    def work_scheduled_process(self, workId, tries, response, reply, error):
+        """
+        Process the response to a look-up from the frontier, then issue the next look-up (which may be a parent just
+        found, if it is now the deepest)
+        :param workId:
+        :param tries:
+        :param response:
+        :param reply:
+        :param error:
+        :return:
+        """
+        self.in_flight -= 1
+        try:
+            self.work_process(workId, tries, response, reply, error)
+        finally:
+            self.frontier_next()
+
+    def work_lookup_args(self, user_data):
+        """
+        :param user_data: False if user-specific data should not be requested (i.e. after an authentication failure)
+        :return: (login, queryargs) - whether to log in and the 'inc' query argument for work look-ups
+        """
+        if config.setting['cwp_aliases'] and config.setting['cwp_aliases_tag_text']:
+            if config.setting['cwp_aliases_tags_user'] and user_data:
+                login = True
+                tag_type = '+tags +user-tags'
             else:
                 login = False
-                tag_type = ''
-            queryargs = {"inc": "work-rels+artist-rels+label-rels+place-rels+aliases" + tag_type}
-            if self.DEBUG or self.INFO:
-                write_log(release_id, 'debug', "Initiating XML lookup for %s......", workId)
-            if release_id in release_status and 'lookups' in release_status[release_id]:
-                release_status[release_id]['lookups'] += 1
-            return album.tagger.xmlws.get(
-                host,
-                port,
-                path,
-                partial(
-                    self.work_process,
-                    workId,
-                    tries),
-                xml=True,
-                priority=True,
-                important=False,
-                mblogin=login,
-                queryargs=queryargs)
+                tag_type = '+tags'
+        else:
+            login = False
+            tag_type = ''
+        return login, {"inc": "work-rels+artist-rels+label-rels+place-rels+aliases" + tag_type}
+
+    def work_lookup(self, release_id, album, workId, tries, user_data=True):
+        """
+        XML look-up of an individual work (already in the works queue)
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param workId:
+        :param tries: number of lookup attempts
+        :param user_data:
+        :return:
+        """
+        host = config.setting["server_host"]
+        port = config.setting["server_port"]
+        path = "/ws/2/%s/%s" % ('work', workId)
+        login, queryargs = self.work_lookup_args(user_data)
+        if self.DEBUG or self.INFO:
+            write_log(release_id, 'debug', "Initiating XML lookup for %s......", workId)
+        if release_id in release_status and 'lookups' in release_status[release_id]:
+            release_status[release_id]['lookups'] += 1
+        return album.tagger.xmlws.get(
+            host,
+            port,
+            path,
+            partial(
+                self.work_scheduled_process,
+                workId,
+                tries),
+            xml=True,
+            priority=True,
+            important=False,
+            mblogin=login,
+            queryargs=queryargs)
+
+    def work_batch_add(self, release_id, album, workId):
+        """
+        Add the work (already in the works queue) to the album's batch, which is looked up once the current
+        processing is complete - so that all the works for a release (and later all their parents) are gathered first
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param workId:
+        :return:
+        """
+        self.batch_queue[album].append(workId)
+        if album not in self.batch_busy:
+            self.batch_busy.add(album)
+            QTimer.singleShot(0, partial(self.work_batch_lookup, release_id, album))
+
+    def work_batch_lookup(self, release_id, album):
+        """
+        Process the album's batch of works: works already found by browsing are processed straight away, the rest are
+        looked for in the next page of composers' works (or looked up individually if no composer pages are left)
+        NB only one browse request per album is in progress at a time - works added meanwhile wait in the batch
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :return:
+        """
+        found = self.batch_works[album]
+        resolved = []
+        remaining = []
+        for workId in self.batch_queue.pop(album, []):
+            if workId in found:
+                resolved.append(workId)
+            else:
+                remaining.append(workId)
+        if resolved and release_id in release_status:
+            release_status[release_id]['lookups_saved'] = release_status[release_id].get(
+                'lookups_saved', 0) + len(resolved)
+        artistId = None
+        if remaining:
+            for artist, offset in self.batch_artists[album].iteritems():
+                if offset is not None:
+                    artistId = artist
+                    break
+        if artistId:
+            self.batch_queue[album] = remaining
+            self.work_browse(release_id, album, artistId, self.batch_artists[album][artistId])
         else:
+            self.batch_busy.discard(album)
+            for workId in remaining:
+                self.work_schedule(release_id, album, workId, 0)
+        # processing found works may add their parents to the batch
+        for workId in resolved:
             if self.DEBUG or self.INFO:
-                write_log(release_id, 'debug', "Work is already in queue: %s", workId)
+                write_log(release_id, 'debug', "Work %s found by browsing - no look-up needed", workId)
+            document = XmlNode()
+            document.append_child('metadata').append_child('work', found[workId])
+            self.work_process(workId, 0, document, True, None)
+
+    def work_browse(self, release_id, album, artistId, offset):
+        """
+        Request a page of the works of a composer
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param artistId: composer MBID
+        :param offset: offset of the page in the composer's works
+        :return:
+        """
+        host = config.setting["server_host"]
+        port = config.setting["server_port"]
+        login, queryargs = self.work_lookup_args(True)
+        queryargs.update({'artist': artistId, 'limit': str(BROWSE_LIMIT), 'offset': str(offset)})
+        if self.DEBUG or self.INFO:
+            write_log(release_id, 'debug', "Browsing works for composer %s from %s......", artistId, offset)
+        if release_id in release_status and 'lookups' in release_status[release_id]:
+            release_status[release_id]['lookups'] += 1
+            release_status[release_id]['lookups_saved'] = release_status[release_id].get('lookups_saved', 0) - 1
+        return album.tagger.xmlws.get(
+            host,
+            port,
+            "/ws/2/work",
+            partial(
+                self.work_browse_process,
+                release_id,
+                album,
+                artistId,
+                offset),
+            xml=True,
+            priority=True,
+            important=False,
+            mblogin=login,
+            queryargs=queryargs)
+
+    def work_browse_process(self, release_id, album, artistId, offset, response, reply, error):
+        """
+        Process a page of a composer's works, then carry on with the batch
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param artistId:
+        :param offset:
+        :param response:
+        :param reply:
+        :param error:
+        :return:
+        """
+        works = []
+        count = 0
+        if error:
+            if self.WARNING or self.INFO:
+                write_log(release_id, 'warning', "%r: Network error browsing works. Error code %r", artistId, error)
+        elif 'metadata' in response.children and 'work_list' in response.metadata[0].children:
+            work_list = response.metadata[0].work_list[0]
+            works = work_list.children.get('work', [])
+            count = int(work_list.attribs.get('count', 0))
+        found = self.batch_works[album]
+        for work in works:
+            found[work.attribs['id']] = work
+        offset += len(works)
+        wanted = len([workId for workId in self.batch_queue[album] if workId not in found])
+        hits = len(self.batch_queue[album]) - wanted
+        # only carry on browsing this composer if this page had some of the works needed
+        # and the remaining pages are fewer than the works still to be found
+        if not hits or offset >= count or -(-(count - offset) // BROWSE_LIMIT) >= wanted:
+            offset = None
+        self.batch_artists[album][artistId] = offset
+        if self.DEBUG or self.INFO:
+            write_log(release_id, 'debug', "Browsed %s works for composer %s (of %s). %s works found, %s still wanted",
+                      len(works), artistId, count, hits, wanted)
+        self.work_batch_lookup(release_id, album)
 
     #####################################################################################
     # SECTION 2 - Works processing                                                      #
@@ -4636,7 +6060,7 @@ class PartLevels():
         :return:
         """
         if error:
-            tuples = self.works_queue.remove(workId)
+            tuples = self.works_queue.remove(workId) or []  # none if all the albums waiting have been removed
             for track, album in tuples:
                 release_id = track.metadata['musicbrainz_albumid']
                 if self.WARNING or self.INFO:
@@ -4663,6 +6087,16 @@ class PartLevels():
                                         "4. ERROR: MISSING METADATA due to network errors. Re-try or fix manually.")
                 self.album_remove_request(release_id, album)
             return
+        if reply is not None and config.setting['cwp_cache_ttl'] and 'metadata' in response.children:
+            # a fresh look-up, so save it to disk for future sessions
+            parentIds = parse_data('session', response, [], 'metadata', 'work', 'relation_list',
+                                   'attribs.target_type:work', 'relation', 'direction.text:backward', 'work',
+                                   'attribs', 'id')
+            try:
+                WORKS_STORE.put(workId, parentIds, response)
+            except diskcache.sqlite3.Error as err:
+                write_log('session', 'error', 'Unable to save work %s to disk cache: %s', workId, err)
+        self.work_digests[workId] = node_fingerprint(response).hexdigest()
         tuples = self.works_queue.remove(workId)
         # if self.INFO:
         #     write_log('session', 'info', 'Found work id %s. Tuples are %r', workId, tuples)
@@ -4820,14 +6254,20 @@ class PartLevels():
                         write_log(release_id, 'info', 'Have a new queue: queued_item = %r', queued_item)
             write_log(release_id, 'debug',
                       'Penultimate end of work_process for %s (subject to parent lookups in "new_queue")', workId)
+            # parents are one level deeper than this work (used to order the look-up frontier)
+            depth = self.work_depth.get(workId, 0) + 1
+            for queued_item in new_queue:
+                for parentId in queued_item[3]:
+                    if self.work_depth.get(parentId, 0) < depth:
+                        self.work_depth[parentId] = depth
             for queued_item in new_queue:
                 self.work_not_in_cache(queued_item[0], queued_item[1], queued_item[2], queued_item[3])
             write_log(release_id, 'debug',
                       'Ultimate end of work_process for %s', workId)
-            if album._requests == 0:
+            if ALBUM_STAGES.requests(album) == 0:
+                self.batch_clear(album)
                 self.process_album(release_id, album)
                 album._finalize_loading(None)
-                close_log(release_id, 'works')
 
 
 
@@ -4849,30 +6289,47 @@ class PartLevels():
             write_log(release_id, 'debug', "In work_process_metadata")
         if 'metadata' in response.children:
             if 'work' in response.metadata[0].children:
-                all_tags = parse_data(release_id, response.metadata[0].work, [], 'tag_list', 'tag', 'name', 'text')
+                # all the items needed from the work node are extracted in a single traversal
+                if 'artist_locale' in config.setting:
+                    locale = config.setting["artist_locale"]
+                    # NB this is the Picard code in /util
+                    lang = locale.split("_")[0]
+                else:
+                    lang = None
+                (all_tags, worktype_genres, key, composed_begin, composed_end, published_begin, published_end,
+                 premiered_begin, premiered_end, user_tags, relation_list, alias) = parse_batch(
+                    release_id, response.metadata[0].work,
+                    ('tag_list', 'tag', 'name', 'text'),
+                    ('attribs.type',),
+                    ('attribute_list', 'attribute', 'attribs.type:Key', 'text'),
+                    ('relation_list', 'attribs.target_type:artist', 'relation', 'attribs.type:composer',
+                     'begin', 'text'),
+                    ('relation_list', 'attribs.target_type:artist', 'relation', 'attribs.type:composer',
+                     'end', 'text'),
+                    ('relation_list', 'attribs.target_type:label', 'relation', 'attribs.type:publishing',
+                     'begin', 'text'),
+                    ('relation_list', 'attribs.target_type:label', 'relation', 'attribs.type:publishing',
+                     'end', 'text'),
+                    ('relation_list', 'attribs.target_type:place', 'relation', 'attribs.type:premiere',
+                     'begin', 'text'),
+                    ('relation_list', 'attribs.target_type:place', 'relation', 'attribs.type:premiere',
+                     'end', 'text'),
+                    ('user_tag_list', 'user_tag', 'name', 'text'),
+                    ('relation_list',),
+                    ('alias_list', 'alias', 'attribs.locale:' + (lang or ''), 'attribs.primary:primary', 'text'))
                 self.parts[wid]['folks_genres'] = all_tags
-                self.parts[wid]['worktype_genres'] = parse_data(release_id, response.metadata[0].work, [], 'attribs.type')
-                key = parse_data(release_id, response.metadata[0].work, [], 'attribute_list', 'attribute',
-                                 'attribs.type:Key', 'text')
+                self.parts[wid]['worktype_genres'] = worktype_genres
                 self.parts[wid]['key'] = key
-                composed_begin_dates = year(
-                    parse_data(release_id, response.metadata[0].work, [], 'relation_list', 'attribs.target_type:artist',
-                               'relation', 'attribs.type:composer', 'begin', 'text'))
-                composed_end_dates = year(
-                    parse_data(release_id, response.metadata[0].work, [], 'relation_list', 'attribs.target_type:artist',
-                               'relation', 'attribs.type:composer', 'end', 'text'))
+                composed_begin_dates = year(composed_begin)
+                composed_end_dates = year(composed_end)
                 if composed_begin_dates == composed_end_dates:
                     composed_dates = composed_begin_dates
                 else:
                     composed_dates = zip(composed_begin_dates, composed_end_dates)
                     composed_dates = [y + DATE_SEP + z for y, z in composed_dates]
                 self.parts[wid]['composed_dates'] = composed_dates
-                published_begin_dates = year(
-                    parse_data(release_id, response.metadata[0].work, [], 'relation_list', 'attribs.target_type:label',
-                               'relation', 'attribs.type:publishing', 'begin', 'text'))
-                published_end_dates = year(
-                    parse_data(release_id, response.metadata[0].work, [], 'relation_list', 'attribs.target_type:label',
-                               'relation', 'attribs.type:publishing', 'end', 'text'))
+                published_begin_dates = year(published_begin)
+                published_end_dates = year(published_end)
                 if published_begin_dates == published_end_dates:
                     published_dates = published_begin_dates
                 else:
@@ -4880,12 +6337,8 @@ class PartLevels():
                     published_dates = [x + DATE_SEP + y for x, y in published_dates]
                 self.parts[wid]['published_dates'] = published_dates
 
-                premiered_begin_dates = year(
-                    parse_data(release_id, response.metadata[0].work, [], 'relation_list', 'attribs.target_type:place',
-                               'relation', 'attribs.type:premiere', 'begin', 'text'))
-                premiered_end_dates = year(
-                    parse_data(release_id, response.metadata[0].work, [], 'relation_list', 'attribs.target_type:place',
-                               'relation', 'attribs.type:premiere', 'end', 'text'))
+                premiered_begin_dates = year(premiered_begin)
+                premiered_end_dates = year(premiered_end)
                 if premiered_begin_dates == premiered_end_dates:
                     premiered_dates = premiered_begin_dates
                 else:
@@ -4893,17 +6346,7 @@ class PartLevels():
                     premiered_dates = [x + DATE_SEP + y for x, y in premiered_dates]
                 self.parts[wid]['premiered_dates'] = premiered_dates
 
-
-
-
-                if 'artist_locale' in config.setting:
-                    locale = config.setting["artist_locale"]
-                    # NB this is the Picard code in /util
-                    lang = locale.split("_")[0]
-                    alias = parse_data(release_id, response.metadata[0].work, [], 'alias_list', 'alias',
-                                       'attribs.locale:' + lang, 'attribs.primary:primary', 'text')
-                    user_tags = parse_data(release_id, response.metadata[0].work, [], 'user_tag_list', 'user_tag',
-                                           'name', 'text')
+                if lang is not None:
                     if config.setting['cwp_aliases_tags_user']:
                         tags = user_tags
                     else:
@@ -4916,7 +6359,6 @@ class PartLevels():
                                 # alias should be a one item list but...
                                 self.parts[wid]['alias'][ind] = '; '.join(
                                     alias)
-                relation_list = parse_data(release_id, response.metadata[0].work, [], 'relation_list')
                 return self.work_process_relations(release_id, track, workId, wid, relation_list)
 
             else:
@@ -5001,6 +6443,17 @@ class PartLevels():
         itemsFound = [workItems, artists]
         return itemsFound
 
+    def batch_clear(self, album):
+        """
+        Discard the batched look-up data for the album
+        :param album:
+        :return:
+        """
+        self.batch_queue.pop(album, None)
+        self.batch_busy.discard(album)
+        self.batch_artists.pop(album, None)
+        self.batch_works.pop(album, None)
+
     def album_add_request(self, release_id, album):
         """
         To keep track as to whether all lookups have been processed
@@ -5029,14 +6482,95 @@ class PartLevels():
 
     def process_album(self, release_id, album):
         """
-        Top routine to run end-of-album processes
+        Top routine to run end-of-album processes - once any earlier end-of-album stage for the album is done (see
+        AlbumStages)
         :param release_id: name for log file - usually =musicbrainz_albumid
         unless called outside metadata processor
         :param album:
         :return:
         """
+        ALBUM_STAGES.add(release_id, album, self.album_stage)
+
+    def album_stage(self, release_id, album, background):
+        """
+        The end-of-album stage, as run by AlbumStages
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param background: True to do the work on a copy, in the background
+        :return: None if done, otherwise (work, finish) - see AlbumStages
+        """
         if self.DEBUG or self.INFO:
             write_log(release_id, 'debug', "PROCESS ALBUM %s", album)
+        stage = AlbumStage(release_id, 'works', album._new_tracks, self.album_inputs(release_id, album))
+        if stage.reuse():
+            self.finish_album(release_id, album, stage)
+            return None
+        if not background:
+            self.organise_album(release_id, album)
+            self.finish_album(release_id, album, stage, stage.changes())
+            return None
+        stand_ins = stage.stand_ins()
+        clone, memo = album_copy(self, album, dict(zip(stage.tracks, stand_ins)),
+                                 ('partof', 'trackback', 'work_listing', 'top', 'album_artists', 'artist_credits',
+                                  'release_artists_sort', 'orphan_tracks', 'tracks'),
+                                 ('options', 'lyricist_filled', 'work_ids'))
+        workIds = self.album_works(album)
+        clone.parts = Snapshot(self.parts, workIds, self.parts.default_factory)
+        parts_before = copy.deepcopy(dict(clone.parts))
+        clone.works_cache = Snapshot(self.works_cache, workIds)
+        clone.artist_aliases = dict(self.artist_aliases)
+        clone.top_works = collections.defaultdict(dict, (
+            ((memo[id(track)], album), copy.deepcopy(value, memo)) for (track, key_album), value in
+            self.top_works.items() if key_album is album and id(track) in memo))
+        clone.file_works = collections.defaultdict(list, (
+            ((album, memo[id(track)]), copy.deepcopy(value, memo)) for (key_album, track), value in
+            self.file_works.items() if key_album is album and id(track) in memo))
+
+        def work():
+            clone.organise_album(release_id, album)
+            return [metadata_snapshot(stand_in.metadata) for stand_in in stand_ins], dict(clone.parts)
+
+        def finish(result):
+            after, parts = result
+            outputs = stage.changes(after)
+            stage.apply(outputs)
+            # changes to the works (e.g. names put in order) are kept, as they would be if processed directly
+            for workId, part in parts.iteritems():
+                before = parts_before.get(workId, {})
+                for name, value in part.iteritems():
+                    if name not in before or before[name] != value:
+                        self.parts[workId][name] = value
+                for name in before:
+                    if name not in part:
+                        self.parts[workId].pop(name, None)
+            self.finish_album(release_id, album, stage, outputs)
+        return work, finish
+
+    def finish_album(self, release_id, album, stage, outputs=None):
+        """
+        Tidy up once the end-of-album processes are done
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :param stage: the AlbumStage
+        :param outputs: changes to the track metadata to be saved for re-use (None if not run or re-used)
+        :return:
+        """
+        if outputs is not None:
+            stage.record(outputs)
+        self.clear_album(album)
+        write_log(release_id, 'debug', "PROCESS ALBUM function complete")
+        close_log(release_id, 'works')
+
+    def organise_album(self, release_id, album):
+        """
+        Organise the tracks and works in the album and set the metadata
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :return:
+        """
         # populate the inverse hierarchy
         if self.INFO:
             write_log(release_id, 'info', "Cache: %s", self.works_cache)
@@ -5151,7 +6685,7 @@ class PartLevels():
                     track_meta = track[0]
                     tm = track_meta.metadata
                     if '~cwp_workid_0' in tm:
-                        workIds = interpret(tm['~cwp_workid_0'])
+                        workIds = self.work_id(track_meta, 0)
                         if workIds:
                             count = 0
                             self.process_work_artists(release_id, album, track_meta, workIds, tm, count)
@@ -5178,13 +6712,91 @@ class PartLevels():
         # if self.INFO:
         #     write_log(release_id, 'info', 'Self.trackback: %s', self.trackback)
 
-        # tidy up
-        self.trackback[album].clear()
         # Finally process the orphan tracks
         if album in self.orphan_tracks:
             for track in self.orphan_tracks[album]:
                 self.publish_metadata(release_id, album, track)
-        write_log(release_id, 'debug', "PROCESS ALBUM function complete")
+
+    def clear_album(self, album):
+        """
+        Discard the data held for the album and its tracks (once processed, or if the album is removed)
+        NB the works themselves are kept (in self.parts etc.) as they may be shared with other albums
+        :param album:
+        :return:
+        """
+        self.batch_clear(album)
+        for collection in (self.partof, self.trackback, self.work_listing, self.top, self.album_artists,
+                           self.artist_credits, self.release_artists_sort, self.orphan_tracks, self.tracks):
+            collection.pop(album, None)
+        tracks = album_tracks(album)
+        for track in tracks:
+            for collection in (self.options, self.lyricist_filled, self.work_ids):
+                collection.pop(track, None)
+        for key in [key for key in self.top_works if key[1] is album or key[0] in tracks]:
+            del self.top_works[key]
+        for key in [key for key in self.file_works if key[0] is album]:
+            del self.file_works[key]
+
+    def remove_album(self, album):
+        """
+        Abandon any processing of the album (which has been removed) and discard its data
+        :param album:
+        :return:
+        """
+        for workId in self.works_queue.discard_album(album):
+            # no other album is waiting for it, so do not look it up
+            self.frontier.pop(workId, None)
+        for workId, (release_id, frontier_album, tries, user_data) in self.frontier.items():
+            if frontier_album is album:
+                # look it up for an album still waiting
+                track, frontier_album = self.works_queue[workId][0]
+                self.frontier[workId] = (track.metadata['musicbrainz_albumid'], frontier_album, tries, user_data)
+            # fewer tracks may now be waiting, which makes its existing entries out of date
+            self.frontier_push(workId)
+        self.clear_album(album)
+        self.frontier_next()
+
+    def album_inputs(self, release_id, album):
+        """
+        The inputs to process_album, other than the track metadata
+        :param release_id: name for log file - usually =musicbrainz_albumid
+        unless called outside metadata processor
+        :param album:
+        :return: release XML digest, options and the digests of the works (and their parents) used by the album, or
+        None if the release XML digest is not known
+        """
+        if not release_status[release_id].get('fingerprint'):
+            return None
+        workIds = set()
+        pending = list(self.work_listing[album])
+        while pending:
+            workId_tuple = pending.pop()
+            workIds.update(workId_tuple)
+            if workId_tuple in self.works_cache:
+                parentIds = tuple(self.works_cache[workId_tuple])
+                if not all(parentId in workIds for parentId in parentIds):
+                    pending.append(parentIds)
+        return (PLUGIN_VERSION, release_status[release_id]['fingerprint'],
+                [stage_options(self.options[track], 'works') for track in album._new_tracks],
+                sorted((workId, self.work_digests.get(workId)) for workId in workIds))
+
+    def album_works(self, album):
+        """
+        :param album:
+        :return: the works used by the album and their parents, grandparents etc. - as a set of workId tuples (for
+        copying the works for end-of-album processing in the background)
+        """
+        workId_tuples = set()
+        pending = (list(self.work_listing.get(album, [])) + list(self.top.get(album, [])) +
+                   list(self.trackback.get(album, {})))
+        while pending:
+            workId_tuple = tuple(pending.pop())
+            if workId_tuple in workId_tuples:
+                continue
+            workId_tuples.add(workId_tuple)
+            if workId_tuple in self.works_cache:
+                pending.append(tuple(self.works_cache[workId_tuple]))
+        return workId_tuples
 
     def create_trackback(self, release_id, album, parentId):
         """
@@ -5325,7 +6937,7 @@ class PartLevels():
                         tm = track.metadata
                         if self.INFO:
                             write_log(release_id, 'info', "Track metadata = %s", tm)
-                        tm['~cwp_workid_' + unicode(depth)] = workId
+                        self.set_work_id(track, depth, workId)
                         self.write_tags(release_id, track, tm, workId)
                         self.make_annotations(release_id, track, workId)
                         # strip leading and trailing spaces from work names
@@ -5702,6 +7314,29 @@ class PartLevels():
                             unicode(level) +
                             ' - using hierarchy instead')
 
+    def set_work_id(self, track, level, workId):
+        """
+        Set the work id for a level of the track's work hierarchy
+        :param track:
+        :param level: 0 for the track's own work(s), 1 for the parent, etc.
+        :param workId: tuple of MB work ids
+        :return:
+        """
+        self.work_ids[track][level] = workId
+        # hidden variable (as text), for use in tag mapping and scripts
+        track.metadata['~cwp_workid_' + unicode(level)] = workId
+
+    def work_id(self, track, level):
+        """
+        :param track:
+        :param level:
+        :return: the work id set for the level by set_work_id (as interpret(tm['~cwp_workid_<level>']) would give, but
+        without reading it back from the text)
+        """
+        if level in self.work_ids[track]:
+            return self.work_ids[track][level]
+        return interpret(track.metadata['~cwp_workid_' + unicode(level)])
+
     def set_metadata(self, release_id, part_level, workId, parentId, parent, track):
         """
         Set the names of works and parts
@@ -5735,7 +7370,7 @@ class PartLevels():
                 self.parts[workId]['stripped_annotations'] = work_annotations
 
 
-            tm['~cwp_workid_' + unicode(part_level)] = parentId
+            self.set_work_id(track, part_level, parentId)
             tm['~cwp_work_' + unicode(part_level)] = parent
             # maybe more than one work name
             work = self.parts[workId]['name']
@@ -5960,7 +7595,7 @@ class PartLevels():
                     ref_level):  # top level will not be an arrangement else there would be a higher level
                 # needs to be a tuple to match
                 if '~cwp_workid_' + unicode(lev) in tm:
-                    tup_id = interpret(tm['~cwp_workid_' + unicode(lev)])
+                    tup_id = self.work_id(track, lev)
                     if 'arrangement' in self.parts[tup_id] and self.parts[tup_id]['arrangement']:
                         update_list = ['~cwp_work_', '~cwp_part_']
                         if options["cwp_level0_works"] and '~cwp_X0_work_' + \
@@ -5972,7 +7607,7 @@ class PartLevels():
 
         if options['cwp_partial'] and options["cwp_partial_text"]:
             if '~cwp_workid_0' in tm:
-                work0_id = interpret(tm['~cwp_workid_0'])
+                work0_id = self.work_id(track, 0)
                 if 'partial' in self.parts[work0_id] and self.parts[work0_id]['partial']:
                     update_list = ['~cwp_work_0', '~cwp_part_0']
                     if options["cwp_level0_works"] and '~cwp_X0_work_0' in tm:
@@ -5996,7 +7631,7 @@ class PartLevels():
         if options['cwp_medley']:
             for lev in range(0, ref_level + 1):
                 if '~cwp_workid_' + unicode(lev) in tm:
-                    tup_id = interpret(tm['~cwp_workid_' + unicode(lev)])
+                    tup_id = self.work_id(track, lev)
                     if 'medley_list' in self.parts[tup_id]:
                         medley_list = self.parts[tup_id]['medley_list']
                         tm['~cwp_work_' + unicode(lev)] += " (" + options["cwp_medley_text"] + \
@@ -6009,7 +7644,7 @@ class PartLevels():
                 tm['~cwp_title_work_0'] = tm['~cwp_title'] or tm['title']
             for lev in range(0, part_levels + 1):
                 if '~cwp_workid_' + unicode(lev) in tm:
-                    tup_id = interpret(tm['~cwp_workid_' + unicode(lev)])
+                    tup_id = self.work_id(track, lev)
                     if 'annotations' in self.parts[tup_id]:
                         write_log(release_id, 'info', 'in extend_metadata, annotations for id %s on track %s are %s',
                                   tup_id, track, self.parts[tup_id]['annotations'])
@@ -6079,7 +7714,7 @@ class PartLevels():
         tm['~cwp_part'] = part_main
 
         # fix medley text for "type 2" medleys
-        if self.parts[interpret(tm['~cwp_workid_0'])
+        if self.parts[self.work_id(track, 0)
                       ]['medley'] and options['cwp_medley']:
             if options["cwp_medley_text"]:
                 groupheading = options["cwp_medley_text"] + ' ' + groupheading
@@ -6225,7 +7860,7 @@ class PartLevels():
             diff2 = diff
             if diff:
                 if '~cwp_work_1' in tm:
-                    if self.parts[interpret(tm['~cwp_workid_0'])]['partial']:
+                    if self.parts[self.work_id(track, 0)]['partial']:
                         no_diff = False
                     else:
                         diff2 = self.diff_pair(release_id, track, tm, work[1], diff)
@@ -6240,8 +7875,8 @@ class PartLevels():
             if self.INFO:
                 write_log(release_id, 'info', 'Set no_diff for %s = %s', tm['~cwp_workid_0'], no_diff)
                 write_log(release_id, 'info', 'medley indicator for %s is %s', tm['~cwp_workid_0'],
-                          self.parts[interpret(tm['~cwp_workid_0'])]['medley'])
-            if self.parts[interpret(tm['~cwp_workid_0'])
+                          self.parts[self.work_id(track, 0)]['medley'])
+            if self.parts[self.work_id(track, 0)
                           ]['medley'] and options['cwp_medley']:
                 no_diff = False
                 if self.INFO:
@@ -6434,7 +8069,7 @@ class PartLevels():
                     if '~cwp_work_' + \
                             unicode(n) in tm and '~cwp_workid_' + unicode(n) in tm:
                         source = tm['~cwp_work_' + unicode(n)]
-                        source_id = list(interpret(tm['~cwp_workid_' + unicode(n)]))
+                        source_id = list(self.work_id(track, n))
                         if n == 0:
                             self.append_tag(release_id, tm, 'musicbrainz_work_composition', source)
                             for source_id_item in source_id:
@@ -6463,7 +8098,7 @@ class PartLevels():
             self.cwp_options = collections.defaultdict(
                 lambda: collections.defaultdict(dict))
 
-            for opt in plugin_options('workparts') + plugin_options('genres'):
+            for opt in OPTION_SCHEMA.options('workparts', 'genres'):
                 if 'name' in opt:
                     if 'value' in opt:
                         if options[opt['option']]:
@@ -6537,20 +8172,25 @@ class PartLevels():
         if not isinstance(work, basestring):
             work = '; '.join(work)
 
-        # replace any punctuation or numbers, with a space (to remove any
-        # inconsistent punctuation and numbering) - (?u) specifies the
-        # re.UNICODE flag in sub
-        clean_parent = re.sub("(?u)[\W]", ' ', parent)
-        # now allow the spaces to be filled with up to 2 non-letters
-        pattern_parent = re.sub("\s", "\W{0,2}", clean_parent)
-        if extend:
-            pattern_parent = "(.*\s|^)(\W*" + \
-                pattern_parent + "\w*)(\W*\s)(.*)"
-        else:
-            pattern_parent = "(.*\s|^)(\W*" + pattern_parent + "\w*\W?)(.*)"
+        # the same parent is stripped from many works, so its pattern is only compiled once
+        p = parent_patterns.get((parent, extend))
+        if p is None:
+            # replace any punctuation or numbers, with a space (to remove any
+            # inconsistent punctuation and numbering) - (?u) specifies the
+            # re.UNICODE flag in sub
+            clean_parent = NON_WORD.sub(' ', parent)
+            # now allow the spaces to be filled with up to 2 non-letters
+            pattern_parent = WHITESPACE.sub("\W{0,2}", clean_parent)
+            if extend:
+                pattern_parent = "(.*\s|^)(\W*" + \
+                    pattern_parent + "\w*)(\W*\s)(.*)"
+            else:
+                pattern_parent = "(.*\s|^)(\W*" + pattern_parent + "\w*\W?)(.*)"
+            if len(parent_patterns) >= MAX_PARENT_PATTERNS:
+                parent_patterns.clear()
+            p = parent_patterns[(parent, extend)] = re.compile(pattern_parent, re.IGNORECASE | re.UNICODE)
         if self.INFO:
-            write_log(release_id, 'info', "Pattern parent: %s, Work: %s", pattern_parent, work)
-        p = re.compile(pattern_parent, re.IGNORECASE | re.UNICODE)
+            write_log(release_id, 'info', "Pattern parent: %s, Work: %s", p.pattern, work)
         m = p.search(work)
         if m:
             if self.INFO:
@@ -6597,9 +8237,8 @@ class PartLevels():
                 stripped_work = work
         if extend and stripped_work == work:
             # try just stripping only the first portion
-            words = re.compile(r"[\w]+|[\W]")
-            parent_words = words.findall(parent)
-            work_words = words.findall(work)
+            parent_words = WORDS.findall(parent)
+            work_words = WORDS.findall(work)
             common_dets = longest_common_sequence(parent_words, work_words)
             common_seq = common_dets['sequence']
             seq_length = common_dets['length']
@@ -6645,16 +8284,9 @@ class PartLevels():
             write_log(release_id, 'info', "ti (amended) = %s", ti)
         if not ti:
             return None
-        p1 = re.compile(
-            r'^\W*\bM{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})\b[\s|\.|:|,|;]',
-            re.IGNORECASE)  # Matches Roman numerals with punctuation
-        # Matches positive integers with punctuation
-        p2 = re.compile(r'^\W*\d+[.):-]')
+        normaliser = get_title_normaliser(self.options[track], self.EQ)
         # remove certain words from the comparison
-        if self.options[track]["cwp_removewords_p"]:
-            removewords = self.options[track]["cwp_removewords_p"].split(',')
-        else:
-            removewords = []
+        removewords = normaliser.removewords
         if self.INFO:
             write_log(release_id, 'info', "Removewords = %s", removewords)
         # remove numbers, roman numerals, part etc and punctuation from the
@@ -6663,17 +8295,15 @@ class PartLevels():
             write_log(release_id, 'info', "checking prefixes")
         for i in range(
                 0, 5):  # in case of multiple levels
-            mb = p2.sub('', p1.sub('', mb)).strip()
-            ti = p2.sub('', p1.sub('', ti)).strip()
-            for prefix in removewords:
-                if prefix[0] != " ":
-                    prefix2 = unicode(prefix).lower().lstrip()
-                    if self.INFO:
-                        write_log(release_id, 'info', "checking prefix %s", prefix2)
-                    if mb.lower().startswith(prefix2):
-                        mb = mb[len(prefix2):]
-                    if ti.lower().startswith(prefix2):
-                        ti = ti[len(prefix2):]
+            mb = NUMBER_PREFIX.sub('', ROMAN_PREFIX.sub('', mb)).strip()
+            ti = NUMBER_PREFIX.sub('', ROMAN_PREFIX.sub('', ti)).strip()
+            for prefix2 in normaliser.prefixes:
+                if self.INFO:
+                    write_log(release_id, 'info', "checking prefix %s", prefix2)
+                if mb.lower().startswith(prefix2):
+                    mb = mb[len(prefix2):]
+                if ti.lower().startswith(prefix2):
+                    ti = ti[len(prefix2):]
             mb = mb.strip()
             ti = ti.strip()
             if self.INFO:
@@ -6681,70 +8311,20 @@ class PartLevels():
         if self.INFO:
             write_log(release_id, 'info', "Prefixes checked")
 
-        #  replacements
-        strreps = self.options[track]["cwp_replacements"].split('/')
-        replacements = []
-        for rep in strreps:
-            tupr = rep.strip(' ()').split(',')
-            if len(tupr) == 2:
-                for i, tr in enumerate(tupr):
-                    tupr[i] = tr.strip("' ").strip('"')
-                tupr = tuple(tupr)
-                replacements.append(tupr)
-            else:
-                if self.ERROR or self.INFO:
-                    write_log(release_id, 'error', 'Error in replacement format for replacement %s', rep)
-                self.append_tag(release_id, tm, '~cwp_error', '6. Error in replacement format for replacement ' +
-                                rep)
-        if self.INFO:
-            write_log(release_id, 'info', "Replacement: %s", replacements)
-
-        #  synonyms
-        strsyns = self.options[track]["cwp_synonyms"].split('/')
-        synonyms = []
-        for syn in strsyns:
-            tup = syn.strip(' ()').split(',')
-            if len(tup) == 2:
-                for i, ts in enumerate(tup):
-                    tup[i] = ts.strip("' ").strip('"')
-                    if not tup[i]:
-                        if self.ERROR or self.INFO:
-                            write_log(release_id, 'error', 'Synonym entries must not be blank - error in %s', syn)
-                        self.append_tag(release_id, tm, '~cwp_error',
-                                        '7. Synonym entries must not be blank - error in ' +
-                                        syn)
-                        tup[i] = "**BAD**"
-                    elif re.findall(r'[^\w|\&]+', tup[i], re.UNICODE):
-                        if self.ERROR or self.INFO:
-                            write_log(release_id, 'error',
-                                      'Synonyms must be single words without punctuation - error in %s', syn)
-                        self.append_tag(release_id, tm, '~cwp_error',
-                                        '7. Synonyms must be single words without punctuation - error in ' +
-                                        syn)
-                        tup[i] = "**BAD**"
-                if "**BAD**" in tup:
-                    continue
-                else:
-                    tup = tuple(tup)
-                    synonyms.append(tup)
-            else:
-                if self.ERROR or self.INFO:
-                    write_log(release_id, 'error', 'Error in synonmym format for synonym %s', syn)
-                self.append_tag(release_id, tm, '~cwp_error', '7. Error in synonym format for synonym ' +
-                                syn)
+        #  replacements and synonyms (errors in the options are reported for each track)
+        for error, tag_text in normaliser.errors:
+            if self.ERROR or self.INFO:
+                write_log(release_id, 'error', error)
+            self.append_tag(release_id, tm, '~cwp_error', tag_text)
         if self.INFO:
-            write_log(release_id, 'info', "Synonyms: %s", synonyms)
+            write_log(release_id, 'info', "Replacement: %s", normaliser.replacements)
+            write_log(release_id, 'info', "Synonyms: %s", normaliser.synonyms)
 
         # fix replacements and synonyms
-        for key, equiv in replacements:
+        for key, equiv, key_pattern in normaliser.replacement_patterns:
             if self.INFO:
                 write_log(release_id, 'info', "key %s, equiv %s", key, equiv)
-            if key[0] == "!" and key[1] == "!" and key[-1] == "!" and key[-2] == "!":  # we have a reg ex inside {{ }}
-                key_pattern = key[2:-2]
-            else:
-                esc_key = re.escape(key)
-                key_pattern = '\\b' + esc_key + '\\b'
-            ti = re.sub(key_pattern, equiv, ti)
+            ti = key_pattern.sub(equiv, ti)
             if self.INFO:
                 write_log(release_id, 'info', "Replaced replacements, ti = %s", ti)
         # Replace Roman numerals as per synonyms
@@ -6752,33 +8332,11 @@ class PartLevels():
         mb_test = replace_roman_numerals(mb)
         if self.INFO:
             write_log(release_id, 'info', 'Replaced Roman numerals. mb_test = %s, ti_test = %s', mb_test, ti_test)
-        for key, equiv in synonyms:
-            if self.INFO:
-                write_log(release_id, 'info', "key %s, equiv %s", key, equiv)
-            # mark the equivalents so that they can be reversed later
-            esc_equiv = re.escape(equiv)
-            equiv_pattern = '\\b' + esc_equiv + '\\b'
-            syno = self.EQ + equiv  # designating that it derived from the synonym
-            equo = equiv + self.EQ  # designating that it derived from the equivalent
-            esc_key = re.escape(key)
-            key_pattern = '\\b' + esc_key + '\\b'
-            mb_test = re.sub(
-                equiv_pattern,
-                equo,
-                mb_test,
-                re.IGNORECASE | re.UNICODE)
-            ti_test = re.sub(
-                equiv_pattern,
-                equo,
-                ti_test,
-                re.IGNORECASE | re.UNICODE)
-            mb_test = re.sub(key_pattern, syno, mb_test,
-                             re.IGNORECASE | re.UNICODE)
-            ti_test = re.sub(key_pattern, syno, ti_test,
-                             re.IGNORECASE | re.UNICODE)
-            # better than ti_test = ti_test.replace(key, equiv)
-            if self.INFO:
-                write_log(release_id, 'info', "Replaced synonyms mb_test = %s, ti_test = %s", mb_test, ti_test)
+        # mark the equivalents so that they can be reversed later
+        mb_test = normaliser.mark_synonyms(mb_test)
+        ti_test = normaliser.mark_synonyms(ti_test)
+        if self.INFO:
+            write_log(release_id, 'info', "Replaced synonyms mb_test = %s, ti_test = %s", mb_test, ti_test)
 
         # check if the title item is wholly part of the mb item
 
@@ -6825,7 +8383,7 @@ class PartLevels():
                             write_log(release_id, 'info', "MB_BIT: %s, TI_NEW: %s", mb_bit, ti_new)
             else:
                 if len(ti_new) > 0:
-                    return self.reverse_syn(release_id, ti_new, synonyms)
+                    return self.reverse_syn(release_id, ti_new, normaliser)
                 else:
                     return None
             if len(ti_new) == 0:
@@ -7082,26 +8640,23 @@ class PartLevels():
         if self.DEBUG or self.INFO:
             write_log(release_id, 'debug', "DIFF_PAIR is returning ti = %s", ti)
         if ti and len(ti) > 0:
-            return self.reverse_syn(release_id, ti, synonyms)
+            return self.reverse_syn(release_id, ti, normaliser)
         else:
             return None
 
-    def reverse_syn(self, release_id, term, synonyms):
+    def reverse_syn(self, release_id, term, normaliser):
         """
         reverse any synonyms left in the tititle item
         :param release_id: name for log file - usually =musicbrainz_albumid
         unless called outside metadata processor
         :param term: the title item
-        :param synonyms: tuples
+        :param normaliser: the TitleNormaliser holding the synonyms
         :return: title item without synonyms
         """
-        for key, equiv in synonyms:
+        for equiv_pattern, key in normaliser.reverse_patterns:
             if self.INFO:
-                write_log(release_id, 'info', "key %s, equiv %s", key, equiv)
-            equiv = self.EQ + equiv
-            esc_equiv = re.escape(equiv)
-            equiv_pattern = '\\b' + esc_equiv + '\\b'
-            term = re.sub(equiv_pattern, key, term)
+                write_log(release_id, 'info', "key %s, equiv pattern %s", key, equiv_pattern.pattern)
+            term = equiv_pattern.sub(key, term)
             term = term.replace(self.EQ, '')
         return term
 
@@ -7118,23 +8673,16 @@ class PartLevels():
         s = s.lower()
         if isinstance(s, str):
             s = s.decode('unicode_escape')
-        s = s.replace(self.EQ.lower(), '')\
-            .replace('sch', 'sh')\
-            .replace(u'\xdf', 'ss')\
-            .replace('sz', 'ss')\
-            .replace(u'\u0153', 'oe')\
-            .replace('oe', 'o')\
-            .replace(u'\u00fc', 'ue')\
-            .replace('ue', 'u')\
-            .replace('ae', 'a')
-        # first term above is to remove the markers used for synonyms, to
-        # enable a true comparison
-        punc = re.compile(r'\W*')
-        s = ''.join(
-            c for c in unicodedata.normalize(
-                'NFD',
-                s) if unicodedata.category(c) != 'Mn')
-        boiled = punc.sub('', s).strip().lower().rstrip("s'")
+        boiled = self.boiled.get(s)
+        if boiled is None:
+            # first term is to remove the markers used for synonyms, to
+            # enable a true comparison
+            folded = s.replace(self.EQ.lower(), '').replace('sch', 'sh').translate(BOIL_FOLDING)
+            for old, new in BOIL_REPLACEMENTS:
+                folded = folded.replace(old, new)
+            # remove accents, punctuation and spaces - NB only ascii word characters are kept, as before, when
+            # the (non-unicode) \W pattern was used to remove punctuation
+            boiled = self.boiled[s] = folded.translate(ASCII_FOLDING).lower().rstrip("s'")
         if self.DEBUG or self.INFO:
             write_log(release_id, 'debug', "boiled result = %s", boiled)
         return boiled
@@ -7161,8 +8709,7 @@ class ClassicalExtrasOptionsPage(OptionsPage):
     NAME = "classical_extras"
     TITLE = "Classical Extras"
     PARENT = "plugins"
-    opts = plugin_options('artists') + plugin_options('tag') +\
-           plugin_options('workparts') + plugin_options('genres') + plugin_options('other')
+    opts = OPTION_SCHEMA.options(*OPTION_SCHEMA.UI_SECTIONS)
 
     options = []
     # custom logging for non-album-related messages is written to startup.log
@@ -7183,16 +8730,31 @@ class ClassicalExtrasOptionsPage(OptionsPage):
 
     def __init__(self, parent=None):
         super(ClassicalExtrasOptionsPage, self).__init__(parent)
-        self.ui = Ui_ClassicalExtrasOptionsPage()
-        self.ui.setupUi(self)
+        # The form is large and Picard builds every options page each time the options dialog is opened, so it is
+        # only built (and its module imported) when this page is first shown - see showEvent
+        self.ui = None
+        self.load_pending = False
+
+    def showEvent(self, event):
+        if self.ui is None:
+            from picard.plugins.classical_extras.ui_options_classical_extras import Ui_ClassicalExtrasOptionsPage
+            self.ui = Ui_ClassicalExtrasOptionsPage()
+            self.ui.setupUi(self)
+            if self.load_pending:
+                self.load()
+        super(ClassicalExtrasOptionsPage, self).showEvent(event)
 
     def load(self):
         """
-        Load the options - NB all options are set in plugin_options, so this just parses that
+        Load the options - NB all options are set in plugin_options, so this just parses that (via OPTION_SCHEMA)
+        If the form has not been built yet, the options are loaded when it is
         :return:
         """
-        opts = plugin_options('artists') + plugin_options('tag') + \
-               plugin_options('workparts') + plugin_options('genres') + plugin_options('other')
+        if self.ui is None:
+            self.load_pending = True
+            return
+        self.load_pending = False
+        opts = OPTION_SCHEMA.options(*OPTION_SCHEMA.UI_SECTIONS)
 
         # To force a toggle so that signal given
         toggle_list = ['use_cwp',
@@ -7236,8 +8798,13 @@ class ClassicalExtrasOptionsPage(OptionsPage):
                 write_log('session', 'error', "Error in loading options for option = %s", opt['option'])
 
     def save(self):
-        opts = plugin_options('artists') + plugin_options('tag') + \
-               plugin_options('workparts') + plugin_options('genres') + plugin_options('other')
+        """
+        Save the options - nothing to do if the page has not been shown, as none can have been changed
+        :return:
+        """
+        if self.ui is None:
+            return
+        opts = OPTION_SCHEMA.options(*OPTION_SCHEMA.UI_SECTIONS)
 
         for opt in opts:
             if opt['option'] == 'classical_work_parts':
@@ -7265,6 +8832,39 @@ class ClassicalExtrasOptionsPage(OptionsPage):
                 write_log('session', 'error', "Error in saving options for option = %s", opt['option'])
 
 
+class MemoryReport(BaseAction):
+    """
+    Debug command (on the album context menu) to write the number of items held in each of the plugin's collections
+    to the session log, so that memory use can be checked over a long session
+    """
+    NAME = 'Classical Extras: report memory use'
+
+    def callback(self, objs):
+        write_log('session', 'basic', 'Memory report: %s albums loaded', len(self.tagger.albums))
+        sizes = [('release_status', len(release_status)), ('log_files', len(log_files)),
+                 ('stage_outputs', len(stage_outputs))]
+        for name, obj in (('ExtraArtists', EXTRA_ARTISTS), ('PartLevels', PART_LEVELS)):
+            sizes.extend((name + '.' + attr, size) for attr, size in structure_sizes(obj))
+        for name, size in sizes:
+            write_log('session', 'basic', '%s: %s', name, size)
+
+
+def album_removed(album):
+    """
+    Discard everything held for an album removed from Picard (whether or not it has finished loading)
+    :param album:
+    :return:
+    """
+    ALBUM_STAGES.remove_album(album)
+    EXTRA_ARTISTS.clear_album(album)
+    PART_LEVELS.remove_album(album)
+    if 'start' in release_status.get(album.id, {}):
+        # still being processed, so close its log
+        release_status[album.id]['works'] = False
+        release_status[album.id]['artists'] = False
+        close_log(album.id, 'removed')
+
+
 #################
 # MAIN ROUTINE  #
 #################
@@ -7275,27 +8875,27 @@ config.setting['use_cache'] = True
 config.setting['ce_options_overwrite'] = False
 config.setting['track_ars'] = True
 config.setting['release_ars'] = True
+# remove out-of-date works and artists from the disk caches
+if config.setting['cwp_cache_ttl']:
+    try:
+        WORKS_STORE.purge(config.setting['cwp_cache_ttl'])
+    except diskcache.sqlite3.Error as err:
+        write_log('session', 'error', 'Unable to open works disk cache: %s', err)
+if config.setting['cea_alias_cache_ttl']:
+    try:
+        ARTIST_STORE.purge(config.setting['cea_alias_cache_ttl'])
+    except diskcache.sqlite3.Error as err:
+        write_log('session', 'error', 'Unable to open artists disk cache: %s', err)
 # custom logging for non-album-related messages is written to startup.log
 write_log('session', 'basic', 'Loading ' + PLUGIN_NAME)
-REF_DICT = get_references_from_file('session',
-                                    config.setting['cwp_muso_path'], config.setting['cwp_muso_refdb'])
-write_log('session', 'info', 'External references (Muso):')
-write_log('session', 'info', REF_DICT)
-COMPOSER_DICT = REF_DICT['composers']
-if config.setting['cwp_muso_classical'] and not COMPOSER_DICT:
-    write_log('session', 'error', 'No composer roster found')
-for cd in COMPOSER_DICT:
-    cd['lc_name'] = [c.lower() for c in cd['name']]
-    cd['lc_sort'] = [c.lower() for c in cd['sort']]
-PERIOD_DICT = REF_DICT['periods']
-if (config.setting['cwp_muso_dates'] or config.setting['cwp_muso_periods']) and not PERIOD_DICT:
-    write_log('session', 'error', 'No period map found')
-GENRE_DICT = REF_DICT['genres']
-if config.setting['cwp_muso_genres'] and not GENRE_DICT:
-    write_log('session', 'error', 'No classical genre list found')
-register_track_metadata_processor(PartLevels().add_work_info)
-register_track_metadata_processor(ExtraArtists().add_artist_info)
+# NB the Muso reference database is read on first use (see MusoReferences)
+PART_LEVELS = PartLevels()
+EXTRA_ARTISTS = ExtraArtists()
+register_track_metadata_processor(PART_LEVELS.add_work_info)
+register_track_metadata_processor(EXTRA_ARTISTS.add_artist_info)
 register_options_page(ClassicalExtrasOptionsPage)
+register_album_action(MemoryReport())
+Tagger.instance().album_removed.connect(album_removed)
 write_log('session', 'basic', 'Finished intialisation')
 # config.setting['log_debug'] = False
 # config.setting['log_info'] = False
@@ -0,0 +1,218 @@
+# -*- coding: utf-8
+
+"""
+Persistent (on-disk) caches for Classical Extras
+
+Work look-ups are rate-limited by MusicBrainz to one per second, so a large box set can take many minutes to load.
+The works store keeps each work look-up response (which holds the work name, parent links, key, composed/published/
+premiered dates, aliases and tags) in an SQLite database so that the work hierarchy can be rebuilt after a restart
+without going back to the network.
+
+The artists store keeps the sort name and the primary alias for each locale of the artists met in releases, so that
+the alias lists of artists already known do not need to be searched again (in this or later sessions).
+
+Part of the Picard Classical Extras project
+(c) 2018
+"""
+
+import os
+import time
+import json
+import zlib
+import sqlite3
+from picard.webservice import XmlNode
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def node_to_data(node):
+    """
+    :param node: an XmlNode
+    :return: the node as nested built-in types (suitable for json)
+    """
+    return {'t': node.text,
+            'a': node.attribs,
+            'c': dict((name, [node_to_data(child) for child in children])
+                      for name, children in node.children.iteritems())}
+
+
+def data_to_node(data):
+    """
+    :param data: as produced by node_to_data
+    :return: the equivalent XmlNode
+    """
+    node = XmlNode()
+    node.text = data['t']
+    node.attribs = data['a']
+    for name, children in data['c'].iteritems():
+        for child in children:
+            node.append_child(name, data_to_node(child))
+    return node
+
+
+class WorksStore(object):
+    """
+    SQLite-backed store of work look-up responses, keyed by work MBID
+    """
+
+    def __init__(self, path):
+        """
+        :param path: full path of the database file (created on first use)
+        """
+        self.path = path
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            dirname = os.path.dirname(self.path)
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS works '
+                                    '(work_id TEXT PRIMARY KEY, parent_ids TEXT, fetched REAL, document BLOB)')
+            self.connection.commit()
+        return self.connection
+
+    def chain(self, work_id, ttl, known=()):
+        """
+        Read the work and its ancestors, following the stored parent ids, so that the whole hierarchy above a work
+        is read in one go (a level at a time)
+        :param work_id: work MBID
+        :param ttl: maximum age of the records in days
+        :param known: ids of ancestors already read, which are not read again
+        :return: the stored responses as XmlNodes - format is {work_id: XmlNode, ...} - which is empty if the work is
+        not held (or out of date); the chain stops at any ancestor not held
+        """
+        connection = self.connect()
+        expiry = time.time() - ttl * SECONDS_PER_DAY
+        documents = {}
+        level = [work_id]
+        while level:
+            rows = connection.execute('SELECT work_id, parent_ids, document FROM works WHERE fetched > ? AND '
+                                      'work_id IN (%s)' % ', '.join('?' * len(level)), [expiry] + level).fetchall()
+            level = []
+            for row_id, parent_ids, document in rows:
+                documents[row_id] = data_to_node(json.loads(zlib.decompress(document)))
+                level += [parent_id for parent_id in json.loads(parent_ids)
+                          if parent_id not in documents and parent_id not in known and parent_id not in level]
+        return documents
+
+    def put(self, work_id, parent_ids, document):
+        """
+        :param work_id: work MBID
+        :param parent_ids: list of parent work MBIDs
+        :param document: the XmlNode response from the look-up
+        :return: None
+        """
+        blob = sqlite3.Binary(zlib.compress(json.dumps(node_to_data(document))))
+        connection = self.connect()
+        connection.execute('INSERT OR REPLACE INTO works (work_id, parent_ids, fetched, document) VALUES (?, ?, ?, ?)',
+                           (work_id, json.dumps(parent_ids), time.time(), blob))
+        connection.commit()
+
+    def purge(self, ttl):
+        """
+        Remove out-of-date records
+        :param ttl: maximum age of records in days
+        :return: number of records removed
+        """
+        connection = self.connect()
+        cursor = connection.execute('DELETE FROM works WHERE fetched <= ?', (time.time() - ttl * SECONDS_PER_DAY,))
+        connection.commit()
+        return cursor.rowcount
+
+
+class ArtistStore(object):
+    """
+    SQLite-backed store of artist sort names and aliases, keyed by artist MBID
+    The records are read into memory on first use and changes are written back by save(); a record is only used while
+    it is in date, so that it is refreshed (and so that a change to the maximum age takes effect in the same session)
+    """
+
+    def __init__(self, path):
+        """
+        :param path: full path of the database file (created on first use)
+        """
+        self.path = path
+        self.connection = None
+        self.records = None
+        # format is {artist_id: {'sort_name': sort name, 'aliases': {locale: alias or None}, 'fetched': time}, ...}
+        self.changed = set()  # artist ids with changes not yet saved
+
+    def connect(self):
+        if self.connection is None:
+            dirname = os.path.dirname(self.path)
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS artists '
+                                    '(artist_id TEXT PRIMARY KEY, sort_name TEXT, aliases TEXT, fetched REAL)')
+            self.connection.commit()
+        return self.connection
+
+    def load(self):
+        """
+        :return: the records (read from disk the first time)
+        """
+        if self.records is None:
+            self.records = {}
+            rows = self.connect().execute('SELECT artist_id, sort_name, aliases, fetched FROM artists')
+            for artist_id, sort_name, aliases, fetched in rows:
+                self.records[artist_id] = {'sort_name': sort_name, 'aliases': json.loads(aliases), 'fetched': fetched}
+        return self.records
+
+    def get(self, artist_id, locale, ttl):
+        """
+        :param artist_id: artist MBID
+        :param locale: language of the alias
+        :param ttl: maximum age of the record in days
+        :return: (sort name, alias or None) or None if no alias information is held for the locale (or the record is
+        out of date)
+        """
+        record = self.load().get(artist_id)
+        if record and record['fetched'] > time.time() - ttl * SECONDS_PER_DAY and locale in record['aliases']:
+            return record['sort_name'], record['aliases'][locale]
+        return None
+
+    def put(self, artist_id, sort_name, locale, alias, ttl):
+        """
+        :param artist_id: artist MBID
+        :param sort_name: artist sort name
+        :param locale: language of the alias
+        :param alias: the primary alias for the locale (None if the artist has none)
+        :param ttl: maximum age of the records in days
+        :return: None
+        """
+        record = self.load().get(artist_id)
+        if not record or record['fetched'] <= time.time() - ttl * SECONDS_PER_DAY or record['sort_name'] != sort_name:
+            # the aliases held for other locales are out of date
+            record = self.records[artist_id] = {'sort_name': sort_name, 'aliases': {}, 'fetched': time.time()}
+        record['aliases'][locale] = alias
+        self.changed.add(artist_id)
+
+    def save(self):
+        """
+        Write the changed records to disk
+        :return: None
+        """
+        if not self.changed:
+            return
+        connection = self.connect()
+        connection.executemany('INSERT OR REPLACE INTO artists (artist_id, sort_name, aliases, fetched) '
+                               'VALUES (?, ?, ?, ?)',
+                               [(artist_id, self.records[artist_id]['sort_name'],
+                                 json.dumps(self.records[artist_id]['aliases']), self.records[artist_id]['fetched'])
+                                for artist_id in self.changed])
+        connection.commit()
+        self.changed.clear()
+
+    def purge(self, ttl):
+        """
+        Remove out-of-date records
+        :param ttl: maximum age of records in days
+        :return: number of records removed
+        """
+        connection = self.connect()
+        cursor = connection.execute('DELETE FROM artists WHERE fetched <= ?', (time.time() - ttl * SECONDS_PER_DAY,))
+        connection.commit()
+        return cursor.rowcount
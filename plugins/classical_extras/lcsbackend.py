@@ -0,0 +1,144 @@
+# -*- coding: utf-8
+
+"""
+Choice of longest common substring method for turbo_lcs
+
+For two strings, the dynamic programming / suffix automaton method (substring.py) is exact and always fastest.
+For more, folding it pairwise over the list is not exact, so one of the generalized suffix tree (suffixtree.py) or the
+suffix array (suffixarray.py) is used. Which of these is faster depends on the number and length of the strings and
+on the machine, so they are timed on a grid of input shapes the first time that a choice is needed; the fastest
+method for each shape is saved (in the Classical_Extras directory) and the nearest shape is used for each input.
+The timing takes about a second, so it runs on a background thread; until it is done, default choices (as measured
+on a typical machine) are used.
+
+Part of the Picard Classical Extras project
+(c) 2018
+"""
+
+import os
+import json
+import math
+import time
+import random
+import threading
+import suffixtree
+import suffixarray
+
+CALIBRATION_VERSION = 1  # change if the backends or shapes change, to force re-calibration
+COUNTS = (3, 12, 48)  # numbers of strings in the calibration grid
+LENGTHS = (20, 100, 400)  # mean string lengths in the calibration grid
+BACKENDS = {'tree': suffixtree.multi_lcs, 'array': suffixarray.multi_lcs}
+# used until the calibration is available - the array was faster for all shapes but 12 strings of 400 words
+DEFAULT_TABLE = [[count, length, 'tree' if (count, length) == (12, 400) else 'array', {}]
+                 for count in COUNTS for length in LENGTHS]
+
+
+def sample(count, length, seed=0):
+    """
+    Synthetic input, similar to lyrics split into words: each list shares a common run of words
+    :param count: number of lists
+    :param length: length of each list
+    :param seed: random seed
+    :return: list of lists of words
+    """
+    rand = random.Random(seed)
+    vocabulary = ['w%d' % i for i in range(200)]
+    common = [rand.choice(vocabulary) for _ in range(max(1, length // 5))]
+    lists = []
+    for _ in range(count):
+        before = rand.randint(0, length - len(common))
+        lists.append([rand.choice(vocabulary) for _ in range(before)] + common +
+                     [rand.choice(vocabulary) for _ in range(length - len(common) - before)])
+    return lists
+
+
+class Calibration(object):
+    """
+    Fastest backend for each input shape - format of table is [[count, length, backend, {backend: seconds, ...}], ...]
+    """
+
+    def __init__(self, path):
+        """
+        :param path: full path of the file to hold the results (created when first calibrated)
+        """
+        self.path = path
+        self.table = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        :return: True if a calibration for the current version was read
+        """
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get('version') == CALIBRATION_VERSION:
+                self.table = saved['table']
+                return True
+        except (IOError, ValueError, KeyError):
+            pass
+        return False
+
+    def measure(self):
+        """
+        Time each backend on each shape in the grid
+        :return: the table
+        """
+        table = []
+        for count in COUNTS:
+            for length in LENGTHS:
+                strings_list = sample(count, length)
+                timings = {}
+                for name, backend in BACKENDS.items():
+                    # best of two runs
+                    for _ in range(2):
+                        start = time.time()
+                        backend(strings_list)
+                        timings[name] = min(timings.get(name, 1e9), time.time() - start)
+                table.append([count, length, min(timings, key=timings.get), timings])
+        self.table = table
+        return table
+
+    def start(self):
+        """
+        Measure (and save) the calibration on a background thread, unless already started
+        :return: None
+        """
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='Classical Extras LCS calibration')
+                    self.thread.daemon = True
+                    self.thread.start()
+
+    def run(self):
+        self.measure()
+        self.save()
+
+    def save(self):
+        try:
+            if not os.path.exists(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(self.path, 'w') as f:
+                json.dump({'version': CALIBRATION_VERSION, 'table': self.table}, f)
+        except (IOError, OSError):
+            pass
+
+    def choose(self, count, mean_length):
+        """
+        :param count: number of strings
+        :param mean_length: mean length of the strings
+        :return: 'dp' (pairwise dynamic programming), 'tree' or 'array'
+        """
+        if count < 3:
+            return 'dp'
+        if self.table is None and self.thread is None and not self.load():
+            self.start()
+        table = self.table or DEFAULT_TABLE
+        # nearest shape, on a log scale
+        log_count = math.log(count)
+        log_length = math.log(max(mean_length, 1))
+        nearest = min(table,
+                      key=lambda row: (math.log(row[0]) - log_count) ** 2 + (math.log(row[1]) - log_length) ** 2)
+        return nearest[2]
@@ -0,0 +1,187 @@
+# -*- coding: utf-8
+
+"""
+Longest common substring of two strings (or lists)
+
+The result is the same as that of the original quadratic-space dynamic programming algorithm: where there is more
+than one longest common substring, the one ending earliest in the first argument is returned.
+
+Two methods are provided:
+    dynamic programming - only the matching cells of two rows of the table are held (positions of each item in the
+        shorter argument are indexed, so that only matching pairs are visited) and the search stops once the rows
+        remaining cannot give a longer substring
+    suffix automaton - built on the second argument in linear time and then walked with the first; faster except
+        for very short inputs (and much faster where many pairs of positions match, e.g. strings of characters)
+
+Part of the Picard Classical Extras project
+(c) 2018
+"""
+
+AUTOMATON_MIN = 1000  # product of the lengths above which the suffix automaton is used (measured crossover ~900)
+
+
+def longest_common_substring(s1, s2, method=None):
+    """
+    :param s1: string or list 1
+    :param s2: string or list 2
+    :param method: 'dp' or 'automaton' - if None, chosen by the size of the inputs
+    :return: {'string': the longest common substring,
+        'start': the start position in s1,
+        'length': the end position in s1 (as returned by the original algorithm)}
+    """
+    if not s1 or not s2:
+        return {'string': s1[0:0], 'start': 0, 'length': 0}
+    if method is None:
+        method = 'automaton' if len(s1) * len(s2) >= AUTOMATON_MIN else 'dp'
+    try:
+        if method == 'automaton':
+            longest, x_longest = SuffixAutomaton(s2).longest_common(s1)
+        else:
+            longest, x_longest = lcs_dp(s1, s2)
+    except TypeError:
+        # unhashable items (e.g. lists of lists)
+        longest, x_longest = lcs_dense(s1, s2)
+    return {'string': s1[x_longest - longest: x_longest],
+            'start': x_longest - longest, 'length': x_longest}
+
+
+def lcs_dp(s1, s2):
+    """
+    Sparse two-row dynamic programming
+    :param s1: string or list 1 (items must be hashable)
+    :param s2: string or list 2 (items must be hashable)
+    :return: (length of longest common substring, its end position in s1)
+    """
+    # index the shorter argument; the table rows are then the longer one
+    swapped = len(s2) > len(s1)
+    if swapped:
+        outer, inner = s2, s1
+    else:
+        outer, inner = s1, s2
+    positions = {}
+    for j, item in enumerate(inner, 1):
+        positions.setdefault(item, []).append(j)
+    n = len(outer)
+    longest = 0
+    x_longest = 0  # end position in s1
+    prev = {}  # matching cells of the previous row - format is {column: run length, ...}
+    for i, item in enumerate(outer, 1):
+        cur = {}
+        run = 0
+        for j in positions.get(item, ()):
+            k = prev.get(j - 1, 0) + 1
+            cur[j] = k
+            if k > run:
+                run = k
+        if swapped:
+            # columns are positions in s1, so ties need checking for an earlier end
+            if run and run >= longest:
+                ends = [j for j, k in cur.iteritems() if k == run]
+                if run > longest:
+                    longest = run
+                    x_longest = min(ends)
+                else:
+                    x_longest = min(x_longest, min(ends))
+            if run + n - i < longest:
+                break
+        else:
+            if run > longest:
+                longest = run
+                x_longest = i
+            if run + n - i <= longest:
+                break
+        prev = cur
+    return longest, x_longest
+
+
+def lcs_dense(s1, s2):
+    """
+    Two-row dynamic programming, for items which cannot be hashed
+    :param s1: string or list 1
+    :param s2: string or list 2
+    :return: (length of longest common substring, its end position in s1)
+    """
+    n = len(s1)
+    width = len(s2) + 1
+    prev = [0] * width
+    longest, x_longest = 0, 0
+    for x in xrange(1, n + 1):
+        cur = [0] * width
+        item = s1[x - 1]
+        run = 0
+        for y in xrange(1, width):
+            if item == s2[y - 1]:
+                k = cur[y] = prev[y - 1] + 1
+                if k > run:
+                    run = k
+        if run > longest:
+            longest = run
+            x_longest = x
+        if run + n - x <= longest:
+            break
+        prev = cur
+    return longest, x_longest
+
+
+class SuffixAutomaton(object):
+    """
+    Suffix automaton (directed acyclic word graph) of a string or list of hashable items
+    """
+    __slots__ = ('transitions', 'link', 'length')
+
+    def __init__(self, seq):
+        transitions = self.transitions = [{}]
+        link = self.link = [-1]
+        length = self.length = [0]
+        last = 0
+        for item in seq:
+            state = len(length)
+            transitions.append({})
+            link.append(0)
+            length.append(length[last] + 1)
+            p = last
+            while p != -1 and item not in transitions[p]:
+                transitions[p][item] = state
+                p = link[p]
+            if p != -1:
+                q = transitions[p][item]
+                if length[p] + 1 == length[q]:
+                    link[state] = q
+                else:
+                    clone = len(length)
+                    transitions.append(dict(transitions[q]))
+                    link.append(link[q])
+                    length.append(length[p] + 1)
+                    while p != -1 and transitions[p].get(item) == q:
+                        transitions[p][item] = clone
+                        p = link[p]
+                    link[q] = link[state] = clone
+            last = state
+
+    def longest_common(self, seq):
+        """
+        :param seq: string or list to match against the automaton
+        :return: (length of longest common substring, its end position in seq)
+        """
+        transitions = self.transitions
+        link = self.link
+        length = self.length
+        n = len(seq)
+        state = 0
+        run = 0
+        longest, x_longest = 0, 0
+        for i, item in enumerate(seq, 1):
+            while state and item not in transitions[state]:
+                state = link[state]
+                run = length[state]
+            if item in transitions[state]:
+                state = transitions[state][item]
+                run += 1
+            else:
+                run = 0
+            if run > longest:
+                longest = run
+                x_longest = i
+            if run + n - i <= longest:
+                break
+        return longest, x_longest
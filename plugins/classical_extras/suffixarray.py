@@ -0,0 +1,150 @@
+# -*- coding: utf-8
+
+"""
+Search longest common substrings using a suffix array and LCP (longest common prefix) array
+
+An alternative to suffixtree.multi_lcs with the same API. The strings are integer-encoded and concatenated, each with
+its own terminating symbol; the suffix array is built by prefix doubling and the LCP array by Kasai's algorithm. The
+longest common substring is then the largest minimum LCP over a window of the suffix array that includes suffixes
+from every string.
+
+Part of the Picard Classical Extras project
+(c) 2018
+"""
+
+import collections
+
+
+def encode(strings_list):
+    """
+    :param strings_list: list of strings or lists (items must be hashable)
+    :return: (text, owners, symbols) - text is the list of codes of the concatenated strings (each followed by its
+    terminator), owners gives the index of the string that each position belongs to and symbols maps codes to items
+    """
+    codes = {}
+    symbols = []
+    encoded = []
+    for s in strings_list:
+        string_codes = []
+        for item in s:
+            code = codes.get(item)
+            if code is None:
+                code = codes[item] = len(symbols)
+                symbols.append(item)
+            string_codes.append(code)
+        encoded.append(string_codes)
+    text = []
+    owners = []
+    for string_index, string_codes in enumerate(encoded):
+        text.extend(string_codes)
+        text.append(len(symbols) + string_index)
+        owners.extend([string_index] * (len(string_codes) + 1))
+    return text, owners, symbols
+
+
+def suffix_array(text):
+    """
+    Prefix doubling: suffixes are sorted by their first k items, then 2k, ... until all ranks are distinct
+    :param text: list of integer codes
+    :return: (suffix array, rank of each suffix)
+    """
+    n = len(text)
+    rank = list(text)
+    sa = range(n)
+    k = 1
+    while True:
+        base = max(rank) + 2
+        keys = [rank[i] * base + (rank[i + k] + 1 if i + k < n else 0) for i in xrange(n)]
+        sa.sort(key=keys.__getitem__)
+        new_rank = [0] * n
+        r = 0
+        for j in xrange(1, n):
+            if keys[sa[j]] != keys[sa[j - 1]]:
+                r += 1
+            new_rank[sa[j]] = r
+        rank = new_rank
+        if r == n - 1 or k >= n:
+            return sa, rank
+        k *= 2
+
+
+def lcp_array(text, sa, rank):
+    """
+    Kasai's algorithm
+    :return: lcp, where lcp[i] is the length of the common prefix of the suffixes at sa[i - 1] and sa[i]
+    """
+    n = len(text)
+    lcp = [0] * n
+    h = 0
+    for i in xrange(n):
+        if rank[i] > 0:
+            j = sa[rank[i] - 1]
+            while i + h < n and j + h < n and text[i + h] == text[j + h]:
+                h += 1
+            lcp[rank[i]] = h
+            if h:
+                h -= 1
+        else:
+            h = 0
+    return lcp
+
+
+def longest_common(text, owners, strings_count):
+    """
+    :return: (length, start position in text) of the first longest common substring in suffix array order
+    """
+    sa, rank = suffix_array(text)
+    lcp = lcp_array(text, sa, rank)
+    counts = [0] * strings_count
+    covered = 0
+    left = 0
+    window = collections.deque()  # indices i in (left, right] with increasing lcp[i] - window[0] is the minimum
+    longest, position = 0, 0
+    for right in xrange(len(sa)):
+        owner = owners[sa[right]]
+        if not counts[owner]:
+            covered += 1
+        counts[owner] += 1
+        if right:
+            while window and lcp[window[-1]] >= lcp[right]:
+                window.pop()
+            window.append(right)
+        while covered == strings_count:
+            while window and window[0] <= left:
+                window.popleft()
+            if window and lcp[window[0]] > longest:
+                longest = lcp[window[0]]
+                position = sa[right]
+            owner = owners[sa[left]]
+            counts[owner] -= 1
+            if not counts[owner]:
+                covered -= 1
+            left += 1
+    return longest, position
+
+
+def multi_lcs(strings_list):
+    """
+    Returns longest common string (or list) for a list of strings (or lists)
+    :param strings_list: a list of lists or a list of strings
+    :return: {'response': the longest common string (or list)} - as suffixtree.multi_lcs, a list is returned in
+    either case, and {'response': [], 'error': message} if the arguments are not valid
+    """
+    if not isinstance(strings_list, list):
+        return {'response': [], 'error': 'Argument is not a list'}
+    arg_type = type(strings_list[0])
+    for item in strings_list:
+        if not isinstance(item, arg_type):
+            return {'response': [], 'error': 'List members are not of the same type'}
+    if arg_type is not list and arg_type is not str and arg_type is not unicode:
+        return {'response': [], 'error': 'List members are not lists or strings'}
+
+    try:
+        text, owners, symbols = encode(strings_list)
+    except TypeError:
+        return {'response': [], 'error': 'List members are not hashable'}
+    if len(strings_list) == 1:
+        # the whole string is common (the window search below needs suffixes of two strings)
+        return {'response': list(strings_list[0])}
+    length, position = longest_common(text, owners, len(strings_list))
+    return {'response': [symbols[code] for code in text[position:position + length]]}
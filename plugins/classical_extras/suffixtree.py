@@ -11,153 +11,131 @@ Modified by <a href="https://github.com/MetaTunes">Mark Evens</a> as part of Pic
 Not for stand-alone use - use the original code
 Accepts list or string inputs, but returns list outputs
 Changed to allow a range of different special characters in case $ is in a string
+Changed to hold the tree in parallel arrays (nodes are integer indices) with an integer-encoded alphabet,
+each string having its own terminating symbol, to reduce memory use for long inputs (e.g. lyrics)
 (c) 2018
 """
 
 import sys
-import re
-import argparse
+from array import array
 
 END_OF_STRING = sys.maxint
 
-class SuffixTreeNode:
+
+class SuffixTree(object):
     """
-    Suffix tree node class. Actually, it also respresents a tree edge that points to this node.
+    Generalized suffix tree
+    Each node is an index into the arrays start, end, link and parent - node 0 is the root. A node also represents
+    the tree edge that points to it, which is labelled text[start:end].
     """
-    new_identifier = 0
-
-    def __init__(self, start=0, end=END_OF_STRING):
-        self.identifier = SuffixTreeNode.new_identifier
-        SuffixTreeNode.new_identifier += 1
-
-        # suffix link is required by Ukkonen's algorithm
-        self.suffix_link = None
-
-        # child edges/nodes, each dict key represents the first letter of an edge
-        self.edges = {}
 
-        # stores reference to parent
-        self.parent = None
+    def __init__(self, strings_list):
+        """
+        :param strings_list: list of strings or lists (items must be hashable)
+        """
+        # integer-encode the alphabet: items are 0...n-1 and string terminators follow
+        self.codes = {}
+        self.symbols = []
+        encoded = []
+        for s in strings_list:
+            encoded.append(array('l', [self.encode(item) for item in s]))
+        self.sigma = len(self.symbols) + len(strings_list)  # alphabet size, including terminators
 
-        # bit vector shows to which strings this node belongs
-        self.bit_vector = 0
+        # all strings are concatenated together. Tree's nodes store only indices
+        self.text = array('l')
 
         # edge info: start index and end index
-        self.start = start
-        self.end = end
-
-    def add_child(self, key, start, end):
-        """
-        Create a new child node
+        self.start = array('l', [0])
+        self.end = array('l', [END_OF_STRING])
+        # suffix link is required by Ukkonen's algorithm (-1 = root)
+        self.link = array('l', [-1])
+        self.parent = array('l', [-1])
 
-        Agrs:
-            key: a char that will be used during active edge searching
-            start, end: node's edge start and end indices
+        # child edges - format is {node * sigma + first symbol of edge: child node, ...}
+        self.edges = {}
 
-        Returns:
-            created child node
+        # number of strings stored by this tree
+        self.strings_count = 0
 
-        """
-        child = SuffixTreeNode(start=start, end=end)
-        child.parent = self
-        self.edges[key] = child
-        return child
+        # tree leaves and the string to which each belongs
+        self.leaves = array('l')
+        self.leaf_strings = array('l')
 
-    def add_exisiting_node_as_child(self, key, node):
-        """
-        Add an existing node as a child
+        for codes in encoded:
+            self.append_string(codes)
 
-        Args:
-            key: a char that will be used during active edge searching
-            node: a node that will be added as a child
-        """
-        node.parent = self
-        self.edges[key] = node
+    def encode(self, item):
+        code = self.codes.get(item)
+        if code is None:
+            code = self.codes[item] = len(self.symbols)
+            self.symbols.append(item)
+        return code
 
-    def get_edge_length(self, current_index):
+    def add_node(self, start, end, parent):
         """
-        Get length of an edge that points to this node
-
-        Args:
-            current_index: index of current processing symbol (usefull for leaf nodes that have "infinity" end index)
+        :return: index of the new node
         """
-        return min(self.end, current_index + 1) - self.start
-
-    def __str__(self):
-        return 'id=' + str(self.identifier)
-
-
-class SuffixTree:
-    """
-    Generalized suffix tree
-    """
+        self.start.append(start)
+        self.end.append(end)
+        self.link.append(-1)
+        self.parent.append(parent)
+        return len(self.start) - 1
 
-    def __init__(self):
-        # the root node
-        self.root = SuffixTreeNode()
-
-        # all strings are concatenaited together. Tree's nodes stores only indices
-        self.input_string = []
-
-        # number of strings stored by this tree
-        self.strings_count = 0
-
-        # list of tree leaves
-        self.leaves = []
-
-    def append_string(self, input_string, special_char):
+    def append_string(self, codes):
         """
-        Add new string to the suffix tree
+        Add new (encoded) string to the suffix tree
         """
-        start_index = len(self.input_string)
+        text = self.text
+        start = self.start
+        end = self.end
+        link = self.link
+        parent = self.parent
+        edges = self.edges
+        sigma = self.sigma
+        start_index = len(text)
         current_string_index = self.strings_count
 
-        # each sting should have a unique ending
-        input_string += special_char + str(current_string_index)
-
-        # gathering 'em all together
-        self.input_string += input_string
+        # each string has a unique ending
+        text.extend(codes)
+        text.append(len(self.symbols) + current_string_index)
         self.strings_count += 1
 
-        # these 3 variables represents current "active point"
-        active_node = self.root
+        # these 3 variables represent the current "active point"
+        active_node = 0
         active_edge = 0
         active_length = 0
 
-        # shows how many
+        # shows how many suffixes are still to be inserted
         remainder = 0
 
         # new leaves appended to tree
         new_leaves = []
 
         # main circle
-        for index in range(start_index, len(self.input_string)):
-            previous_node = None
+        for index in xrange(start_index, len(text)):
+            previous_node = -1
             remainder += 1
             while remainder > 0:
                 if active_length == 0:
                     active_edge = index
 
-                if self.input_string[active_edge] not in active_node.edges:
-                    # no edge starting with current char, so creating a new leaf node
-                    leaf_node = active_node.add_child(self.input_string[active_edge], index, END_OF_STRING)
-
-                    # a leaf node will always be leaf node belonging to only one string
-                    # (because each string has different termination)
-                    leaf_node.bit_vector = 1 << current_string_index
+                key = active_node * sigma + text[active_edge]
+                next_node = edges.get(key, -1)
+                if next_node < 0:
+                    # no edge starting with current symbol, so creating a new leaf node
+                    # (a leaf node will always belong to only one string, because each string has a different ending)
+                    leaf_node = edges[key] = self.add_node(index, END_OF_STRING, active_node)
                     new_leaves.append(leaf_node)
 
                     # doing suffix link magic
-                    if previous_node is not None:
-                        previous_node.suffix_link = active_node
+                    if previous_node >= 0:
+                        link[previous_node] = active_node
                     previous_node = active_node
                 else:
                     # ok, we've got an active edge
-                    next_node = active_node.edges[self.input_string[active_edge]]
-
                     # walking down through edges (if active_length is bigger than edge length)
-                    next_edge_length = next_node.get_edge_length(index)
-                    if active_length >= next_node.get_edge_length(index):
+                    next_edge_length = min(end[next_node], index + 1) - start[next_node]
+                    if active_length >= next_edge_length:
                         active_edge += next_edge_length
                         active_length -= next_edge_length
                         active_node = next_node
@@ -165,88 +143,104 @@ class SuffixTree:
 
                     # current edge already contains the suffix we need to insert.
                     # Increase the active_length and go forward
-                    if self.input_string[next_node.start + active_length] == self.input_string[index]:
+                    if text[start[next_node] + active_length] == text[index]:
                         active_length += 1
-                        if previous_node is not None:
-                            previous_node.suffix_link = active_node
+                        if previous_node >= 0:
+                            link[previous_node] = active_node
                         previous_node = active_node
                         break
 
                     # splitting edge
-                    split_node = active_node.add_child(
-                        self.input_string[active_edge],
-                        next_node.start,
-                        next_node.start + active_length
-                    )
-                    next_node.start += active_length
-                    split_node.add_exisiting_node_as_child(self.input_string[next_node.start], next_node)
-                    leaf_node = split_node.add_child(self.input_string[index], index, END_OF_STRING)
-                    leaf_node.bit_vector = 1 << current_string_index
+                    split_node = edges[key] = self.add_node(start[next_node], start[next_node] + active_length,
+                                                            active_node)
+                    start[next_node] += active_length
+                    edges[split_node * sigma + text[start[next_node]]] = next_node
+                    parent[next_node] = split_node
+                    leaf_node = edges[split_node * sigma + text[index]] = self.add_node(index, END_OF_STRING,
+                                                                                        split_node)
                     new_leaves.append(leaf_node)
 
                     # suffix link magic again
-                    if previous_node is not None:
-                        previous_node.suffix_link = split_node
+                    if previous_node >= 0:
+                        link[previous_node] = split_node
                     previous_node = split_node
 
                 remainder -= 1
 
                 # follow suffix link (if exists) or go to root
-                if active_node == self.root and active_length > 0:
+                if active_node == 0 and active_length > 0:
                     active_length -= 1
                     active_edge = index - remainder + 1
                 else:
-                    active_node = active_node.suffix_link if active_node.suffix_link is not None else self.root
+                    active_node = link[active_node] if link[active_node] >= 0 else 0
 
         # update leaves ends from "infinity" to actual string end
         for leaf in new_leaves:
-            leaf.end = len(self.input_string)
+            end[leaf] = len(text)
         self.leaves.extend(new_leaves)
+        self.leaf_strings.extend([current_string_index] * len(new_leaves))
 
-    def find_longest_common_substrings(self, special_char):
+    def find_longest_common_substrings(self):
         """
         Search longest common substrings in the tree by locating lowest common ancestors that belong to all strings
+        :return: list of longest common substrings (as lists of the original items)
         """
+        parent = self.parent
+        start = self.start
+        end = self.end
 
         # all bits are set
         success_bit_vector = 2 ** self.strings_count - 1
 
+        # bit vectors show to which strings each node belongs
+        bit_vector = [0] * len(start)
+        for leaf, string_index in zip(self.leaves, self.leaf_strings):
+            bit_vector[leaf] = 1 << string_index
+
         lowest_common_ancestors = []
 
         # going up to the root
         for leaf in self.leaves:
             node = leaf
-            while node.parent is not None:
-                if node.bit_vector != success_bit_vector:
+            while parent[node] >= 0:
+                if bit_vector[node] != success_bit_vector:
                     # updating parent's bit vector
-                    node.parent.bit_vector |= node.bit_vector
-                    node = node.parent
+                    bit_vector[parent[node]] |= bit_vector[node]
+                    node = parent[node]
                 else:
                     # hey, we've found a lowest common ancestor!
                     lowest_common_ancestors.append(node)
                     break
 
-        longest_common_substrings = []
-        longest_length = 0
-
         # need to filter the result array and get the longest common strings
+        # (a terminator is only ever at the end of a leaf edge, and a leaf is only a common ancestor if there is just
+        # one string - in which case the terminator is excluded)
+        symbols_count = len(self.symbols)
+        depth = {}  # format is {node: length of the substring from the root to the node, ...}
+        finishes = {}  # format is {node: end of the substring in the text, ...}
+        longest_length = 0
         for common_ancestor in lowest_common_ancestors:
-            common_substring = []
-            node = common_ancestor
-            while node.parent is not None:
-                label = self.input_string[node.start:node.end]
-                common_substring = label + common_substring
-                node = node.parent
-            # remove unique endings (<special_char><number>), we don't need them anymore ...
-            if special_char in common_substring:
-                common_substring = common_substring[:common_substring.index(special_char)]
-            # ... also in input strings to avoid mutation problems
-            if len(common_substring) > longest_length:
-                longest_length = len(common_substring)
-                longest_common_substrings = [common_substring]
-            elif len(common_substring) == longest_length and common_substring not in longest_common_substrings:
-                longest_common_substrings.append(common_substring)
+            if common_ancestor not in depth:
+                finish = end[common_ancestor]
+                length = 0
+                if self.text[finish - 1] >= symbols_count:
+                    finish -= 1
+                    length -= 1
+                node = common_ancestor
+                while parent[node] >= 0:
+                    length += end[node] - start[node]
+                    node = parent[node]
+                depth[common_ancestor] = length
+                finishes[common_ancestor] = finish
+                longest_length = max(longest_length, length)
 
+        longest_common_substrings = []
+        for common_ancestor in lowest_common_ancestors:
+            if depth[common_ancestor] == longest_length:
+                finish = finishes[common_ancestor]
+                common_substring = [self.symbols[code] for code in self.text[finish - longest_length:finish]]
+                if common_substring not in longest_common_substrings:
+                    longest_common_substrings.append(common_substring)
         return longest_common_substrings
 
 
@@ -266,32 +260,9 @@ def multi_lcs(strings_list):
     if arg_type is not list and arg_type is not str and arg_type is not unicode:
         return {'response': [], 'error': 'List members are not lists or strings'}
 
-    suffix_tree = SuffixTree()
-    special_char = None
-    for char in ['|', '$', '#', '%', '@', '_']:
-        test_strings = [x for x in strings_list if char in x]
-        if not test_strings:
-            special_char = char
-            break
-    if special_char:
-        print special_char
-        for s in strings_list:
-            if arg_type is list:
-                s_copy = s[:]   # to avoid mutating input lists
-            else:
-                s_copy = s
-            suffix_tree.append_string(s_copy, special_char)
-        lcs = suffix_tree.find_longest_common_substrings(special_char)
-    else:
-        return {'response': [], 'error': 'Too many special characters'}
-    if arg_type is list:
-        if lcs:
-            return {'response': lcs[0]}
-        else:
-            return {'response': [], 'error': 'Internal suffix tree problems'}
-    else:
-        if lcs:
-            return {'response': [''.join(x) for x in lcs[0]]}
-        else:
-            return {'response': [], 'error': 'Internal suffix tree problems'}
-
+    try:
+        lcs = SuffixTree(strings_list).find_longest_common_substrings()
+    except TypeError:
+        return {'response': [], 'error': 'List members are not hashable'}
+    # no common substring gives an empty response
+    return {'response': lcs[0] if lcs else []}
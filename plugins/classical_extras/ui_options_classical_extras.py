@@ -125,6 +125,13 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.cea_cyrillic = QtGui.QCheckBox(self.groupBox_25)
         self.cea_cyrillic.setObjectName(_fromUtf8("cea_cyrillic"))
         self.horizontalLayout_11.addWidget(self.cea_cyrillic)
+        self.label_cea_alias_cache_ttl = QtGui.QLabel(self.groupBox_25)
+        self.label_cea_alias_cache_ttl.setObjectName(_fromUtf8("label_cea_alias_cache_ttl"))
+        self.horizontalLayout_11.addWidget(self.label_cea_alias_cache_ttl)
+        self.cea_alias_cache_ttl = QtGui.QSpinBox(self.groupBox_25)
+        self.cea_alias_cache_ttl.setMaximum(365)
+        self.cea_alias_cache_ttl.setObjectName(_fromUtf8("cea_alias_cache_ttl"))
+        self.horizontalLayout_11.addWidget(self.cea_alias_cache_ttl)
         self.formLayout_3.setWidget(2, QtGui.QFormLayout.SpanningRole, self.groupBox_25)
         self.groupBox_7 = QtGui.QGroupBox(self.groupBox_23)
         self.groupBox_7.setObjectName(_fromUtf8("groupBox_7"))
@@ -1458,6 +1465,16 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.use_cache = QtGui.QCheckBox(self.frame_2)
         self.use_cache.setObjectName(_fromUtf8("use_cache"))
         self.horizontalLayout_3.addWidget(self.use_cache)
+        self.label_cwp_cache_ttl = QtGui.QLabel(self.frame_2)
+        self.label_cwp_cache_ttl.setObjectName(_fromUtf8("label_cwp_cache_ttl"))
+        self.horizontalLayout_3.addWidget(self.label_cwp_cache_ttl)
+        self.cwp_cache_ttl = QtGui.QSpinBox(self.frame_2)
+        self.cwp_cache_ttl.setMaximum(365)
+        self.cwp_cache_ttl.setObjectName(_fromUtf8("cwp_cache_ttl"))
+        self.horizontalLayout_3.addWidget(self.cwp_cache_ttl)
+        self.cwp_batch = QtGui.QCheckBox(self.frame_2)
+        self.cwp_batch.setObjectName(_fromUtf8("cwp_batch"))
+        self.horizontalLayout_3.addWidget(self.cwp_batch)
         self.verticalLayout_25.addWidget(self.frame_2)
         self.Style = QtGui.QGroupBox(self.scrollAreaWidgetContents_3)
         sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Preferred, QtGui.QSizePolicy.Maximum)
@@ -2159,6 +2176,9 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.ce_no_run = QtGui.QCheckBox(self.groupBox_3)
         self.ce_no_run.setObjectName(_fromUtf8("ce_no_run"))
         self.verticalLayout_5.addWidget(self.ce_no_run)
+        self.ce_background = QtGui.QCheckBox(self.groupBox_3)
+        self.ce_background.setObjectName(_fromUtf8("ce_background"))
+        self.verticalLayout_5.addWidget(self.ce_background)
         self.verticalLayout_18.addWidget(self.groupBox_3)
         self.advanced_artists = QtGui.QGroupBox(self.scrollAreaWidgetContents_2)
         self.advanced_artists.setStyleSheet(_fromUtf8("background-color: rgb(170, 170, 164);"))
@@ -2384,6 +2404,9 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.log_info = QtGui.QRadioButton(self.groupBox_50)
         self.log_info.setObjectName(_fromUtf8("log_info"))
         self.horizontalLayout_34.addWidget(self.log_info)
+        self.log_json = QtGui.QCheckBox(self.groupBox_50)
+        self.log_json.setObjectName(_fromUtf8("log_json"))
+        self.horizontalLayout_34.addWidget(self.log_json)
         self.horizontalLayout_2.addWidget(self.groupBox_50)
         self.verticalLayout_18.addWidget(self.groupBox_6)
         self.frame_6 = QtGui.QFrame(self.scrollAreaWidgetContents_2)
@@ -2531,6 +2554,8 @@ class Ui_ClassicalExtrasOptionsPage(object):
         QtCore.QObject.connect(self.use_cwp, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.cwp_collections.setEnabled)
         QtCore.QObject.connect(self.cea_split_lyrics, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.groupBox_32.setEnabled)
         QtCore.QObject.connect(self.use_cwp, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.use_cache.setEnabled)
+        QtCore.QObject.connect(self.use_cwp, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.cwp_cache_ttl.setEnabled)
+        QtCore.QObject.connect(self.use_cwp, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.cwp_batch.setEnabled)
         QtCore.QObject.connect(self.use_cea, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.groupBox_5.setEnabled)
         QtCore.QObject.connect(self.cea_override, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.ce_tagmap_override.setEnabled)
         QtCore.QObject.connect(self.toolButton_3, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), self.cea_source_3.setEnabled)
@@ -2602,6 +2627,8 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.cea_credited_overrides.setText(_translate("ClassicalExtrasOptionsPage", "Credited-as over-rides MB/Alias", None))
         self.cea_cyrillic.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Will be based on sort names. For cyrillic script names, patronyms will be removed.</p></body></html>", None))
         self.cea_cyrillic.setText(_translate("ClassicalExtrasOptionsPage", "Fix non-Latin text in names (where possible and if not fixed by other naming options)", None))
+        self.label_cea_alias_cache_ttl.setText(_translate("ClassicalExtrasOptionsPage", "Keep aliases on disk for (days)", None))
+        self.cea_alias_cache_ttl.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>The sort name and alias of each artist are saved on disk so that the aliases of known artists need not be searched again, in this or later sessions. Set to 0 to disable.</p></body></html>", None))
         self.groupBox_7.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p><br/></p></body></html>", None))
         self.groupBox_7.setTitle(_translate("ClassicalExtrasOptionsPage", "Credited-as options:-", None))
         self.groupBox_26.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Select the source for \'as-credited\' names - whether these are applied depends on the sub-options choices.</p></body></html>", None))
@@ -3138,6 +3165,10 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.use_cache.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Select to use cached works. Deselect to refesh from MusicBrainz.</p></body></html>", None))
         self.use_cache.setWhatsThis(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>&quot;Use cache&quot; prevents excessive look-ups of the MB database. Every look-up of a parent work needs to be performed separately (hopefully the MB database might make this easier some day). Network usage constraints by MB means that each look-up takes a minimum of 1 second. Once a release has been looked-up, the works are retained in cache, significantly reducing the time required if, say, the options are changed and the data refreshed. However, if the user edits the works in the MB database then the cache will need to be turned off temporarily for the refresh to find the new/changed works. Also some types of work (e.g. arrangements) will require a full look-up if options have been changed.</p></body></html>", None))
         self.use_cache.setText(_translate("ClassicalExtrasOptionsPage", "Use cache (if available)*", None))
+        self.label_cwp_cache_ttl.setText(_translate("ClassicalExtrasOptionsPage", "Keep works on disk for (days)", None))
+        self.cwp_batch.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Gather the works for the whole release and fetch them by browsing the works of each composer (100 at a time), rather than looking up each work separately. Works not found this way are looked up as usual. Best suited to releases with many works by a few composers.</p></body></html>", None))
+        self.cwp_batch.setText(_translate("ClassicalExtrasOptionsPage", "Batch work look-ups", None))
+        self.cwp_cache_ttl.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Works looked up on MusicBrainz are saved on disk so that they do not need to be looked up again after Picard is restarted. Set to 0 to disable the disk cache.</p></body></html>", None))
         self.Style.setWhatsThis(_translate("ClassicalExtrasOptionsPage", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
 "<html><head><meta name=\"qrichtext\" content=\"1\" /><style type=\"text/css\">\n"
 "p, li { white-space: pre-wrap; }\n"
@@ -3307,6 +3338,7 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.Genres), _translate("ClassicalExtrasOptionsPage", "Genres etc.", None))
         self.groupBox_3.setTitle(_translate("ClassicalExtrasOptionsPage", "General", None))
         self.ce_no_run.setText(_translate("ClassicalExtrasOptionsPage", "Do not run Classical Extras for tracks where no pre-existing file is detected (warning tag will be written)", None))
+        self.ce_background.setText(_translate("ClassicalExtrasOptionsPage", "Do the end-of-album processing in the background (keeps Picard responsive while large releases are processed)", None))
         self.advanced_artists.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Separate multiple names by commas. Do not use any quotation marks.</p></body></html>", None))
         self.advanced_artists.setWhatsThis(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Permits the listing of strings by which ensembles of different types may be identified. This is used by the plugin to place performer details in the relevant hidden variables and thus make them available for use in the &quot;Tag mapping&quot; tab as sources for any required tags. </p><p>If it is important that only whole words are to be matched, be sure to include a space after the string.</p></body></html>", None))
         self.advanced_artists.setTitle(_translate("ClassicalExtrasOptionsPage", "Artists", None))
@@ -3342,6 +3374,8 @@ class Ui_ClassicalExtrasOptionsPage(object):
         self.groupBox_50.setTitle(_translate("ClassicalExtrasOptionsPage", "Custom logging", None))
         self.log_basic.setText(_translate("ClassicalExtrasOptionsPage", "Basic", None))
         self.log_info.setText(_translate("ClassicalExtrasOptionsPage", "Full", None))
+        self.log_json.setToolTip(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>Write the full log for each release as compact JSON lines (release_id.jsonl), one record per message, rather than as text.</p></body></html>", None))
+        self.log_json.setText(_translate("ClassicalExtrasOptionsPage", "JSON lines", None))
         self.groupBox_33.setWhatsThis(_translate("ClassicalExtrasOptionsPage", "<html><head/><body><p>This can be used so that the user has a record of the version of Classical Extras which generated the tags and which options were selected to achieve the resulting tags. Note that the tags will be blanked first so this will only show the last options used on a particular file. The same tag can be used for both sets of options, resulting in a multi-valued tag. </p></body></html>", None))
         self.groupBox_33.setTitle(_translate("ClassicalExtrasOptionsPage", "Save plugin details and options in a tag?*", None))
         self.label_41.setText(_translate("ClassicalExtrasOptionsPage", "Tag name for plugin version", None))
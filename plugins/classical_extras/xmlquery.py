@@ -0,0 +1,181 @@
+# -*- coding: utf-8
+
+"""
+Compiled path queries over XmlNode trees
+
+A query is a match path as used by parse_data in the main module, e.g.
+    'relation_list', 'attribs.target_type:artist', 'relation', 'attribs.type:composer', 'begin', 'text'
+Each path item is either a key (a child node name, or text / attribs / children / an attribute name) or
+    a.b.c:value - select only branches where the item found at a.b.c (relative to the branch) equals value, or
+    a.b.c       - return the items found at a.b.c (any remaining path items are ignored)
+
+compile_query turns a match path into a Query object once, so that it does not need to be re-parsed each time it is
+used, and query_batch evaluates a number of queries in a single traversal of a node (queries with a common leading
+path share the traversal of that path). Results are identical to the original recursive parse_data.
+
+Part of the Picard Classical Extras project
+(c) 2018
+"""
+
+from picard.webservice import XmlNode
+
+MAX_COMPILED = 2000  # compiled query cache is cleared when it gets this big (queries can include work ids)
+_compiled = {}
+
+
+class Step(object):
+    """
+    One compiled item of a match path, together with the steps which follow it (which may be shared between
+    queries in a batch)
+    """
+    __slots__ = ('name', 'path', 'test', 'value', 'ends', 'children', 'queries')
+
+    def __init__(self, item):
+        self.name = item
+        self.path = None  # for dotted items, the compiled sub-path
+        self.test = False
+        self.value = None
+        if '.' in item:
+            test = item.split(':')
+            self.path = _chain([Step(x) for x in test[0].split('.')])
+            if len(test) > 1:
+                self.test = True
+                self.value = test[1]
+        self.ends = []  # indices of queries which end at this step
+        self.children = []  # following steps
+        self.queries = []  # indices of all queries which pass through this step
+
+
+def _chain(steps):
+    for i in range(len(steps) - 1):
+        steps[i].children.append(steps[i + 1])
+    steps[-1].ends.append(0)
+    for step in steps:
+        step.queries.append(0)
+    return steps[0]
+
+
+def _walk(obj, steps, results):
+    """
+    Evaluate the steps against obj, appending matching items to results[query index]
+    :param obj: an XmlNode, dict (from XmlNode.__dict__ or attribs) or list thereof
+    :param steps: list of Step objects to apply at this level
+    :param results: list of result lists, one per query
+    :return: None
+    """
+    if isinstance(obj, XmlNode):
+        obj = obj.__dict__
+    if isinstance(obj, list):
+        for item in obj:
+            _walk(item, steps, results)
+        return
+    if not isinstance(obj, dict):
+        return
+    fall_through = []
+    for step in steps:
+        if step.name in obj:
+            value = obj[step.name]
+            for query in step.ends:
+                results[query].append(value)
+            if step.children:
+                _walk(value, step.children, results)
+        elif step.path:
+            if step.test:
+                found = [[]]
+                _walk(obj, [step.path], found)
+                if step.value in found[0]:
+                    for query in step.ends:
+                        results[query].append(obj)
+                    if step.children:
+                        _walk(obj, step.children, results)
+            else:
+                found = [[]]
+                _walk(obj, [step.path], found)
+                for query in step.queries:
+                    results[query].extend(found[0])
+        else:
+            fall_through.append(step)
+    if fall_through and 'children' in obj:
+        _walk(obj['children'], fall_through, results)
+
+
+class Query(object):
+    """
+    A compiled match path
+    """
+
+    def __init__(self, match):
+        self.match = tuple(match)
+        self.root = _chain([Step(item) for item in self.match])
+
+    def __call__(self, obj):
+        """
+        :param obj: an XmlNode object, list or dictionary containing nodes
+        :return: a list of matching items
+        """
+        results = [[]]
+        _walk(obj, [self.root], results)
+        return results[0]
+
+
+def compile_query(match):
+    """
+    :param match: a match path (tuple or list of items)
+    :return: the compiled Query (compiled queries are cached)
+    """
+    match = tuple(match)
+    query = _compiled.get(match)
+    if query is None:
+        if len(_compiled) >= MAX_COMPILED:
+            _compiled.clear()
+        query = _compiled[match] = Query(match)
+    return query
+
+
+class QueryBatch(object):
+    """
+    A number of match paths compiled into one tree of steps, so that they can be evaluated in one traversal
+    """
+
+    def __init__(self, matches):
+        self.size = len(matches)
+        self.roots = []
+        for index, match in enumerate(matches):
+            level = self.roots
+            step = None
+            for item in match:
+                step = None
+                for existing in level:
+                    if existing.name == item:
+                        step = existing
+                        break
+                if step is None:
+                    step = Step(item)
+                    level.append(step)
+                step.queries.append(index)
+                level = step.children
+            step.ends.append(index)
+
+    def __call__(self, obj):
+        """
+        :param obj: an XmlNode object, list or dictionary containing nodes
+        :return: a list of result lists, in the same order as the match paths
+        """
+        results = [[] for _ in range(self.size)]
+        _walk(obj, self.roots, results)
+        return results
+
+
+def query_batch(obj, matches):
+    """
+    :param obj: an XmlNode object, list or dictionary containing nodes
+    :param matches: list of match paths
+    :return: a list of result lists, in the same order as matches
+    """
+    key = tuple(tuple(match) for match in matches)
+    batch = _compiled.get(key)
+    if batch is None:
+        if len(_compiled) >= MAX_COMPILED:
+            _compiled.clear()
+        batch = _compiled[key] = QueryBatch(key)
+    return batch(obj)